@@ -0,0 +1,7 @@
+-- Migration 002: Project registry
+-- Root nodes and path entry edges move from bot config into projects.config
+
+UPDATE projects
+SET config = config || '{"root_nodes": {"explorer": 1, "builder": 101, "guardian": 201}, "entry_edges": {"explorer": 1, "builder": 101, "guardian": 201}}'::jsonb
+WHERE project_slug = 'arcium'
+  AND NOT config ? 'root_nodes';
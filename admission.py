@@ -0,0 +1,306 @@
+# ========================================
+# ACA Bot Admission Control
+# Concurrency limits, per-user rate limits & load shedding
+# ========================================
+"""
+Bound how much interaction work runs at once so bursts queue briefly or are
+turned away quickly instead of slowing every request down together.
+
+A guarded handler must pass, in order:
+
+1. the member's token bucket (``ADMISSION_USER_RATE``/``ADMISSION_USER_BURST``);
+   an empty bucket is shed at once;
+2. a per-guild slot (``ADMISSION_GUILD_LIMIT``), so one raided guild can't
+   take every slot;
+3. a global slot (``ADMISSION_GLOBAL_LIMIT``), sized against the database pool.
+
+Waiting for a slot is ordered by priority (``CHEAP`` handlers that only read
+cached/in-memory state first, then ``NORMAL``, then ``HEAVY`` queries) and
+bounded by ``ADMISSION_QUEUE_BUDGET_SECONDS``. A request that can't get a
+slot in time gets an ephemeral "busy" reply well inside Discord's 3 s
+acknowledgement window. Handlers that spend time before their first reply
+(typing effects) declare it with ``guard(..., ack_delay=seconds)``; their
+queue budget shrinks so queueing plus that delay still fits the window. On shutdown ``close()`` turns every new request away
+with a "restarting" reply and ``drain()`` waits for the running ones.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import discord
+
+from .config import settings
+from .metrics import metrics
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+CHEAP, NORMAL, HEAVY = 0, 1, 2
+_PRIORITY_NAMES = {CHEAP: "cheap", NORMAL: "normal", HEAVY: "heavy"}
+
+ADMISSIONS = metrics.counter("aca_admission_total", "Guarded interactions by outcome", ("priority", "result"))
+QUEUE_WAIT = metrics.histogram(
+    "aca_admission_queue_wait_seconds", "Time spent waiting for a slot", ("priority",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+)
+IN_FLIGHT = metrics.gauge("aca_admission_in_flight", "Interactions holding a global slot")
+QUEUED = metrics.gauge("aca_admission_queued", "Interactions waiting for a slot")
+
+BUSY_MESSAGE = "⏳ The academy is under heavy load — please retry in a few seconds."
+RATE_MESSAGE = "🧊 You're going a bit fast — wait a moment and try again."
+DRAINING_MESSAGE = "🔄 The academy is restarting — please retry in a few seconds."
+
+# Latest point a guarded handler may start its pre-reply work; the rest of
+# Discord's 3 s window is left for the handler's own queries and the reply
+ACK_DEADLINE_SECONDS = 2.0
+
+
+class Shed(Exception):
+    """Request turned away by admission control"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class PrioritySlots:
+    """Counting semaphore whose waiters are served lowest priority value first"""
+
+    __slots__ = ("limit", "in_use", "_waiters", "_seq")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    @property
+    def idle(self) -> bool:
+        return self.in_use == 0 and not self._waiters
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int, timeout: float) -> bool:
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return True
+        if timeout <= 0:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            # release() may have handed us the slot just as the timer fired
+            if future.done() and not future.cancelled():
+                return True
+            future.cancel()
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter
+                future.set_result(True)
+                return
+        self.in_use -= 1
+
+
+class AdmissionController:
+    """Global and per-guild slots plus per-member token buckets"""
+
+    def __init__(
+        self,
+        global_limit: int,
+        guild_limit: int,
+        user_rate: float,
+        user_burst: float,
+        queue_budget: float,
+        max_tracked_users: int = 100_000
+    ):
+        self.global_slots = PrioritySlots(global_limit)
+        self.guild_limit = guild_limit
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.queue_budget = queue_budget
+        self.max_tracked_users = max_tracked_users
+        self._guild_slots: Dict[int, PrioritySlots] = {}
+        self._user_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self.enabled = global_limit > 0
+        # Cleared by close(); guarded handlers running now, counted even when disabled
+        self.accepting = True
+        self.running = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if len(self._user_buckets) > self.max_tracked_users:
+                # Oldest bucket has long since refilled; forgetting it is harmless
+                self._user_buckets.popitem(last=False)
+        else:
+            self._user_buckets.move_to_end(user_id)
+        return bucket
+
+    def _guild(self, guild_id: Optional[int]) -> Optional[PrioritySlots]:
+        if guild_id is None:
+            return None
+        slots = self._guild_slots.get(guild_id)
+        if slots is None:
+            slots = self._guild_slots[guild_id] = PrioritySlots(self.guild_limit)
+        return slots
+
+    def _release_guild(self, guild_id: Optional[int], slots: Optional[PrioritySlots]):
+        if slots is None:
+            return
+        slots.release()
+        if slots.idle:
+            self._guild_slots.pop(guild_id, None)
+
+    async def acquire(
+        self,
+        guild_id: Optional[int],
+        user_id: int,
+        priority: int,
+        budget: Optional[float] = None
+    ) -> Optional[PrioritySlots]:
+        """Take a guild and a global slot or raise Shed; returns the guild slots to release"""
+        if not self._bucket(user_id).try_acquire():
+            raise Shed("rate")
+        if budget is None:
+            budget = self.queue_budget
+
+        started = time.monotonic()
+        guild_slots = self._guild(guild_id)
+        QUEUED.inc()
+        try:
+            if guild_slots is not None and not await guild_slots.acquire(priority, budget):
+                if guild_slots.idle:
+                    self._guild_slots.pop(guild_id, None)
+                raise Shed("guild_busy")
+            remaining = budget - (time.monotonic() - started)
+            try:
+                admitted = await self.global_slots.acquire(priority, remaining)
+            except BaseException:
+                # Cancelled while queued: the guild slot is already ours
+                self._release_guild(guild_id, guild_slots)
+                raise
+            if not admitted:
+                self._release_guild(guild_id, guild_slots)
+                raise Shed("busy")
+        finally:
+            QUEUED.dec()
+
+        QUEUE_WAIT.labels(_PRIORITY_NAMES[priority]).observe(time.monotonic() - started)
+        IN_FLIGHT.inc()
+        return guild_slots
+
+    def release(self, guild_id: Optional[int], guild_slots: Optional[PrioritySlots]):
+        IN_FLIGHT.dec()
+        self.global_slots.release()
+        self._release_guild(guild_id, guild_slots)
+
+    async def run(
+        self,
+        interaction: discord.Interaction,
+        priority: int,
+        func,
+        *args,
+        budget: Optional[float] = None,
+        **kwargs
+    ):
+        """Run a handler under admission control, replying "busy" if it is shed"""
+        label = _PRIORITY_NAMES[priority]
+        if not self.accepting:
+            ADMISSIONS.labels(label, "shed_draining").inc()
+            await _reply_shed(interaction, "draining")
+            return None
+        if not self.enabled:
+            with self._tracked():
+                return await func(interaction, *args, **kwargs)
+        try:
+            guild_slots = await self.acquire(interaction.guild_id, interaction.user.id, priority, budget)
+        except Shed as shed:
+            ADMISSIONS.labels(label, f"shed_{shed.reason}").inc()
+            await _reply_shed(interaction, shed.reason)
+            return None
+        ADMISSIONS.labels(label, "admitted").inc()
+        try:
+            with self._tracked():
+                return await func(interaction, *args, **kwargs)
+        finally:
+            self.release(interaction.guild_id, guild_slots)
+
+    @contextmanager
+    def _tracked(self):
+        self.running += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            if not self.running:
+                self._idle.set()
+
+    def close(self):
+        """Turn away every new interaction from now on (shutdown)"""
+        self.accepting = False
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` for running handlers to finish; False if some are still running"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def guard(self, priority: int = NORMAL, ack_delay: float = 0.0):
+        """Decorator for interaction handlers (place under ``@tree.command``)
+
+        ``ack_delay`` is how long the handler waits before its first reply;
+        the queue budget is cut so the reply still lands in time.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+                budget = max(0.0, min(self.queue_budget, ACK_DEADLINE_SECONDS - ack_delay))
+                return await self.run(interaction, priority, func, *args, budget=budget, **kwargs)
+            return wrapper
+        return decorator
+
+
+async def _reply_shed(interaction: discord.Interaction, reason: str):
+    try:
+        if not interaction.response.is_done():
+            message = {"rate": RATE_MESSAGE, "draining": DRAINING_MESSAGE}.get(reason, BUSY_MESSAGE)
+            await interaction.response.send_message(message, ephemeral=True)
+    except discord.HTTPException:
+        pass
+
+
+# Global admission controller
+admission = AdmissionController(
+    global_limit=settings.ADMISSION_GLOBAL_LIMIT,
+    guild_limit=settings.ADMISSION_GUILD_LIMIT,
+    user_rate=settings.ADMISSION_USER_RATE,
+    user_burst=settings.ADMISSION_USER_BURST,
+    queue_budget=settings.ADMISSION_QUEUE_BUDGET_SECONDS
+)
@@ -0,0 +1,299 @@
+# ========================================
+# ACA Bot Funnel Analytics
+# Offline drop-off analysis over encrypted path histories
+# ========================================
+"""
+Where do learners stall? An offline job over every member's ``path_history``.
+
+    python -m bot.core.analytics arcium --output funnel.npz [--guild 123] [--events]
+
+Users rows are streamed from a server-side cursor in chunks. Each chunk's
+encrypted payloads are decrypted and flattened in a worker process into
+columnar NumPy arrays (events per user, from, to, timestamp, ec_gain), so
+the parent only concatenates arrays and never touches per-event Python
+objects. All statistics are then vectorised over the event columns:
+
+- arrivals / exits per node (``bincount`` over ``to`` / ``from``), plus the
+  members currently at each node (``stalled``) and the drop-off rate
+  ``stalled / arrivals``;
+- median dwell time per node: the gap between consecutive events of the same
+  member, grouped by the node they were leaving, medians from one
+  ``lexsort``;
+- the transition matrix as sparse (from, to, count) triples with the share
+  of exits from each node taking each edge.
+
+Results are written with ``numpy.savez_compressed`` (``--events`` also keeps
+the raw event columns) and the nodes with the most stalled members are
+printed as a table.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .database import get_engine
+from .encryption import encryption
+
+logger = logging.getLogger(__name__)
+
+# Columns produced per chunk: events per user, from, to, timestamp (s), ec_gain
+EventChunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def decode_histories(payloads: Sequence[bytes]) -> EventChunk:
+    """Decrypt payloads and flatten their path histories into event columns (worker side)"""
+    lengths = np.zeros(len(payloads), dtype=np.int32)
+    frm: List[int] = []
+    to: List[int] = []
+    at: List[str] = []
+    ec: List[int] = []
+    for i, payload in enumerate(payloads):
+        try:
+            history = encryption.decrypt_record(payload)["path_history"]
+        except Exception:
+            # Unreadable payloads count as members without events
+            continue
+        lengths[i] = len(history)
+        frm.extend(h["from"] for h in history)
+        to.extend(h["to"] for h in history)
+        at.extend(h["at"] for h in history)
+        ec.extend(h.get("ec_gain", 0) for h in history)
+    return (
+        lengths,
+        np.asarray(frm, dtype=np.int32),
+        np.asarray(to, dtype=np.int32),
+        # numpy parses the ISO strings in one C loop
+        np.asarray(at, dtype="datetime64[s]").astype(np.int64),
+        np.asarray(ec, dtype=np.int32),
+    )
+
+
+class EventTable:
+    """Columnar events of every member, in history order within each member"""
+
+    def __init__(self, lengths: np.ndarray, frm: np.ndarray, to: np.ndarray, at: np.ndarray,
+                 ec_gain: np.ndarray, current: np.ndarray):
+        self.lengths = lengths
+        self.user = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        self.frm = frm
+        self.to = to
+        self.at = at
+        self.ec_gain = ec_gain
+        # Node each member is at now (from the users table)
+        self.current = current
+
+    @classmethod
+    def concat(cls, chunks: List[EventChunk], current: List[np.ndarray]) -> "EventTable":
+        if not chunks:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls(empty, empty, empty, np.zeros(0, dtype=np.int64), empty, empty)
+        columns = [np.concatenate(column) for column in zip(*chunks)]
+        return cls(*columns, current=np.concatenate(current))
+
+    def __len__(self) -> int:
+        return len(self.frm)
+
+
+def funnel(events: EventTable, node_ids: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Per-node funnel statistics and sparse transitions, fully vectorised"""
+    seen = np.concatenate([events.frm, events.to, events.current[events.current >= 0]])
+    nodes = np.union1d(node_ids if node_ids is not None else np.zeros(0, dtype=np.int32), seen)
+    n = len(nodes)
+    frm = np.searchsorted(nodes, events.frm)
+    to = np.searchsorted(nodes, events.to)
+    placed = events.current >= 0
+    current = np.searchsorted(nodes, events.current[placed])
+
+    # A member's first event also counts as arriving at its start node
+    starts = np.cumsum(events.lengths) - events.lengths
+    starts = starts[events.lengths > 0]
+    arrivals = np.bincount(to, minlength=n) + np.bincount(frm[starts], minlength=n)
+    # Members with no history arrived at (and are still at) their start node
+    idle = current[events.lengths[placed] == 0]
+    arrivals += np.bincount(idle, minlength=n)
+    exits = np.bincount(frm, minlength=n)
+    stalled = np.bincount(current, minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drop_off = np.where(arrivals > 0, stalled / arrivals, 0.0)
+
+    # Dwell at a node = time between arriving (previous event) and leaving it
+    same_user = events.user[1:] == events.user[:-1]
+    dwell = (events.at[1:] - events.at[:-1])[same_user]
+    dwell_node = frm[1:][same_user]
+    median_dwell = np.full(n, np.nan)
+    if len(dwell):
+        order = np.lexsort((dwell, dwell_node))
+        dwell, dwell_node = dwell[order], dwell_node[order]
+        counts = np.bincount(dwell_node, minlength=n)
+        has = counts > 0
+        first = np.cumsum(counts) - counts
+        lo = first + (counts - 1) // 2
+        hi = first + counts // 2
+        median_dwell[has] = (dwell[lo[has]] + dwell[hi[has]]) / 2
+
+    # Sparse transition matrix: unique (from, to) pairs with counts
+    pairs, pair_counts = np.unique(frm.astype(np.int64) * n + to, return_counts=True)
+    t_from, t_to = pairs // n, pairs % n
+    share = pair_counts / np.maximum(exits[t_from], 1)
+
+    return {
+        "node_ids": nodes,
+        "arrivals": arrivals,
+        "exits": exits,
+        "stalled": stalled,
+        "drop_off": drop_off,
+        "median_dwell_s": median_dwell,
+        "ec_gained": np.bincount(to, weights=events.ec_gain, minlength=n).astype(np.int64),
+        "transition_from": nodes[t_from],
+        "transition_to": nodes[t_to],
+        "transition_count": pair_counts,
+        "transition_share": share,
+    }
+
+
+async def collect_events(
+    project_slug: str,
+    guild_id: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 5000
+) -> Tuple[EventTable, Dict[int, str]]:
+    """Stream a project's users and decode their histories in parallel; returns events and node titles"""
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    chunks: List[EventChunk] = []
+    current: List[np.ndarray] = []
+    pending: List[Tuple[asyncio.Future, np.ndarray]] = []
+
+    async def drain(limit: int):
+        while len(pending) > limit:
+            future, nodes = pending.pop(0)
+            chunks.append(await future)
+            current.append(nodes)
+
+    async with get_engine().connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        project_id = await conn.fetchval("SELECT project_id FROM projects WHERE project_slug = $1", project_slug)
+        if project_id is None:
+            raise LookupError(f"Unknown project '{project_slug}'")
+        titles = {
+            r["node_id"]: r["title"]
+            for r in await conn.fetch("SELECT node_id, title FROM nodes WHERE project_id = $1", project_id)
+        }
+
+        query = "SELECT current_node_id, encrypted_payload FROM users WHERE project_id = $1"
+        params: list = [project_id]
+        if guild_id is not None:
+            query += " AND guild_id = $2"
+            params.append(guild_id)
+
+        with ProcessPoolExecutor(workers) as pool:
+            # Server-side cursor: rows arrive in chunks, never all at once
+            async with conn.transaction():
+                batch_nodes: List[int] = []
+                batch_payloads: List[bytes] = []
+                async for row in conn.cursor(query, *params, prefetch=chunk_size):
+                    node = row["current_node_id"]
+                    batch_nodes.append(-1 if node is None else node)
+                    batch_payloads.append(row["encrypted_payload"])
+                    if len(batch_payloads) == chunk_size:
+                        pending.append((
+                            loop.run_in_executor(pool, decode_histories, batch_payloads),
+                            np.asarray(batch_nodes, dtype=np.int32)
+                        ))
+                        batch_nodes, batch_payloads = [], []
+                        # Bound decoded-but-unmerged chunks held in memory
+                        await drain(workers * 2)
+                if batch_payloads:
+                    pending.append((
+                        loop.run_in_executor(pool, decode_histories, batch_payloads),
+                        np.asarray(batch_nodes, dtype=np.int32)
+                    ))
+            await drain(0)
+
+    return EventTable.concat(chunks, current), titles
+
+
+def write_results(path: str, stats: Dict[str, np.ndarray], events: Optional[EventTable], meta: dict):
+    arrays = dict(stats)
+    if events is not None:
+        arrays.update(
+            event_user=events.user, event_from=events.frm, event_to=events.to,
+            event_at=events.at, event_ec_gain=events.ec_gain
+        )
+    np.savez_compressed(path, meta=np.asarray(json.dumps(meta)), **arrays)
+
+
+def print_summary(stats: Dict[str, np.ndarray], titles: Dict[int, str], top: int = 20):
+    """Nodes with the most members stalled on them"""
+    order = np.argsort(-stats["stalled"], kind="stable")[:top]
+    print(f"{'node':>8}  {'title':<32}{'arrivals':>10}{'exits':>10}{'stalled':>9}{'drop-off':>10}{'dwell p50':>11}")
+    for i in order:
+        if not stats["stalled"][i]:
+            break
+        node_id = int(stats["node_ids"][i])
+        dwell = stats["median_dwell_s"][i]
+        print(
+            f"{node_id:>8}  {titles.get(node_id, '?')[:30]:<32}{stats['arrivals'][i]:>10}"
+            f"{stats['exits'][i]:>10}{stats['stalled'][i]:>9}{stats['drop_off'][i]:>10.1%}"
+            f"{'-' if np.isnan(dwell) else f'{dwell / 3600:.1f}h':>11}"
+        )
+
+
+async def run(args) -> int:
+    started = time.perf_counter()
+    try:
+        events, titles = await collect_events(args.project, args.guild, args.workers, args.chunk_size)
+    finally:
+        await get_engine().dispose()
+    decoded = time.perf_counter()
+
+    stats = funnel(events, np.asarray(sorted(titles), dtype=np.int32))
+    finished = time.perf_counter()
+    logger.info(
+        f"{len(events.lengths)} members, {len(events)} events: decoded in {decoded - started:.1f}s, "
+        f"analysed in {finished - decoded:.2f}s"
+    )
+
+    meta = {
+        "project": args.project,
+        "guild_id": args.guild,
+        "members": int(len(events.lengths)),
+        "events": int(len(events)),
+        "generated_at": time.time(),
+    }
+    if args.output:
+        write_results(args.output, stats, events if args.events else None, meta)
+        logger.info(f"Wrote {args.output}")
+    print_summary(stats, titles, args.top)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Funnel and drop-off analytics over path histories")
+    parser.add_argument("project", help="project slug")
+    parser.add_argument("--guild", type=int, help="only members of this guild")
+    parser.add_argument("--output", help="write results here (.npz)")
+    parser.add_argument("--events", action="store_true", help="also store the raw event columns")
+    parser.add_argument("--workers", type=int, help="decrypt processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="users per worker task")
+    parser.add_argument("--top", type=int, default=20, help="rows in the summary table")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        return asyncio.run(run(args))
+    except LookupError as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,12 +19,20 @@ class AudioManager:
             'achievement': 'assets/audio/achievement-unlock.mp3',
             'typing': 'assets/audio/matrix-typing.mp3'
         }
+        self._files_ready = False
+    
+    def _source(self, name: str) -> FFmpegPCMAudio:
+        # Placeholders are created on first playback rather than at startup
+        if not self._files_ready:
+            self.create_audio_files()
+            self._files_ready = True
+        return FFmpegPCMAudio(self.audio_files[name])
     
     async def play_intro(self, voice_client):
         """Play the cypherpunk intro audio"""
         if voice_client and voice_client.is_connected():
             try:
-                source = FFmpegPCMAudio(self.audio_files['intro'])
+                source = self._source('intro')
                 voice_client.play(source)
                 while voice_client.is_playing():
                     await asyncio.sleep(0.1)
@@ -35,7 +43,7 @@ class AudioManager:
         """Play success beep sound"""
         if voice_client and voice_client.is_connected():
             try:
-                source = FFmpegPCMAudio(self.audio_files['success'])
+                source = self._source('success')
                 voice_client.play(source)
             except:
                 pass  # Ignore audio errors in production
@@ -44,7 +52,7 @@ class AudioManager:
         """Play error glitch sound"""
         if voice_client and voice_client.is_connected():
             try:
-                source = FFmpegPCMAudio(self.audio_files['error'])
+                source = self._source('error')
                 voice_client.play(source)
             except:
                 pass
@@ -53,7 +61,7 @@ class AudioManager:
         """Play achievement unlock sound"""
         if voice_client and voice_client.is_connected():
             try:
-                source = FFmpegPCMAudio(self.audio_files['achievement'])
+                source = self._source('achievement')
                 voice_client.play(source)
             except:
                 pass
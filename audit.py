@@ -0,0 +1,359 @@
+# ========================================
+# ACA Bot Audit Log Queries
+# Keyset pages, time buckets & streaming exports
+# ========================================
+"""
+Read ``audit_log`` (a TimescaleDB hypertable) without OFFSET scans or
+unbounded result sets.
+
+- ``page()`` walks entries newest first with keyset pagination on
+  ``(created_at, log_id)``. Filtering by user rides ``idx_audit_user`` and by
+  action ``idx_audit_action``; the opaque cursor resumes strictly after the
+  last row returned, so pages stay O(limit) however deep they go.
+- ``buckets()`` counts entries per ``time_bucket`` (optionally per action).
+- ``export()`` streams matching rows through a server-side cursor as JSON
+  Lines or CSV in constant memory. Each fetched batch has its
+  ``payload_hash`` re-computed off the event loop, and the result reports
+  rows whose stored hash doesn't match.
+
+    python -m bot.core.audit export arcium --format csv --output audit.csv --since 2024-01-01
+    python -m bot.core.audit verify arcium --action bulk_grant_ec
+    python -m bot.core.audit buckets arcium --width 1h --since 2024-06-01
+"""
+import argparse
+import asyncio
+import base64
+import csv
+import hashlib
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+from uuid import UUID
+
+from sqlalchemy import DateTime, Interval, and_, func, literal, or_, select
+from sqlalchemy.sql import Select
+
+from .database import get_db_session, get_engine
+from .models import AuditLog, Project
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ("log_id", "created_at", "action", "user_id", "guild_id", "payload_hash", "hash_ok", "payload")
+MAX_REPORTED_MISMATCHES = 1000
+
+_TIMESTAMPTZ = DateTime(timezone=True)
+
+
+class AuditQueryError(ValueError):
+    """Malformed cursor, bucket width or time range"""
+
+
+def payload_digest(payload: Any) -> str:
+    """The ``payload_hash`` written with an audit entry"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _aware(value: datetime) -> datetime:
+    # created_at is TIMESTAMPTZ; naive inputs are taken as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    raw = f"{_aware(created_at).isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, log_id = raw.rsplit("|", 1)
+        return _aware(datetime.fromisoformat(created_at)), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise AuditQueryError(f"Invalid cursor: {cursor!r}") from e
+
+
+@dataclass(frozen=True, slots=True)
+class AuditFilter:
+    project_id: UUID
+    user_id: Optional[int] = None
+    action: Optional[str] = None
+    guild_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def apply(self, stmt: Select) -> Select:
+        # Equality columns lead the (project_id, user_id|action, created_at DESC) indexes
+        stmt = stmt.where(AuditLog.project_id == self.project_id)
+        if self.user_id is not None:
+            stmt = stmt.where(AuditLog.user_id == self.user_id)
+        if self.action is not None:
+            stmt = stmt.where(AuditLog.action == self.action)
+        if self.guild_id is not None:
+            stmt = stmt.where(AuditLog.guild_id == self.guild_id)
+        # Time bounds also let TimescaleDB exclude whole chunks
+        if self.since is not None:
+            stmt = stmt.where(AuditLog.created_at >= literal(_aware(self.since), _TIMESTAMPTZ))
+        if self.until is not None:
+            stmt = stmt.where(AuditLog.created_at < literal(_aware(self.until), _TIMESTAMPTZ))
+        return stmt
+
+
+@dataclass(slots=True)
+class AuditEntry:
+    log_id: int
+    created_at: datetime
+    action: str
+    user_id: Optional[int]
+    guild_id: Optional[int]
+    payload_hash: str
+    payload: Any
+
+    @property
+    def hash_ok(self) -> bool:
+        return payload_digest(self.payload) == self.payload_hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "log_id": self.log_id,
+            "created_at": _aware(self.created_at).isoformat() if self.created_at else None,
+            "action": self.action,
+            "user_id": self.user_id,
+            "guild_id": self.guild_id,
+            "payload_hash": self.payload_hash,
+            "payload": self.payload,
+        }
+
+
+@dataclass(slots=True)
+class AuditPage:
+    entries: List[AuditEntry]
+    # Pass back to page() for the next (older) page; None at the end
+    next_cursor: Optional[str]
+
+
+@dataclass(slots=True)
+class ExportResult:
+    rows: int = 0
+    mismatched: int = 0
+    mismatched_ids: List[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+_COLUMNS = (
+    AuditLog.log_id, AuditLog.created_at, AuditLog.action, AuditLog.user_id,
+    AuditLog.guild_id, AuditLog.payload_hash, AuditLog.payload
+)
+
+
+def _newest_first(stmt: Select) -> Select:
+    return stmt.order_by(AuditLog.created_at.desc(), AuditLog.log_id.desc())
+
+
+async def page(query: AuditFilter, cursor: Optional[str] = None, limit: int = 100) -> AuditPage:
+    """One page of entries, newest first, resuming after ``cursor``"""
+    if not 0 < limit <= 1000:
+        raise AuditQueryError("limit must be between 1 and 1000")
+    stmt = query.apply(select(*_COLUMNS))
+    if cursor:
+        created_at, log_id = decode_cursor(cursor)
+        after = literal(created_at, _TIMESTAMPTZ)
+        # Range on created_at (index-ordered), log_id only breaks ties within the same instant
+        stmt = stmt.where(
+            AuditLog.created_at <= after,
+            or_(AuditLog.created_at < after, and_(AuditLog.created_at == after, AuditLog.log_id < log_id))
+        )
+    # One extra row tells whether another page exists
+    stmt = _newest_first(stmt).limit(limit + 1)
+
+    async with get_db_session() as session:
+        rows = (await session.execute(stmt)).all()
+
+    entries = [AuditEntry(*row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = entries[-1]
+        next_cursor = encode_cursor(last.created_at, last.log_id)
+    return AuditPage(entries, next_cursor)
+
+
+async def buckets(
+    query: AuditFilter,
+    width: timedelta,
+    by_action: bool = True
+) -> List[Tuple[datetime, Optional[str], int]]:
+    """(bucket start, action or None, entries) per ``time_bucket``, oldest first"""
+    if width <= timedelta(0):
+        raise AuditQueryError("bucket width must be positive")
+    bucket = func.time_bucket(literal(width, Interval()), AuditLog.created_at).label("bucket")
+    columns = [bucket, AuditLog.action] if by_action else [bucket]
+    stmt = query.apply(select(*columns, func.count().label("entries")))
+    stmt = stmt.group_by(*columns).order_by(*columns)
+
+    async with get_db_session() as session:
+        rows = (await session.execute(stmt)).all()
+    if by_action:
+        return [(row.bucket, row.action, row.entries) for row in rows]
+    return [(row.bucket, None, row.entries) for row in rows]
+
+
+def _verify_batch(rows: Sequence[tuple]) -> List[Tuple[AuditEntry, bool]]:
+    entries = [AuditEntry(*row) for row in rows]
+    return [(entry, entry.hash_ok) for entry in entries]
+
+
+class _Writer:
+    def __init__(self, out: Optional[TextIO], fmt: str):
+        self.out = out
+        self.fmt = fmt
+        self.csv = None
+        if out is not None and fmt == "csv":
+            self.csv = csv.writer(out)
+            self.csv.writerow(EXPORT_FIELDS)
+        elif fmt not in ("jsonl", "csv"):
+            raise AuditQueryError(f"Unknown export format '{fmt}'")
+
+    def write(self, checked: List[Tuple[AuditEntry, bool]]):
+        if self.out is None:
+            return
+        for entry, ok in checked:
+            row = entry.to_dict()
+            row["hash_ok"] = ok
+            if self.csv is not None:
+                row["payload"] = json.dumps(row["payload"], sort_keys=True)
+                self.csv.writerow([row[name] for name in EXPORT_FIELDS])
+            else:
+                self.out.write(json.dumps(row, sort_keys=True) + "\n")
+
+
+async def export(
+    query: AuditFilter,
+    out: Optional[TextIO] = None,
+    fmt: str = "jsonl",
+    batch_size: int = 5000
+) -> ExportResult:
+    """Stream matching entries (newest first) to ``out``, verifying payload hashes per batch
+
+    With ``out=None`` this only verifies.
+    """
+    writer = _Writer(out, fmt)
+    result = ExportResult()
+    started = time.perf_counter()
+    stmt = _newest_first(query.apply(select(*_COLUMNS))).execution_options(yield_per=batch_size)
+
+    async with get_engine().connect() as conn:
+        # yield_per makes this a server-side cursor fetching batch_size rows at a time
+        stream = await conn.stream(stmt)
+        pending: Optional[asyncio.Future] = None
+        async for rows in stream.partitions(batch_size):
+            # Hash this batch in a thread while the next one is fetched
+            if pending is not None:
+                _collect(await pending, writer, result)
+            pending = asyncio.ensure_future(asyncio.to_thread(_verify_batch, [tuple(r) for r in rows]))
+        if pending is not None:
+            _collect(await pending, writer, result)
+
+    result.elapsed = time.perf_counter() - started
+    if result.mismatched:
+        logger.warning(f"{result.mismatched} of {result.rows} audit entries failed payload hash verification")
+    return result
+
+
+def _collect(checked: List[Tuple[AuditEntry, bool]], writer: _Writer, result: ExportResult):
+    writer.write(checked)
+    result.rows += len(checked)
+    for entry, ok in checked:
+        if not ok:
+            result.mismatched += 1
+            if len(result.mismatched_ids) < MAX_REPORTED_MISMATCHES:
+                result.mismatched_ids.append(entry.log_id)
+
+
+# ---- command line ------------------------------------------------------
+
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_width(spec: str) -> timedelta:
+    """'15m', '1h', '7d' -> timedelta"""
+    try:
+        return timedelta(**{_UNITS[spec[-1]]: float(spec[:-1])})
+    except (KeyError, ValueError, IndexError) as e:
+        raise AuditQueryError(f"Invalid bucket width '{spec}' (use e.g. 15m, 1h, 1d)") from e
+
+
+async def _project_id(slug: str) -> UUID:
+    async with get_db_session() as session:
+        project_id = (await session.execute(
+            select(Project.project_id).where(Project.project_slug == slug)
+        )).scalar_one_or_none()
+    if project_id is None:
+        raise AuditQueryError(f"Unknown project '{slug}'")
+    return project_id
+
+
+async def run(args) -> int:
+    try:
+        query = AuditFilter(
+            project_id=await _project_id(args.project),
+            user_id=args.user,
+            action=args.action,
+            guild_id=args.guild,
+            since=datetime.fromisoformat(args.since) if args.since else None,
+            until=datetime.fromisoformat(args.until) if args.until else None
+        )
+        if args.command == "buckets":
+            for start, action, entries in await buckets(query, parse_width(args.width), not args.total):
+                print(f"{_aware(start).isoformat():<27}{action or '*':<32}{entries:>10}")
+            return 0
+
+        if args.command == "export" and args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as out:
+                result = await export(query, out, args.format, args.batch_size)
+        elif args.command == "export":
+            result = await export(query, sys.stdout, args.format, args.batch_size)
+        else:
+            result = await export(query, None, batch_size=args.batch_size)
+    finally:
+        await get_engine().dispose()
+
+    logger.info(
+        f"{result.rows} entries in {result.elapsed:.1f}s, {result.mismatched} hash mismatches"
+        + (f" (log ids {result.mismatched_ids[:20]})" if result.mismatched else "")
+    )
+    return 1 if result.mismatched else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Query, export and verify the ACA audit log")
+    parser.add_argument("command", choices=("export", "verify", "buckets"))
+    parser.add_argument("project", help="project slug")
+    parser.add_argument("--user", type=int)
+    parser.add_argument("--action")
+    parser.add_argument("--guild", type=int)
+    parser.add_argument("--since", help="ISO timestamp (UTC if no offset)")
+    parser.add_argument("--until", help="ISO timestamp (UTC if no offset), exclusive")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--output", help="export file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--width", default="1h", help="bucket width for 'buckets'")
+    parser.add_argument("--total", action="store_true", help="one count per bucket instead of per action")
+    args = parser.parse_args(argv)
+
+    # Logs go to stderr so an export to stdout stays clean
+    logging.basicConfig(
+        level=logging.INFO, stream=sys.stderr,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        return asyncio.run(run(args))
+    except AuditQueryError as e:
+        logger.error(str(e))
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
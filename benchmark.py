@@ -0,0 +1,474 @@
+# ========================================
+# ACA Bot Engine Benchmark
+# Synthetic graphs, user populations & stage latency
+# ========================================
+"""
+Benchmark ACAGraphEngine against local Postgres/Redis stand-ins
+(``docker-compose up postgres redis``), or entirely in-process with
+``--backend memory``.
+
+    python -m bot.core.benchmark --nodes 5000 --users 2000 --concurrency 64 --duration 30 \\
+        --output bench.json --compare baseline.json
+    python -m bot.core.benchmark --backend memory --users 1000000
+
+A synthetic project (``bench-<seed>``) is generated and seeded through the
+content loader's bulk path (or straight into ``MemoryStorage``), users are
+COPYed in, and worker tasks then mix
+``get_user_state`` and ``traverse_edge`` calls (which include badge
+awarding). Per-operation and per-stage (cache, db, crypto, condition,
+badge_check, graph) latencies are collected through the engine's stage
+observer and written as JSON so runs can be compared, together with the
+storage calls made per operation and, against Postgres, the executions and
+compiled-cache hit rate of each prebuilt statement.
+
+``--statements N`` instead times the Python-side cost of the engine's
+prebuilt statements against building them per call, without any service.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import redis.asyncio as redis
+
+from .config import settings
+from .content_loader import ContentDocument, apply_diff, compute_diff
+from .database import get_engine
+from .encryption import encryption
+from .engine import ACAGraphEngine
+from .registry import BadgeSnapshot, EdgeSnapshot, NodeSnapshot
+from .statements import measure, statements
+from .storage import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+BENCH_GUILD_ID = 1
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "postgres", "redis"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3)
+    }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'none=80,min_ec=15,has_badge=5' -> normalised weights"""
+    weights = {}
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        weights[key.strip()] = float(value)
+    total = sum(weights.values())
+    return {k: v / total for k, v in weights.items()}
+
+
+class SyntheticProject:
+    """Generates a layered DAG with badges and a configurable condition mix"""
+
+    def __init__(
+        self,
+        nodes: int = 1000,
+        branching: int = 3,
+        window: int = 50,
+        badges: int = 20,
+        badge_nodes: int = 3,
+        condition_mix: str = "none=85,min_ec=10,has_badge=5",
+        cooldown_ratio: float = 0.0,
+        seed: int = 1
+    ):
+        self.nodes = nodes
+        self.branching = branching
+        self.window = window
+        self.badges = badges
+        self.badge_nodes = badge_nodes
+        self.condition_mix = parse_mix(condition_mix)
+        self.cooldown_ratio = cooldown_ratio
+        self.seed = seed
+
+    def document(self, slug: str, first_node_id: int, first_edge_id: int) -> dict:
+        rng = random.Random(self.seed)
+        ids = list(range(first_node_id, first_node_id + self.nodes))
+        badges = [
+            {
+                "slug": f"bench-{k}",
+                "name": f"Bench {k}",
+                "required_nodes": rng.sample(ids[1:], min(self.badge_nodes, len(ids) - 1)),
+                "required_ec": rng.choice((0, 0, 50, 200))
+            }
+            for k in range(self.badges)
+        ]
+
+        kinds = list(self.condition_mix)
+        weights = [self.condition_mix[k] for k in kinds]
+
+        def condition():
+            kind = rng.choices(kinds, weights)[0]
+            if kind == "min_ec":
+                return {"op": "min_ec", "val": rng.choice((10, 50, 100))}
+            if kind == "has_badge" and badges:
+                return {"op": "has_badge", "slug": rng.choice(badges)["slug"]}
+            return None
+
+        edges = {}
+        for i, node_id in enumerate(ids[1:], 1):
+            # One guaranteed parent keeps every node reachable from the root
+            parent = ids[rng.randint(max(0, i - self.window), i - 1)]
+            edges[(parent, node_id)] = None
+        for i, node_id in enumerate(ids[:-1]):
+            for _ in range(self.branching - 1):
+                target = ids[rng.randint(i + 1, min(i + self.window, len(ids) - 1))]
+                edges.setdefault((node_id, target), None)
+
+        edge_docs = []
+        for edge_id, (src, dst) in enumerate(sorted(edges), first_edge_id):
+            edge_docs.append({
+                "id": edge_id,
+                "from": src,
+                "to": dst,
+                "text": f"{src}->{dst}",
+                "order": dst - src,
+                "ec_gain": rng.randint(1, 20),
+                "cooldown": 30 if rng.random() < self.cooldown_ratio else 0,
+                "condition": condition()
+            })
+
+        root = ids[0]
+        return {
+            "project": slug,
+            "root_nodes": {"explorer": root, "builder": root, "guardian": root},
+            "entry_edges": {p: edge_docs[0]["id"] for p in ("explorer", "builder", "guardian")},
+            "nodes": [
+                {"id": node_id, "title": f"Bench node {node_id}", "root": node_id == root}
+                for node_id in ids
+            ],
+            "edges": edge_docs,
+            "badges": badges
+        }
+
+
+async def seed_project(slug: str, project: SyntheticProject, users: int) -> List[int]:
+    """Create the benchmark project, its content and user rows; returns user ids"""
+    async with get_engine().connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        async with conn.transaction():
+            project_id = await conn.fetchval(
+                "INSERT INTO projects (project_slug, project_name, encryption_key_id, config) "
+                "VALUES ($1, $2, (SELECT key_id FROM vault_keys ORDER BY created_at LIMIT 1), '{}') "
+                "RETURNING project_id",
+                slug, f"Benchmark {slug}"
+            )
+            first_node = await conn.fetchval("SELECT COALESCE(MAX(node_id), 0) + 1 FROM nodes")
+            first_edge = await conn.fetchval("SELECT COALESCE(MAX(edge_id), 0) + 1 FROM edges")
+
+            doc = ContentDocument(project.document(slug, first_node, first_edge))
+            diff = await compute_diff(conn, doc, project_id, {}, prune=False)
+            await apply_diff(conn, diff, project_id)
+
+            user_ids = [10 ** 12 + i for i in range(users)]
+            empty = {"path_history": [], "preferences": {}}
+            await conn.copy_records_to_table(
+                "users",
+                records=[
+                    (uid, BENCH_GUILD_ID, project_id, first_node, 0, False, encryption.encrypt_record(empty))
+                    for uid in user_ids
+                ],
+                columns=["user_id", "guild_id", "project_id", "current_node_id", "ec_total",
+                         "is_mentor", "encrypted_payload"]
+            )
+    logger.info(f"Seeded '{slug}': {len(doc.nodes)} nodes, {len(doc.edges)} edges, {users} users")
+    return user_ids
+
+
+def seed_memory(storage: MemoryStorage, slug: str, project: SyntheticProject, users: int) -> List[int]:
+    """Load the synthetic project and its users into in-memory storage; returns user ids"""
+    doc = project.document(slug, 1, 1)
+    nodes = [
+        NodeSnapshot(n["id"], n["title"], None, None, 0, False, n.get("root", False))
+        for n in doc["nodes"]
+    ]
+    edges = [
+        EdgeSnapshot(e["id"], e["from"], e["to"], e["text"], e["order"], e["condition"], e["ec_gain"], e["cooldown"])
+        for e in doc["edges"]
+    ]
+    badges = [
+        BadgeSnapshot(badge_id, b["slug"], b["name"], None, None, None, tuple(b["required_nodes"]), b["required_ec"])
+        for badge_id, b in enumerate(doc["badges"], 1)
+    ]
+    config = {"root_nodes": doc["root_nodes"], "entry_edges": doc["entry_edges"]}
+    project_id = storage.add_project(slug, f"Benchmark {slug}", config, nodes, edges, badges)
+
+    user_ids = [10 ** 12 + i for i in range(users)]
+    empty = encryption.encrypt_record({"path_history": [], "preferences": {}})
+    storage.add_users(BENCH_GUILD_ID, project_id, user_ids, nodes[0].node_id, empty)
+    logger.info(f"Seeded '{slug}' in memory: {len(nodes)} nodes, {len(edges)} edges, {users} users")
+    return user_ids
+
+
+async def drop_project(slug: str, redis_client: redis.Redis):
+    async with get_engine().connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        async with conn.transaction():
+            project_id = await conn.fetchval("SELECT project_id FROM projects WHERE project_slug = $1", slug)
+            if project_id is None:
+                return
+            for table in ("user_badges", "users", "edges", "badges", "nodes"):
+                await conn.execute(f"DELETE FROM {table} WHERE project_id = $1", project_id)
+            await conn.execute("DELETE FROM projects WHERE project_id = $1", project_id)
+
+    keys = [k async for k in redis_client.scan_iter(f"user:*:guild:{BENCH_GUILD_ID}:project:{slug}:state")]
+    if keys:
+        await redis_client.delete(*keys)
+
+
+class BenchmarkRun:
+    """Concurrent engine workload with per-operation and per-stage timing"""
+
+    def __init__(
+        self,
+        engine: ACAGraphEngine,
+        slug: str,
+        user_ids: List[int],
+        concurrency: int,
+        duration: float,
+        read_ratio: float,
+        seed: int = 1
+    ):
+        self.engine = engine
+        self.slug = slug
+        self.user_ids = user_ids
+        self.concurrency = concurrency
+        self.duration = duration
+        self.read_ratio = read_ratio
+        self.rng = random.Random(seed)
+        self.stages: Dict[str, List[float]] = {}
+        self.operations: Dict[str, List[float]] = {"get_user_state": [], "traverse_edge": []}
+        self.outcomes: Counter = Counter()
+
+    def _record_stage(self, stage: str, seconds: float):
+        self.stages.setdefault(stage, []).append(seconds)
+
+    async def _worker(self, deadline: float):
+        graph = await self.engine.registry.get_graph(self.slug)
+        while time.perf_counter() < deadline:
+            user_id = self.rng.choice(self.user_ids)
+
+            started = time.perf_counter()
+            try:
+                _, node_id = await self.engine.get_user_state(user_id, BENCH_GUILD_ID, self.slug)
+            except Exception as e:
+                self.outcomes[f"error:{type(e).__name__}"] += 1
+                continue
+            self.operations["get_user_state"].append(time.perf_counter() - started)
+
+            if self.rng.random() < self.read_ratio:
+                continue
+            options = graph.outgoing_edges(node_id)
+            if not options:
+                self.outcomes["dead_end"] += 1
+                continue
+
+            started = time.perf_counter()
+            try:
+                ok, error, _ = await self.engine.traverse_edge(
+                    user_id, BENCH_GUILD_ID, self.rng.choice(options).edge_id, self.slug
+                )
+            except Exception as e:
+                self.outcomes[f"error:{type(e).__name__}"] += 1
+                continue
+            self.operations["traverse_edge"].append(time.perf_counter() - started)
+            self.outcomes["ok" if ok else error.split(" ")[0].lower()] += 1
+
+    async def run(self) -> dict:
+        self.engine.observer = self._record_stage
+        started = time.perf_counter()
+        deadline = started + self.duration
+        try:
+            await asyncio.gather(*(self._worker(deadline) for _ in range(self.concurrency)))
+        finally:
+            self.engine.observer = None
+        elapsed = time.perf_counter() - started
+
+        total_ops = sum(len(v) for v in self.operations.values())
+        calls = self.engine.storage.calls
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "throughput_ops_s": round(total_ops / elapsed, 1),
+            "traversals_s": round(len(self.operations["traverse_edge"]) / elapsed, 1),
+            "operations": {op: summarize(v) for op, v in self.operations.items()},
+            "stages": {stage: summarize(v) for stage, v in sorted(self.stages.items())},
+            "outcomes": dict(self.outcomes),
+            "storage": {
+                "backend": self.engine.storage.name,
+                "calls": dict(sorted(calls.items())),
+                "calls_per_op": round(sum(calls.values()) / total_ops, 3) if total_ops else 0.0
+            }
+        }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Human-readable deltas; returns the list of regressions beyond tolerance"""
+    regressions = []
+    print(f"{'metric':<40}{'baseline':>12}{'current':>12}{'delta':>9}")
+    rows = [("throughput_ops_s", baseline["throughput_ops_s"], current["throughput_ops_s"], True)]
+    for section in ("operations", "stages"):
+        for name, stats in current[section].items():
+            base = baseline.get(section, {}).get(name)
+            if not base:
+                continue
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                rows.append((f"{section}.{name}.{key}", base[key], stats[key], False))
+
+    for metric, base, cur, higher_is_better in rows:
+        delta = (cur - base) / base if base else 0.0
+        worse = -delta if higher_is_better else delta
+        flag = " !" if worse > tolerance else ""
+        print(f"{metric:<40}{base:>12.3f}{cur:>12.3f}{delta:>+8.1%}{flag}")
+        if worse > tolerance:
+            regressions.append(metric)
+    return regressions
+
+
+async def _run(engine: ACAGraphEngine, slug: str, user_ids: List[int], args) -> dict:
+    # Warm the snapshot so graph loading isn't measured as request latency
+    await engine.registry.get_graph(slug)
+    await engine.registry.get_badges(slug)
+    engine.storage.calls.clear()
+    return await BenchmarkRun(
+        engine, slug, user_ids, args.concurrency, args.duration, args.read_ratio, args.seed
+    ).run()
+
+
+async def _run_postgres(slug: str, project: SyntheticProject, args) -> dict:
+    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        await drop_project(slug, redis_client)
+        user_ids = await seed_project(slug, project, args.users)
+        statements.reset()
+        results = await _run(ACAGraphEngine(redis_client), slug, user_ids, args)
+        results["statements"] = statements.stats()
+        return results
+    finally:
+        if not args.keep:
+            await drop_project(slug, redis_client)
+        await redis_client.close()
+        await get_engine().dispose()
+
+
+async def run_benchmark(args) -> dict:
+    slug = f"bench-{args.seed}"
+    project = SyntheticProject(
+        nodes=args.nodes,
+        branching=args.branching,
+        badges=args.badges,
+        badge_nodes=args.badge_nodes,
+        condition_mix=args.condition_mix,
+        cooldown_ratio=args.cooldown_ratio,
+        seed=args.seed
+    )
+    if args.backend == "memory":
+        storage = MemoryStorage()
+        user_ids = seed_memory(storage, slug, project, args.users)
+        results = await _run(ACAGraphEngine(storage=storage), slug, user_ids, args)
+    else:
+        results = await _run_postgres(slug, project, args)
+
+    results["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ACA graph engine")
+    parser.add_argument("--backend", choices=("postgres", "memory"), default="postgres")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--branching", type=int, default=3)
+    parser.add_argument("--badges", type=int, default=20)
+    parser.add_argument("--badge-nodes", type=int, default=3, help="required nodes per badge")
+    parser.add_argument("--condition-mix", default="none=85,min_ec=10,has_badge=5")
+    parser.add_argument("--cooldown-ratio", type=float, default=0.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--read-ratio", type=float, default=0.3, help="share of iterations that only read state")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic project afterwards")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression (fraction)")
+    parser.add_argument("--allow-remote", action="store_true", help="permit non-local database/redis hosts")
+    parser.add_argument(
+        "--statements", type=int, metavar="N",
+        help="only time N executions of each prebuilt statement against building it per call (no services needed)"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.statements:
+        print(json.dumps(measure(args.statements), indent=2))
+        return 0
+
+    hosts = {urlparse(settings.DATABASE_URL or "").hostname, urlparse(settings.REDIS_URL).hostname}
+    if args.backend == "postgres" and not args.allow_remote and not hosts <= LOCAL_HOSTS:
+        logger.error(f"Refusing to benchmark against non-local hosts {sorted(hosts - LOCAL_HOSTS)}")
+        return 2
+
+    results = asyncio.run(run_benchmark(args))
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            logger.error(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,13 @@ import discord
 from discord import Embed, Interaction, app_commands, File
 from discord.ext import commands
 import asyncio
+import hashlib
+import json
+import logging
 import random
+import time
+from typing import Literal, Optional
+from sqlalchemy import select, text
 
 from .engine import ACAGraphEngine
 from .database import get_db_session
@@ -13,23 +19,57 @@ from .models import User, Badge, user_badges
 from .config import settings
 from .audio_manager import audio_manager
 from .visual_effects import visual_effects
+from .metrics import metrics, MetricsServer, LoopLagMonitor
+from .redis_gateway import RedisGateway
+from .views import ChoiceId, ChoiceView
+from .bulk import BulkError, BulkOperations, BulkResult
+from .mentors import ANY_TOPIC, MentorService
+from .roles import RoleGrantQueue, RoleGrantWorker
+from .admission import CHEAP, HEAVY, NORMAL, admission
+from .warmup import CacheWarmer
+from .members import MemberDirectory
+from . import snapshot
 import redis.asyncio as redis
 
-class ACABot(commands.Bot):
+LOOP_LAG = metrics.gauge("aca_event_loop_lag_seconds", "Most recent event loop wake-up delay")
+GATEWAY_LATENCY = metrics.gauge("aca_gateway_latency_seconds", "Heartbeat latency per shard", ("shard",))
+GUILDS = metrics.gauge("aca_guilds", "Guilds served by this process")
+STARTUP_PHASE = metrics.gauge("aca_startup_phase_seconds", "Duration of each startup phase", ("phase",))
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_START = time.perf_counter()
+COMMAND_HASH_KEY = "aca:command_tree_hash:{guild_id}"
+
+class ACABot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
+        intents.presences = settings.PRESENCE_INTENT
         
         super().__init__(
             command_prefix="!",
             intents=intents,
-            help_command=None
+            help_command=None,
+            # Set per worker by the cluster launcher; unset runs every shard here
+            shard_ids=settings.SHARD_IDS,
+            shard_count=settings.SHARD_COUNT or None
         )
         
         self.engine = ACAGraphEngine(
-            redis_client=redis.from_url(settings.REDIS_URL, decode_responses=True)
+            redis_client=RedisGateway(redis.from_url(settings.REDIS_URL, decode_responses=True))
         )
+        self.bulk = BulkOperations(self.engine)
+        self.role_grants = RoleGrantQueue(self.engine.redis.client, self.engine.registry)
+        self.engine.on_badges_awarded = self.role_grants.badges_awarded
+        self.role_worker = RoleGrantWorker(self, self.role_grants)
+        self.warmer = CacheWarmer(self.engine)
+        self.members = MemberDirectory(self.engine.redis)
+        self.mentors = MentorService()
+        self.mentors.track_presence = settings.PRESENCE_INTENT
+        self.snapshot_path = settings.SNAPSHOT_PATH.format(cluster_id=settings.CLUSTER_ID)
+        self._shutdown: Optional[asyncio.Task] = None
         
         # Cypherpunk colors and styling
         self.cypherpunk_colors = [
@@ -42,9 +82,156 @@ class ACABot(commands.Bot):
         ]
     
     async def setup_hook(self):
-        await self.tree.sync(guild=discord.Object(id=settings.GUILD_ID))
-        # Create audio files if they don't exist
-        audio_manager.create_audio_files()
+        # Time from module load through login to here
+        self.startup_timings = {"login": time.perf_counter() - _PROCESS_START}
+        self.engine.registry.start()
+        self.role_worker.start()
+        # Before warming, so projects carried over from the last process aren't reloaded
+        await self._timed_phase("snapshot", self._load_snapshot())
+        if metrics.enabled:
+            await self._timed_phase("metrics", self._start_metrics())
+        # Warm what the first interactions need concurrently; command sync runs
+        # in the background since the gateway doesn't wait for it
+        await asyncio.gather(
+            self._timed_phase("warm_project", self._warm_default_project()),
+            self._timed_phase("warm_redis", self.engine.redis.ping()),
+            self._timed_phase("warm_database", self._warm_database()),
+            return_exceptions=True
+        )
+        self._command_sync = asyncio.create_task(self._timed_phase("command_sync", self._sync_commands()))
+        self._command_sync.add_done_callback(self._command_sync_done)
+        self.startup_timings["setup_hook"] = time.perf_counter() - _PROCESS_START
+    
+    async def close(self):
+        # Signal handlers and discord.py may both call close(); shut down once
+        if self._shutdown is None:
+            self._shutdown = asyncio.create_task(self._graceful_shutdown())
+        await asyncio.shield(self._shutdown)
+    
+    async def _graceful_shutdown(self):
+        """Stop taking interactions, let running ones finish, then persist what the next process can reuse"""
+        started = time.perf_counter()
+        deadline = started + settings.SHUTDOWN_DRAIN_SECONDS
+        admission.close()
+        drained = await admission.drain(deadline - time.perf_counter())
+        # Engine calls made outside interactions (warm-up, background tasks)
+        drained = await self.engine.drain(max(deadline - time.perf_counter(), 0)) and drained
+        if not drained:
+            logger.warning(
+                f"Shutdown deadline reached with {admission.running} interactions and "
+                f"{self.engine.in_flight} engine calls still running"
+            )
+        await self.role_worker.stop()
+        await self.engine.registry.stop()
+        if not await self.engine.redis.flush():
+            logger.warning("Redis still unavailable; outage changes are kept in the snapshot")
+        await self._dump_snapshot()
+        logger.info(f"Drained and saved state in {time.perf_counter() - started:.2f}s")
+        await super().close()
+    
+    async def _load_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            report = await snapshot.load(
+                self.snapshot_path, self.engine.registry, self.engine.redis, settings.SNAPSHOT_MAX_AGE_SECONDS
+            )
+        except Exception as e:
+            logger.warning(f"Ignoring cache snapshot {self.snapshot_path}: {e}")
+            return
+        if report is None:
+            return
+        logger.info(
+            f"Loaded cache snapshot in {report.seconds * 1000:.1f}ms ({report.size} bytes): "
+            f"{report.projects} projects ({report.stale_projects} stale), {report.cache_entries} cache entries"
+        )
+        if report.cache_entries:
+            await self.engine.redis.flush()
+    
+    async def _dump_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            report = await snapshot.dump(self.snapshot_path, self.engine.registry, self.engine.redis)
+        except Exception as e:
+            logger.warning(f"Could not write cache snapshot {self.snapshot_path}: {e}")
+            return
+        if report is not None:
+            logger.info(
+                f"Wrote cache snapshot in {report.seconds * 1000:.1f}ms ({report.size} bytes): "
+                f"{report.projects} projects, {report.cache_entries} cache entries"
+            )
+    
+    async def _timed_phase(self, phase: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        except Exception as e:
+            logger.warning(f"Startup phase {phase} failed: {e}")
+            raise
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started
+            STARTUP_PHASE.labels(phase).set(self.startup_timings[phase])
+    
+    async def _warm_default_project(self):
+        registry = self.engine.registry
+        await registry.get(settings.DEFAULT_PROJECT)
+        await asyncio.gather(
+            registry.get_graph(settings.DEFAULT_PROJECT),
+            registry.get_badges(settings.DEFAULT_PROJECT)
+        )
+    
+    async def _warm_database(self):
+        # Opens the first pooled connection so the first command doesn't pay for it
+        async with get_db_session() as session:
+            await session.execute(text("SELECT 1"))
+    
+    @staticmethod
+    def _command_sync_done(task: asyncio.Task):
+        # Nothing awaits the sync; _timed_phase already logged a failure, so
+        # retrieving the exception here only keeps asyncio from reporting it again
+        if not task.cancelled():
+            task.exception()
+    
+    async def _sync_commands(self):
+        """Sync the guild command tree only when its definition changed"""
+        # One process per deployment is enough; every worker registers the same tree
+        if settings.CLUSTER_ID != 0:
+            return
+        guild = discord.Object(id=settings.GUILD_ID)
+        definition = json.dumps(
+            [command.to_dict() for command in self.tree.get_commands(guild=guild)]
+            + [command.to_dict() for command in self.tree.get_commands()],
+            sort_keys=True
+        )
+        digest = hashlib.sha256(definition.encode()).hexdigest()
+        key = COMMAND_HASH_KEY.format(guild_id=settings.GUILD_ID)
+        
+        if not settings.FORCE_COMMAND_SYNC:
+            try:
+                if await self.engine.redis.get(key) == digest:
+                    logger.info("Command tree unchanged, skipping sync")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not read command tree hash, syncing anyway: {e}")
+        
+        await self.tree.sync(guild=guild)
+        await self.engine.redis.set(key, digest)
+        logger.info(f"Command tree synced ({digest[:12]})")
+    
+    async def _start_metrics(self):
+        self.engine.observer = metrics.observe_stage
+        metrics.add_collector(self._collect_gateway_metrics)
+        self.loop_lag = LoopLagMonitor(on_sample=LOOP_LAG.set)
+        self.loop_lag.start()
+        self.metrics_server = MetricsServer(metrics, settings.METRICS_HOST, settings.METRICS_PORT)
+        await self.metrics_server.start()
+    
+    def _collect_gateway_metrics(self):
+        for shard_id, latency in self.latencies:
+            if latency == latency and latency != float("inf"):
+                GATEWAY_LATENCY.labels(shard_id).set(latency)
+        GUILDS.set(len(self.guilds))
 
 bot = ACABot()
 
@@ -54,10 +241,19 @@ async def on_ready():
     print(f"🎨 Cypherpunk Edition Activated")
     print(f"🔐 Privacy-First Learning Platform")
     print(f"🌐 Connected to {len(bot.guilds)} guilds")
+    bot.warmer.on_ready([guild.id for guild in bot.guilds])
+    timings = getattr(bot, "startup_timings", None)
+    if timings is not None and "ready" not in timings:
+        timings["ready"] = time.perf_counter() - _PROCESS_START
+        STARTUP_PHASE.labels("ready").set(timings["ready"])
+        logger.info(
+            "Startup timing: " + ", ".join(f"{phase}={seconds:.3f}s" for phase, seconds in timings.items())
+        )
 
 @bot.event
 async def on_guild_join(guild):
     """Welcome message when bot joins a new guild"""
+    bot.warmer.on_guild_join(guild.id)
     try:
         # Find a channel to send welcome message
         channel = None
@@ -87,6 +283,7 @@ async def on_guild_join(guild):
         print(f"Error sending welcome message: {e}")
 
 @bot.tree.command(name="start", description="Begin your Web3 learning journey")
+@admission.guard(CHEAP, ack_delay=1.5)
 async def start_command(interaction: Interaction):
     """Entry point with cypherpunk styling"""
     # Send typing effect
@@ -120,7 +317,7 @@ async def start_command(interaction: Interaction):
     embed.set_thumbnail(url="attachment://arcium-logo-cypherpunk.png")
     embed.set_image(url="https://media.giphy.com/media/3o7aCTPPm4OHfRLSH6/giphy.gif")  # Matrix-style background
     
-    view = PathSelectionView()
+    view = await path_selection_view()
     
     await interaction.response.send_message(
         embed=embed,
@@ -129,79 +326,95 @@ async def start_command(interaction: Interaction):
         file=File("assets/images/arcium-logo-cypherpunk.png")
     )
 
-class PathSelectionView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=300)
+# Labels for the academy's own paths when a project's config doesn't set path_labels
+DEFAULT_PATH_LABELS = {
+    "explorer": "🌐 EXPLORER",
+    "builder": "⚒️ BUILDER",
+    "guardian": "🛡️ GUARDIAN"
+}
+
+async def path_selection_view(project_slug: str = None) -> ChoiceView:
+    """One button per path of the project that has an entry edge"""
+    project = await bot.engine.registry.get(project_slug or settings.DEFAULT_PROJECT)
+    graph = await bot.engine.registry.get_graph(project.slug)
+    choices = []
+    for path, edge_id in project.entry_paths():
+        edge = graph.edges.get(edge_id)
+        if edge is None:
+            continue
+        choices.append((edge, project.path_label(path, DEFAULT_PATH_LABELS.get(path))))
+    return ChoiceView(project.slug, choices)
+
+@bot.listen()
+async def on_interaction(interaction: Interaction):
+    if interaction.type == discord.InteractionType.component:
+        await handle_component(interaction)
+
+async def handle_component(interaction: Interaction) -> bool:
+    """Route a graph-choice button click; False if the custom_id isn't ours"""
+    choice = ChoiceId.parse((interaction.data or {}).get("custom_id", ""))
+    if choice is None:
+        return False
+    await admission.run(interaction, NORMAL, _select_choice, choice)
+    return True
+
+async def _play_feedback(interaction: Interaction, success: bool):
+    if interaction.user.voice and interaction.user.voice.channel:
+        voice_client = interaction.guild.voice_client
+        if voice_client:
+            if success:
+                await audio_manager.play_success_sound(voice_client)
+            else:
+                await audio_manager.play_error_sound(voice_client)
+
+async def _select_choice(interaction: Interaction, choice: ChoiceId):
+    # Send typing effect
+    await visual_effects.send_typing_effect(interaction.channel, 1.0)
     
-    @discord.ui.button(
-        label="🌐 EXPLORER",
-        style=discord.ButtonStyle.primary,
-        custom_id="explorer_path"
-    )
-    async def explorer_button(self, interaction: Interaction, button: discord.ui.Button):
-        await self._select_path(interaction, "explorer")
+    graph = await bot.engine.registry.get_graph(choice.project_slug)
+    edge = graph.edges.get(choice.edge_id)
     
-    @discord.ui.button(
-        label="⚒️ BUILDER", 
-        style=discord.ButtonStyle.success,
-        custom_id="builder_path"
-    )
-    async def builder_button(self, interaction: Interaction, button: discord.ui.Button):
-        await self._select_path(interaction, "builder")
+    if edge is None or edge.from_node_id != choice.node_id:
+        # Content changed since the button was rendered
+        success, error, new_node = False, "This choice is no longer available", None
+    else:
+        success, error, new_node = await bot.engine.traverse_edge(
+            interaction.user.id, interaction.guild_id, edge.edge_id, choice.project_slug,
+            request_id=interaction.id
+        )
     
-    @discord.ui.button(
-        label="🛡️ GUARDIAN",
-        style=discord.ButtonStyle.danger,
-        custom_id="guardian_path"
-    )
-    async def guardian_button(self, interaction: Interaction, button: discord.ui.Button):
-        await self._select_path(interaction, "guardian")
+    await _play_feedback(interaction, success)
     
-    async def _select_path(self, interaction: Interaction, path: str):
-        # Send typing effect
-        await visual_effects.send_typing_effect(interaction.channel, 1.0)
-        
-        root_map = {"explorer": 1, "builder": 101, "guardian": 201}
-        edge_id = root_map.get(path, 1)
-        
-        success, error, new_node = await bot.engine.traverse_edge(
-            interaction.user.id, interaction.guild_id, edge_id
+    if success:
+        node = graph.nodes.get(new_node)
+        embed = visual_effects.create_cypherpunk_embed(
+            "✅ PATH SELECTED",
+            f"You chose: {edge.choice_text}\n"
+            f"You are now at Node #{new_node}" + (f" — {node.title}" if node else "") + "\n\n"
+            f"{visual_effects.create_progress_bar(10)}\n\n"
+            f"Your journey into Web3 privacy continues...",
+            glitch_level=2
         )
-        
-        if success:
-            # Play success sound if in voice channel
-            if interaction.user.voice and interaction.user.voice.channel:
-                voice_client = interaction.guild.voice_client
-                if voice_client:
-                    await audio_manager.play_success_sound(voice_client)
-            
-            embed = visual_effects.create_cypherpunk_embed(
-                "✅ PATH SELECTED",
-                f"Welcome to the {path.upper()} path!\n"
-                f"You are now at Node #{new_node}\n\n"
-                f"{visual_effects.create_progress_bar(10)}\n\n"
-                f"Your journey into Web3 privacy begins now...",
-                glitch_level=2
+        # Next choices come straight from the graph's outgoing edges
+        next_edges = graph.outgoing_edges(new_node)
+        if next_edges:
+            await interaction.response.send_message(
+                embed=embed, view=ChoiceView.for_edges(choice.project_slug, next_edges), ephemeral=True
             )
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
         else:
-            # Play error sound
-            if interaction.user.voice and interaction.user.voice.channel:
-                voice_client = interaction.guild.voice_client
-                if voice_client:
-                    await audio_manager.play_error_sound(voice_client)
-            
-            embed = visual_effects.create_cypherpunk_embed(
-                "❌ ACCESS DENIED",
-                f"Error: {error}\n\n"
-                f"The system has detected an anomaly in your request.",
-                glitch_level=4
-            )
-            
             await interaction.response.send_message(embed=embed, ephemeral=True)
+    else:
+        embed = visual_effects.create_cypherpunk_embed(
+            "❌ ACCESS DENIED",
+            f"Error: {error}\n\n"
+            f"The system has detected an anomaly in your request.",
+            glitch_level=4
+        )
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="profile", description="View your encrypted learning profile")
+@admission.guard(HEAVY, ack_delay=1.0)
 async def profile_command(interaction: Interaction, member: discord.Member = None):
     target = member or interaction.user
     
@@ -267,35 +480,39 @@ async def profile_command(interaction: Interaction, member: discord.Member = Non
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="leaderboard", description="View the encrypted rankings")
-async def leaderboard_command(interaction: Interaction, range: str = "weekly"):
+@app_commands.describe(size="rows per page", page="page number")
+@admission.guard(HEAVY, ack_delay=1.5)
+async def leaderboard_command(
+    interaction: Interaction,
+    range: str = "weekly",
+    size: app_commands.Range[int, 1, 25] = 10,
+    page: app_commands.Range[int, 1, 100] = 1
+):
     # Send typing effect
     await visual_effects.send_typing_effect(interaction.channel, 1.5)
     
-    async with get_db_session() as session:
-        stmt = select(User).where(
-            User.guild_id == interaction.guild_id
-        ).order_by(User.ec_total.desc()).limit(10)
-        
-        top_users = (await session.execute(stmt)).scalars().all()
+    first = (page - 1) * size
+    top_users = (await bot.engine.leaderboard(interaction.guild_id, limit=first + size))[first:]
+    # One bulk lookup for the whole page instead of a member fetch per row
+    names = await bot.members.resolve(interaction.guild, [user.user_id for user in top_users])
     
     embed = visual_effects.create_cypherpunk_embed(
         "🏆 ENCRYPTED RANKINGS",
-        "Top performers in the Arcium Academy",
+        "Top performers in the Arcium Academy" + (f" · page {page}" if page > 1 else ""),
         glitch_level=2
     )
     
     # Add leaderboard with glitch effects
-    for idx, user in enumerate(top_users, 1):
-        member = interaction.guild.get_member(user.user_id)
-        name = member.display_name if member else f"User {user.user_id}"
-        
-        rank_emoji = ["🥇", "🥈", "🥉", "🏅", "🏅", "🏅", "🏅", "🏅", "🏅", "🏅"][idx-1]
+    for idx, user in enumerate(top_users, first + 1):
+        rank_emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(idx, "🏅")
         
         embed.add_field(
-            name=f"{rank_emoji} #{idx} - {visual_effects.glitch_text(name)}",
+            name=f"{rank_emoji} #{idx} - {visual_effects.glitch_text(names[user.user_id])}",
             value=f"**{user.ec_total}** EEC | Node #{user.current_node_id or 0}",
             inline=False
         )
+    if not top_users:
+        embed.add_field(name="🔴 NO RANKINGS ON THIS PAGE", value="Try an earlier page.", inline=False)
     
     # Add matrix-style footer
     embed.set_footer(
@@ -305,6 +522,7 @@ async def leaderboard_command(interaction: Interaction, range: str = "weekly"):
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="challenge", description="View current learning challenges")
+@admission.guard(CHEAP, ack_delay=1.0)
 async def challenge_command(interaction: Interaction):
     # Send typing effect
     await visual_effects.send_typing_effect(interaction.channel, 1.0)
@@ -356,63 +574,143 @@ async def challenge_command(interaction: Interaction):
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+@bot.listen()
+async def on_voice_state_update(member, before, after):
+    bot.mentors.on_member_update(member)
+
+@bot.listen()
+async def on_presence_update(before, after):
+    bot.mentors.on_member_update(after)
+
+@bot.listen()
+async def on_member_update(before, after):
+    await bot.members.on_member_update(before, after)
+
+@bot.listen()
+async def on_user_update(before, after):
+    await bot.members.on_user_update(before, after)
+
+@bot.listen()
+async def on_member_remove(member):
+    await bot.members.on_member_remove(member)
+
+async def _badge_topic_autocomplete(interaction: Interaction, current: str):
+    catalogue = await bot.engine.registry.get_badges(settings.DEFAULT_PROJECT)
+    current = current.lower()
+    return [
+        app_commands.Choice(name=f"{badge.emoji or '🏅'} {badge.name}", value=badge.slug)
+        for badge in catalogue.badges
+        if current in badge.slug or current in badge.name.lower()
+    ][:25]
+
+def _mentor_name(guild: discord.Guild, user_id: int) -> str:
+    member = guild.get_member(user_id)
+    return member.display_name if member else f"Mentor {user_id}"
+
+async def _reply(interaction: Interaction, content: str = None, **kwargs):
+    """Ephemeral reply, as a follow-up when the interaction was deferred"""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True, **kwargs)
+    else:
+        await interaction.response.send_message(content, ephemeral=True, **kwargs)
+
 @bot.tree.command(name="mentor", description="Connect with expert mentors")
-async def mentor_command(interaction: Interaction):
+@app_commands.describe(
+    action="list available mentors, connect to one, or end your session",
+    topic="badge you want help with"
+)
+@app_commands.autocomplete(topic=_badge_topic_autocomplete)
+@admission.guard(CHEAP, ack_delay=1.0)
+async def mentor_command(
+    interaction: Interaction,
+    action: Literal["list", "connect", "end"] = "list",
+    topic: str = None
+):
+    if not bot.mentors.is_loaded(interaction.guild_id):
+        # The guild's first use queries Postgres; acknowledge before that
+        await interaction.response.defer(ephemeral=True, thinking=True)
+    
     # Send typing effect
     await visual_effects.send_typing_effect(interaction.channel, 1.0)
     
+    index = await bot.mentors.index(interaction.guild)
+    
+    if action == "end":
+        session = index.end_session(interaction.user.id)
+        message = (
+            f"🔓 Session with {_mentor_name(interaction.guild, session.mentor_id)} closed."
+            if session else "❌ You have no active mentor session."
+        )
+        await _reply(interaction, message)
+        return
+    
+    if action == "connect":
+        session = index.match(interaction.user.id, topic)
+        if session is None:
+            embed = visual_effects.create_cypherpunk_embed(
+                "👥 ALL MENTORS BUSY",
+                "No mentor is available right now. Try again shortly.",
+                glitch_level=2
+            )
+            await _reply(interaction, embed=embed)
+            return
+        
+        mentor = index.mentors.get(session.mentor_id)
+        embed = visual_effects.create_cypherpunk_embed(
+            "🤝 MENTOR MATCHED",
+            f"You are connected with <@{session.mentor_id}>"
+            + (f" for **{session.topic}**" if session.topic != ANY_TOPIC else "") + ".\n\n"
+            + ("🔊 They are in voice now — join them there.\n" if mentor and mentor.in_voice else "")
+            + "Use `/mentor action:end` when you're done.",
+            glitch_level=1
+        )
+        await _reply(interaction, embed=embed)
+        
+        member = interaction.guild.get_member(session.mentor_id)
+        if member is not None:
+            try:
+                await member.send(
+                    f"🎓 {interaction.user.display_name} was matched with you"
+                    + (f" for {session.topic}" if session.topic != ANY_TOPIC else "") + "."
+                )
+            except discord.HTTPException:
+                pass
+        return
+    
     embed = visual_effects.create_cypherpunk_embed(
         "👥 MENTOR NETWORK",
         "Connect with expert Web3 privacy professionals",
         glitch_level=1
     )
     
-    # Sample mentors with cypherpunk styling
-    mentors = [
-        {
-            "name": "Alex Chen",
-            "expertise": "MPC & Privacy Protocols",
-            "rating": "4.9 ⭐",
-            "sessions": "156",
-            "status": "🟢 ONLINE"
-        },
-        {
-            "name": "Sarah Rodriguez", 
-            "expertise": "C-SPL Development",
-            "rating": "4.8 ⭐",
-            "sessions": "89",
-            "status": "🟢 ONLINE"
-        },
-        {
-            "name": "Dr. Crypto",
-            "expertise": "Zero-Knowledge Proofs",
-            "rating": "5.0 ⭐",
-            "sessions": "203",
-            "status": "🔴 BUSY"
-        }
-    ]
-    
+    mentors = index.available(topic)
     for mentor in mentors:
+        status = "🟢 IN VOICE" if mentor.in_voice else "🟢 ONLINE"
+        if mentor.load:
+            status += f" · {mentor.load}/{index.max_sessions} sessions"
+        expertise = ", ".join(sorted(mentor.expertise)[:4]) or "Generalist"
         embed.add_field(
-            name=f"{mentor['status']} {visual_effects.glitch_text(mentor['name'])}",
-            value=f"**Expertise:** {mentor['expertise']}\n"
-                  f"**Rating:** {mentor['rating']}\n"
-                  f"**Sessions:** {mentor['sessions']} completed",
+            name=f"{status} {visual_effects.glitch_text(_mentor_name(interaction.guild, mentor.user_id))}",
+            value=f"**Expertise:** {expertise}\n"
+                  f"**Rating:** {mentor.score:.2f} ⭐",
             inline=False
         )
+    if not mentors:
+        embed.add_field(name="🔴 NO MENTORS AVAILABLE", value="Check back soon.", inline=False)
     
     embed.add_field(
         name=visual_effects.glitch_text("🎯 How to Connect"),
         value="1. Join a voice channel\n"
-              "2. Use `/mentor connect [name]`\n"
-              "3. Wait for mentor acceptance\n"
+              "2. Use `/mentor action:connect [topic]`\n"
+              "3. Meet your mentor in voice\n"
               "4. Begin your encrypted learning session",
         inline=False
     )
     
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await _reply(interaction, embed=embed)
 
 @bot.tree.command(name="stats", description="View encrypted learning statistics")
+@admission.guard(CHEAP, ack_delay=2.0)
 async def stats_command(interaction: Interaction):
     # Send typing effect
     await visual_effects.send_typing_effect(interaction.channel, 2.0)
@@ -467,6 +765,7 @@ async def _get_percentile(user_id: int, guild_id: int) -> str:
 
 # Voice channel commands
 @bot.tree.command(name="join", description="Join voice channel for audio effects")
+@admission.guard(CHEAP)
 async def join_command(interaction: Interaction):
     """Join voice channel for enhanced experience"""
     if not interaction.user.voice or not interaction.user.voice.channel:
@@ -502,6 +801,7 @@ async def join_command(interaction: Interaction):
         )
 
 @bot.tree.command(name="leave", description="Leave voice channel")
+@admission.guard(CHEAP)
 async def leave_command(interaction: Interaction):
     """Leave voice channel"""
     voice_client = interaction.guild.voice_client
@@ -516,4 +816,116 @@ async def leave_command(interaction: Interaction):
         await interaction.response.send_message(
             "❌ Not connected to any voice channel",
             ephemeral=True
-        )
\ No newline at end of file
+        )
+
+# ---- admin bulk operations ----------------------------------------------
+
+admin_group = app_commands.Group(
+    name="admin",
+    description="Bulk learner administration",
+    guild_only=True,
+    default_permissions=discord.Permissions(administrator=True)
+)
+
+PROGRESS_INTERVAL = 1.0
+
+def _bulk_targets(
+    role: discord.Role = None,
+    channel: discord.abc.GuildChannel = None,
+    users: str = None
+) -> list:
+    """Member ids from a role, the members of a voice/stage channel and/or pasted mentions/ids"""
+    ids = set()
+    if role is not None:
+        ids.update(m.id for m in role.members if not m.bot)
+    if channel is not None:
+        ids.update(m.id for m in getattr(channel, "members", []) if not m.bot)
+    for token in (users or "").replace(",", " ").split():
+        token = token.strip("<@!>")
+        if token.isdigit():
+            ids.add(int(token))
+    return sorted(ids)
+
+def _progress_reporter(interaction: Interaction, label: str):
+    """Edits the deferred response at most once per PROGRESS_INTERVAL"""
+    last = 0.0
+    
+    async def report(done: int, total: int):
+        nonlocal last
+        now = time.monotonic()
+        if now - last >= PROGRESS_INTERVAL or done >= total:
+            last = now
+            await interaction.edit_original_response(
+                content=f"⏳ {label}: {done}/{total} ({visual_effects.create_progress_bar(int(done * 100 / max(total, 1)))})"
+            )
+    
+    return report
+
+async def _run_bulk(interaction: Interaction, label: str, operation) -> None:
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        result: BulkResult = await operation(_progress_reporter(interaction, label))
+    except BulkError as e:
+        await interaction.edit_original_response(content=f"❌ {e}")
+        return
+    
+    embed = visual_effects.create_cypherpunk_embed(
+        f"🛠️ {label.upper()} COMPLETE",
+        f"Users updated: **{result.affected}** of {result.requested}\n"
+        f"Badges awarded: **{result.badges_awarded}**\n"
+        f"Not enrolled: {result.missing}\n"
+        + (f"Left at source (busy, retry later): {result.left_behind}\n" if result.left_behind else "")
+        + f"{result.chunks} chunks in {result.elapsed:.2f}s",
+        glitch_level=1
+    )
+    await interaction.edit_original_response(content=None, embed=embed)
+
+@admin_group.command(name="grant-ec", description="Grant EC to a role, channel or list of members")
+async def admin_grant_ec(
+    interaction: Interaction,
+    amount: int,
+    role: discord.Role = None,
+    channel: discord.VoiceChannel = None,
+    users: str = None
+):
+    targets = _bulk_targets(role, channel, users)
+    await _run_bulk(interaction, "Grant EC", lambda progress: bot.bulk.grant_ec(
+        interaction.guild_id, settings.DEFAULT_PROJECT, targets, amount,
+        actor_id=interaction.user.id, progress=progress
+    ))
+
+@admin_group.command(name="award-badge", description="Award a badge to a role, channel or list of members")
+async def admin_award_badge(
+    interaction: Interaction,
+    badge: str,
+    role: discord.Role = None,
+    channel: discord.VoiceChannel = None,
+    users: str = None
+):
+    targets = _bulk_targets(role, channel, users)
+    await _run_bulk(interaction, "Award badge", lambda progress: bot.bulk.award_badge(
+        interaction.guild_id, settings.DEFAULT_PROJECT, targets, badge,
+        actor_id=interaction.user.id, progress=progress
+    ))
+
+@admin_group.command(name="relocate", description="Move everyone at one node to another")
+async def admin_relocate(interaction: Interaction, from_node: int, to_node: int):
+    await _run_bulk(interaction, "Relocate", lambda progress: bot.bulk.relocate(
+        interaction.guild_id, settings.DEFAULT_PROJECT, from_node, to_node,
+        actor_id=interaction.user.id, progress=progress
+    ))
+
+@admin_group.command(name="reset-progress", description="Reset learners to the start of a path")
+async def admin_reset_progress(
+    interaction: Interaction,
+    path: str = "explorer",
+    role: discord.Role = None,
+    users: str = None
+):
+    targets = _bulk_targets(role, None, users)
+    await _run_bulk(interaction, "Reset progress", lambda progress: bot.bulk.reset_progress(
+        interaction.guild_id, settings.DEFAULT_PROJECT, targets, path,
+        actor_id=interaction.user.id, progress=progress
+    ))
+
+bot.tree.add_command(admin_group)
\ No newline at end of file
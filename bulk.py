@@ -0,0 +1,407 @@
+# ========================================
+# ACA Bot Bulk Operations
+# Set-based admin updates over many users
+# ========================================
+"""
+Admin operations over cohorts of users without per-user traversals.
+
+Each operation runs as set-based SQL in chunks of ``BULK_CHUNK_SIZE`` users,
+one transaction per chunk so row locks are held briefly and a failure keeps
+the chunks already committed. After each chunk the affected users' state
+caches and the guild's cached leaderboard pages are invalidated in a single
+pipelined Redis call and the optional progress callback is awaited with ``(done, total)``. Every operation writes
+one ``audit_log`` row describing what was done and by whom.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from sqlalchemy import func, insert, literal, select, update, delete, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .audit import payload_digest
+from .config import settings
+from .database import get_db_session
+from .encryption import encryption
+from .engine import ACAGraphEngine, BADGES_AWARDED, _leaderboard_generation_key, _state_key
+from .models import AuditLog, Badge, User, user_badges
+from .registry import ProjectContext
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+# Per-row key; the model's Python-side uuid4 default would give every inserted row the same id
+_NEW_ID = func.uuid_generate_v4()
+# Pause before retrying rows that were all locked by traversals in flight
+RELOCATE_RETRY_SECONDS = 0.2
+
+
+class BulkError(ValueError):
+    """Rejected bulk request (unknown badge or node, bad amount)"""
+
+
+@dataclass
+class BulkResult:
+    operation: str
+    project_slug: str
+    guild_id: int
+    requested: int
+    # Users whose rows were changed
+    affected: int = 0
+    badges_awarded: int = 0
+    # Users a relocate still found locked at its deadline
+    left_behind: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def missing(self) -> int:
+        """Requested users with no row in this project"""
+        return max(self.requested - self.affected - self.left_behind, 0)
+
+
+def _chunks(items: Sequence[int], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class BulkOperations:
+    """Chunked, set-based admin updates on top of the graph engine"""
+
+    def __init__(
+        self,
+        engine: ACAGraphEngine,
+        chunk_size: int = settings.BULK_CHUNK_SIZE,
+        relocate_deadline: float = settings.BULK_RELOCATE_DEADLINE_SECONDS
+    ):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.relocate_deadline = relocate_deadline
+
+    # ---- operations ----------------------------------------------------
+
+    async def grant_ec(
+        self,
+        guild_id: int,
+        project_slug: str,
+        user_ids: Sequence[int],
+        amount: int,
+        actor_id: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> BulkResult:
+        """Add EC to each user and award any EC-only badges they now qualify for"""
+        if amount == 0:
+            raise BulkError("Amount must be non-zero")
+        project = await self.engine.registry.get(project_slug)
+        catalogue = await self.engine.registry.get_badges(project_slug)
+        # Badges that also need visited nodes are awarded on the user's next traversal
+        ec_badge_ids = [b.badge_id for b in catalogue.badges if not b.required_nodes]
+        ids = sorted(set(user_ids))
+        result = BulkResult("grant_ec", project.slug, guild_id, len(ids))
+        started = time.perf_counter()
+
+        for chunk in _chunks(ids, self.chunk_size):
+            async with get_db_session() as session:
+                updated = (await session.execute(
+                    update(User)
+                    .where(
+                        User.guild_id == guild_id,
+                        User.project_id == project.project_id,
+                        User.user_id.in_(chunk)
+                    )
+                    .values(ec_total=func.coalesce(User.ec_total, 0) + amount)
+                    .returning(User.user_id)
+                )).scalars().all()
+                awards = []
+                if updated and ec_badge_ids and amount > 0:
+                    awards = await self._award_ec_badges(session, guild_id, project, updated, ec_badge_ids)
+                await session.commit()
+            result.badges_awarded += sum(len(badge_ids) for _, badge_ids in awards)
+            await self._notify_awards(guild_id, project, awards)
+            await self._after_chunk(result, project, updated, progress)
+
+        result.elapsed = time.perf_counter() - started
+        BADGES_AWARDED.inc(result.badges_awarded)
+        await self._audit(project, guild_id, actor_id, result, {"amount": amount})
+        return result
+
+    async def award_badge(
+        self,
+        guild_id: int,
+        project_slug: str,
+        user_ids: Sequence[int],
+        badge_slug: str,
+        actor_id: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> BulkResult:
+        """Award one badge to every listed user who doesn't already hold it"""
+        project = await self.engine.registry.get(project_slug)
+        badge = (await self.engine.registry.get_badges(project_slug)).by_slug.get(badge_slug)
+        if badge is None:
+            raise BulkError(f"Unknown badge '{badge_slug}'")
+        ids = sorted(set(user_ids))
+        result = BulkResult("award_badge", project.slug, guild_id, len(ids))
+        started = time.perf_counter()
+
+        for chunk in _chunks(ids, self.chunk_size):
+            async with get_db_session() as session:
+                awarded = (await session.execute(
+                    pg_insert(user_badges)
+                    .from_select(
+                        ["id", "user_id", "guild_id", "project_id", "badge_id"],
+                        select(
+                            _NEW_ID, User.user_id, User.guild_id, User.project_id, literal(badge.badge_id)
+                        )
+                        .where(
+                            User.guild_id == guild_id,
+                            User.project_id == project.project_id,
+                            User.user_id.in_(chunk)
+                        )
+                    )
+                    .on_conflict_do_nothing()
+                    .returning(user_badges.c.user_id)
+                )).scalars().all()
+                await session.commit()
+            result.badges_awarded += len(awarded)
+            await self._notify_awards(guild_id, project, [(user_id, [badge.badge_id]) for user_id in awarded])
+            await self._after_chunk(result, project, awarded, progress)
+
+        result.elapsed = time.perf_counter() - started
+        BADGES_AWARDED.inc(result.badges_awarded)
+        await self._audit(project, guild_id, actor_id, result, {"badge": badge.slug})
+        return result
+
+    async def relocate(
+        self,
+        guild_id: int,
+        project_slug: str,
+        from_node_id: int,
+        to_node_id: int,
+        actor_id: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> BulkResult:
+        """Move everyone currently at one node to another (after a graph restructure)"""
+        project = await self.engine.registry.get(project_slug)
+        graph = await self.engine.registry.get_graph(project_slug)
+        if to_node_id not in graph.nodes:
+            raise BulkError(f"Unknown target node #{to_node_id}")
+        if to_node_id == from_node_id:
+            # Moved rows would match again and the chunk loop would never end
+            raise BulkError(f"Source and target are both node #{from_node_id}")
+
+        at_node = (
+            User.guild_id == guild_id,
+            User.project_id == project.project_id,
+            User.current_node_id == from_node_id
+        )
+        count_at_node = select(func.count()).select_from(User).where(*at_node)
+        async with get_db_session() as session:
+            total = (await session.execute(count_at_node)).scalar()
+        result = BulkResult("relocate", project.slug, guild_id, total)
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.relocate_deadline
+
+        while True:
+            async with get_db_session() as session:
+                # Users mid-traversal hold their row lock; skip them and pick them up next round
+                batch = select(User.user_id).where(*at_node).limit(self.chunk_size).with_for_update(skip_locked=True)
+                moved = (await session.execute(
+                    update(User)
+                    .where(
+                        User.guild_id == guild_id,
+                        User.project_id == project.project_id,
+                        User.user_id.in_(batch.scalar_subquery())
+                    )
+                    .values(current_node_id=to_node_id)
+                    .returning(User.user_id)
+                )).scalars().all()
+                await session.commit()
+            if moved:
+                await self._after_chunk(result, project, moved, progress)
+                continue
+            # Nothing was unlocked this round; done only once nobody is left at the node
+            async with get_db_session() as session:
+                remaining = (await session.execute(count_at_node)).scalar()
+            if not remaining:
+                break
+            if time.monotonic() >= deadline:
+                result.left_behind = remaining
+                logger.warning(
+                    f"Relocate #{from_node_id} -> #{to_node_id} in guild {guild_id}: "
+                    f"{remaining} users still locked after {self.relocate_deadline:.0f}s"
+                )
+                break
+            await asyncio.sleep(RELOCATE_RETRY_SECONDS)
+
+        result.elapsed = time.perf_counter() - started
+        await self._audit(project, guild_id, actor_id, result, {"from": from_node_id, "to": to_node_id})
+        return result
+
+    async def reset_progress(
+        self,
+        guild_id: int,
+        project_slug: str,
+        user_ids: Sequence[int],
+        path: str = "explorer",
+        actor_id: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> BulkResult:
+        """Return users to a path's root with no EC, badges or history (preferences kept)"""
+        project = await self.engine.registry.get(project_slug)
+        if path not in project.paths:
+            raise BulkError(f"Unknown path '{path}' (choose from {', '.join(project.paths)})")
+        root_node_id = project.root_node_id(path)
+        ids = sorted(set(user_ids))
+        result = BulkResult("reset_progress", project.slug, guild_id, len(ids))
+        started = time.perf_counter()
+        scope = (User.guild_id == guild_id, User.project_id == project.project_id)
+
+        for chunk in _chunks(ids, self.chunk_size):
+            async with get_db_session() as session:
+                rows = (await session.execute(
+                    select(User.user_id, User.encrypted_payload)
+                    .where(*scope, User.user_id.in_(chunk))
+                    .with_for_update()
+                )).all()
+                if rows:
+                    # The payload is per-user ciphertext, so it's rewritten row by row
+                    # (one executemany); everything else is a single statement
+                    payloads = await asyncio.to_thread(self._reset_payloads, rows)
+                    users = User.__table__
+                    await session.execute(
+                        update(users)
+                        .where(
+                            users.c.guild_id == guild_id,
+                            users.c.project_id == project.project_id,
+                            users.c.user_id == bindparam("uid")
+                        )
+                        .values(
+                            current_node_id=root_node_id,
+                            ec_total=0,
+                            encrypted_payload=bindparam("payload")
+                        ),
+                        payloads
+                    )
+                    await session.execute(
+                        delete(user_badges).where(
+                            user_badges.c.guild_id == guild_id,
+                            user_badges.c.project_id == project.project_id,
+                            user_badges.c.user_id.in_([row.user_id for row in rows])
+                        )
+                    )
+                await session.commit()
+            await self._after_chunk(result, project, [row.user_id for row in rows], progress)
+
+        result.elapsed = time.perf_counter() - started
+        await self._audit(project, guild_id, actor_id, result, {"path": path})
+        return result
+
+    # ---- helpers ---------------------------------------------------------
+
+    @staticmethod
+    def _reset_payloads(rows) -> List[dict]:
+        params = []
+        for row in rows:
+            payload = encryption.decrypt_record(row.encrypted_payload)
+            params.append({
+                "uid": row.user_id,
+                "payload": encryption.encrypt_record({
+                    "path_history": [],
+                    "preferences": payload.get("preferences", {})
+                })
+            })
+        return params
+
+    async def _award_ec_badges(
+        self,
+        session,
+        guild_id: int,
+        project: ProjectContext,
+        user_ids: Sequence[int],
+        badge_ids: Sequence[int]
+    ) -> List[Tuple[int, List[int]]]:
+        """Insert qualifying EC-only badges; returns (user_id, badge_ids) actually awarded"""
+        rows = (await session.execute(
+            pg_insert(user_badges)
+            .from_select(
+                ["id", "user_id", "guild_id", "project_id", "badge_id"],
+                select(_NEW_ID, User.user_id, User.guild_id, User.project_id, Badge.badge_id)
+                .join(Badge, Badge.project_id == User.project_id)
+                .where(
+                    User.guild_id == guild_id,
+                    User.project_id == project.project_id,
+                    User.user_id.in_(user_ids),
+                    Badge.badge_id.in_(badge_ids),
+                    func.coalesce(Badge.required_ec, 0) <= User.ec_total
+                )
+            )
+            .on_conflict_do_nothing()
+            .returning(user_badges.c.user_id, user_badges.c.badge_id)
+        )).all()
+        awards: Dict[int, List[int]] = {}
+        for user_id, badge_id in rows:
+            awards.setdefault(user_id, []).append(badge_id)
+        return list(awards.items())
+
+    async def _notify_awards(
+        self,
+        guild_id: int,
+        project: ProjectContext,
+        awards: Sequence[Tuple[int, Sequence[int]]]
+    ):
+        if awards and self.engine.on_badges_awarded is not None:
+            await self.engine.on_badges_awarded(guild_id, project.slug, awards)
+
+    async def _after_chunk(
+        self,
+        result: BulkResult,
+        project: ProjectContext,
+        changed: Sequence[int],
+        progress: Optional[ProgressCallback]
+    ):
+        result.chunks += 1
+        result.affected += len(changed)
+        if changed:
+            # One pipelined round trip per chunk; EC, badges and positions all show in rankings
+            await self.engine.redis.batch().delete(
+                *(_state_key(user_id, result.guild_id, project.slug) for user_id in changed)
+            ).set(_leaderboard_generation_key(result.guild_id), uuid4().hex).execute()
+        if progress is not None:
+            if result.operation == "relocate":
+                done = result.affected
+            else:
+                done = min(result.chunks * self.chunk_size, result.requested)
+            try:
+                await progress(done, result.requested)
+            except Exception as e:
+                logger.warning(f"Bulk progress callback failed: {e}")
+
+    async def _audit(
+        self,
+        project: ProjectContext,
+        guild_id: int,
+        actor_id: Optional[int],
+        result: BulkResult,
+        params: dict
+    ):
+        payload = {**asdict(result), "params": params}
+        payload["elapsed"] = round(result.elapsed, 3)
+        async with get_db_session() as session:
+            await session.execute(insert(AuditLog).values(
+                project_id=project.project_id,
+                user_id=actor_id,
+                guild_id=guild_id,
+                action=f"bulk_{result.operation}",
+                payload_hash=payload_digest(payload),
+                payload=payload
+            ))
+            await session.commit()
+        logger.info(
+            f"Bulk {result.operation} on '{project.slug}' in guild {guild_id}: "
+            f"{result.affected}/{result.requested} users, {result.badges_awarded} badges, "
+            f"{result.chunks} chunks in {result.elapsed:.2f}s"
+        )
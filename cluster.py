@@ -0,0 +1,321 @@
+# ========================================
+# ACA Bot Cluster Launcher
+# Multi-process sharding, supervision & health
+# ========================================
+"""
+Run ACABot as an auto-sharded bot split across worker processes.
+
+    python -m bot.core.cluster                 # supervisor
+    python -m bot.core.cluster worker          # single worker (spawned by supervisor)
+
+The supervisor assigns each worker a contiguous block of
+``SHARDS_PER_PROCESS`` shards through the ``SHARD_IDS``/``SHARD_COUNT``
+environment variables, restarts workers that crash and performs a rolling
+restart on SIGHUP. Workers publish per-shard heartbeats to Redis, which the
+supervisor uses both for health reporting and to gate rolling restarts.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+import discord
+import redis.asyncio as redis
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SHARD_KEY = "aca:cluster:shard:{shard_id}"
+
+
+class ShardHealthReporter:
+    """Publishes per-shard heartbeat, latency and guild counts to Redis"""
+
+    def __init__(self, bot, redis_client: redis.Redis, interval: float):
+        self.bot = bot
+        self.redis = redis_client
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[int, dict]:
+        """Current health of every shard owned by this process"""
+        guild_counts: Dict[int, int] = {}
+        for guild in self.bot.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+
+        shard_ids = self.bot.shard_ids or range(self.bot.shard_count or 1)
+        report = {}
+        for shard_id in shard_ids:
+            shard = self.bot.get_shard(shard_id)
+            latency = shard.latency if shard else float("inf")
+            report[shard_id] = {
+                "cluster_id": settings.CLUSTER_ID,
+                "pid": os.getpid(),
+                "ready": bool(shard) and not shard.is_closed() and self.bot.is_ready(),
+                "latency_ms": None if math.isinf(latency) else round(latency * 1000, 1),
+                "guilds": guild_counts.get(shard_id, 0),
+                "ts": time.time()
+            }
+        return report
+
+    async def publish(self):
+        pipe = self.redis.pipeline(transaction=False)
+        ttl = max(int(self.interval * 3), 1)
+        for shard_id, health in self.snapshot().items():
+            pipe.setex(SHARD_KEY.format(shard_id=shard_id), ttl, json.dumps(health))
+        await pipe.execute()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.warning(f"Shard heartbeat failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+async def read_shard_health(redis_client: redis.Redis, shard_ids: List[int]) -> Dict[int, Optional[dict]]:
+    """Fetch heartbeats for the given shards (None when stale/missing)"""
+    if not shard_ids:
+        return {}
+    keys = [SHARD_KEY.format(shard_id=s) for s in shard_ids]
+    values = await redis_client.mget(keys)
+    return {
+        shard_id: json.loads(value) if value else None
+        for shard_id, value in zip(shard_ids, values)
+    }
+
+
+class WorkerProcess:
+    """One supervised worker owning a block of shards"""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_requested = False
+
+    async def spawn(self):
+        env = dict(os.environ)
+        env.update({
+            "CLUSTER_ID": str(self.cluster_id),
+            "SHARD_IDS": ",".join(str(s) for s in self.shard_ids),
+            "SHARD_COUNT": str(self.shard_count)
+        })
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", __spec__.name, "worker", env=env
+        )
+        self.started_at = time.monotonic()
+        logger.info(
+            f"Cluster {self.cluster_id} started (pid {self.proc.pid}, "
+            f"shards {self.shard_ids[0]}-{self.shard_ids[-1]})"
+        )
+
+    async def terminate(self, timeout: float):
+        if not self.proc or self.proc.returncode is not None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Cluster {self.cluster_id} ignored SIGTERM, killing")
+            self.proc.kill()
+            await self.proc.wait()
+
+
+class ClusterSupervisor:
+    """Spawns, monitors and restarts shard worker processes"""
+
+    def __init__(
+        self,
+        shard_count: int = 0,
+        shards_per_process: int = settings.SHARDS_PER_PROCESS,
+        ready_timeout: float = 120.0,
+        stop_timeout: float = 30.0
+    ):
+        self.shard_count = shard_count
+        self.shards_per_process = max(shards_per_process, 1)
+        self.ready_timeout = ready_timeout
+        self.stop_timeout = stop_timeout
+        self.redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.workers: List[WorkerProcess] = []
+        self._stopping = False
+        self._rolling = asyncio.Lock()
+
+    async def _recommended_shard_count(self) -> int:
+        http = discord.http.HTTPClient(asyncio.get_running_loop())
+        try:
+            await http.static_login(settings.DISCORD_TOKEN)
+            shards, _ = await http.get_bot_gateway()
+            return shards
+        finally:
+            await http.close()
+
+    async def run(self):
+        if not self.shard_count:
+            self.shard_count = await self._recommended_shard_count()
+
+        for cluster_id, start in enumerate(range(0, self.shard_count, self.shards_per_process)):
+            shard_ids = list(range(start, min(start + self.shards_per_process, self.shard_count)))
+            self.workers.append(WorkerProcess(cluster_id, shard_ids, self.shard_count))
+
+        logger.info(f"Launching {self.shard_count} shards across {len(self.workers)} processes")
+
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.shutdown()))
+        loop.add_signal_handler(signal.SIGINT, lambda: asyncio.create_task(self.shutdown()))
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.rolling_restart()))
+
+        for worker in self.workers:
+            await worker.spawn()
+
+        health_task = asyncio.create_task(self._report_health())
+        try:
+            await asyncio.gather(*(self._watch(worker) for worker in self.workers))
+        finally:
+            health_task.cancel()
+            await self.redis.close()
+
+    async def _watch(self, worker: WorkerProcess):
+        """Respawn the worker whenever it exits, backing off on repeated crashes"""
+        backoff = 1.0
+        while not self._stopping:
+            code = await worker.proc.wait()
+            if self._stopping:
+                return
+            if worker.restart_requested:
+                # Planned exit during a rolling restart: replace immediately
+                worker.restart_requested = False
+                await worker.spawn()
+                continue
+
+            uptime = time.monotonic() - worker.started_at
+            if uptime > 60:
+                backoff = 1.0
+            logger.error(
+                f"Cluster {worker.cluster_id} exited with code {code} after {uptime:.0f}s; "
+                f"restarting in {backoff:.0f}s"
+            )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+            if self._stopping:
+                return
+            worker.restarts += 1
+            await worker.spawn()
+
+    async def _wait_ready(self, worker: WorkerProcess) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            health = await read_shard_health(self.redis, worker.shard_ids)
+            if all(h and h["ready"] and h["pid"] == worker.proc.pid for h in health.values()):
+                return True
+            if worker.proc.returncode is not None:
+                return False
+            await asyncio.sleep(1.0)
+        return False
+
+    async def rolling_restart(self):
+        """Replace workers one at a time, waiting for each to become ready"""
+        if self._rolling.locked():
+            logger.info("Rolling restart already in progress")
+            return
+        async with self._rolling:
+            logger.info("Starting rolling restart")
+            for worker in self.workers:
+                if self._stopping:
+                    return
+                old = worker.proc
+                worker.restart_requested = True
+                await worker.terminate(self.stop_timeout)
+                while worker.proc is old and not self._stopping:
+                    await asyncio.sleep(0.1)
+                if not await self._wait_ready(worker):
+                    logger.error(
+                        f"Cluster {worker.cluster_id} did not become ready; aborting rolling restart"
+                    )
+                    return
+                logger.info(f"Cluster {worker.cluster_id} replaced (pid {old.pid} -> {worker.proc.pid})")
+            logger.info("Rolling restart complete")
+
+    async def _report_health(self):
+        interval = settings.CLUSTER_HEARTBEAT_SECONDS * 3
+        while not self._stopping:
+            await asyncio.sleep(interval)
+            try:
+                health = await read_shard_health(self.redis, list(range(self.shard_count)))
+            except Exception as e:
+                logger.warning(f"Health check failed: {e}")
+                continue
+
+            down = [s for s, h in health.items() if not h or not h["ready"]]
+            latencies = [h["latency_ms"] for h in health.values() if h and h["latency_ms"] is not None]
+            guilds = sum(h["guilds"] for h in health.values() if h)
+            logger.info(
+                f"Cluster health: {self.shard_count - len(down)}/{self.shard_count} shards ready, "
+                f"{guilds} guilds, max latency "
+                f"{max(latencies) if latencies else 'n/a'}ms"
+            )
+            if down:
+                logger.warning(f"Shards not reporting ready: {down}")
+
+    async def shutdown(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("Stopping cluster")
+        await asyncio.gather(*(w.terminate(self.stop_timeout) for w in self.workers))
+
+
+async def run_worker():
+    """Worker entrypoint: run the shards assigned through the environment"""
+    from .bot import bot
+
+    reporter = ShardHealthReporter(bot, bot.engine.redis.client, settings.CLUSTER_HEARTBEAT_SECONDS)
+
+    @bot.listen("on_ready")
+    async def _start_reporter():
+        reporter.start()
+
+    loop = asyncio.get_running_loop()
+    # close() drains in-flight work and writes the cache snapshot before disconnecting
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+
+    try:
+        await bot.start(settings.DISCORD_TOKEN)
+    finally:
+        await reporter.stop()
+        if not bot.is_closed():
+            await bot.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - [cluster {settings.CLUSTER_ID}] %(name)s - %(levelname)s - %(message)s'
+    )
+    if sys.argv[1:2] == ["worker"]:
+        asyncio.run(run_worker())
+    else:
+        asyncio.run(ClusterSupervisor(shard_count=settings.SHARD_COUNT).run())
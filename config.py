@@ -1,6 +1,5 @@
 import os
-from typing import Dict, Any
-from uuid import UUID
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,23 +11,85 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DATABASE_ECHO: bool = os.getenv("DATABASE_ECHO", "false").lower() in ("1", "true", "yes")
+    # Compiled SQL kept by SQLAlchemy per engine / prepared statements kept by asyncpg per connection
+    DATABASE_QUERY_CACHE_SIZE: int = int(os.getenv("DATABASE_QUERY_CACHE_SIZE", "500"))
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("DATABASE_PREPARED_STATEMENT_CACHE_SIZE", "500"))
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_TIMEOUT_SECONDS", "0.25"))
+    REDIS_BREAKER_FAILURES: int = int(os.getenv("REDIS_BREAKER_FAILURES", "5"))
+    REDIS_BREAKER_RESET_SECONDS: float = float(os.getenv("REDIS_BREAKER_RESET_SECONDS", "10"))
+    REDIS_FALLBACK_MAX_KEYS: int = int(os.getenv("REDIS_FALLBACK_MAX_KEYS", "50000"))
     
     # Encryption
     VAULT_KEY_ID: str = os.getenv("VAULT_KEY_ID", "aca-master-key")
     
-    # Project Config (pre-seeded for core Arcium project)
-    PROJECTS: Dict[str, Dict[str, Any]] = {
-        "arcium": {
-            "project_id": UUID("00000000-0000-0000-0000-000000000001"),
-            "root_nodes": {"explorer": 1, "builder": 101, "guardian": 201}
-        }
-    }
+    # Cluster (SHARD_COUNT=0 asks Discord for the recommended count)
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", "0"))
+    SHARD_IDS: Optional[List[int]] = [
+        int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()
+    ] or None
+    SHARDS_PER_PROCESS: int = int(os.getenv("SHARDS_PER_PROCESS", "4"))
+    CLUSTER_ID: int = int(os.getenv("CLUSTER_ID", "0"))
+    CLUSTER_HEARTBEAT_SECONDS: float = float(os.getenv("CLUSTER_HEARTBEAT_SECONDS", "10"))
     
-    def get_project_id(self, slug: str) -> UUID:
-        return self.PROJECTS[slug]["project_id"]
+    # Projects (loaded from the projects table by ProjectRegistry)
+    DEFAULT_PROJECT: str = os.getenv("DEFAULT_PROJECT", "arcium")
+    PROJECT_CACHE_MAX_OBJECTS: int = int(os.getenv("PROJECT_CACHE_MAX_OBJECTS", "2000000"))
+    PROJECT_IDLE_SECONDS: float = float(os.getenv("PROJECT_IDLE_SECONDS", "1800"))
+    PROJECT_VERSION_CHECK_SECONDS: float = float(os.getenv("PROJECT_VERSION_CHECK_SECONDS", "5"))
     
-    def get_root_node_id(self, slug: str, path: str) -> int:
-        return self.PROJECTS[slug]["root_nodes"][path]
+    # Bulk admin operations (users per transaction)
+    BULK_CHUNK_SIZE: int = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+    BULK_RELOCATE_DEADLINE_SECONDS: float = float(os.getenv("BULK_RELOCATE_DEADLINE_SECONDS", "30"))
+    
+    # Mentor matching
+    MENTOR_MAX_SESSIONS: int = int(os.getenv("MENTOR_MAX_SESSIONS", "3"))
+    MENTOR_SESSION_SECONDS: float = float(os.getenv("MENTOR_SESSION_SECONDS", "3600"))
+    MENTOR_REFRESH_SECONDS: float = float(os.getenv("MENTOR_REFRESH_SECONDS", "300"))
+    # Privileged intent; without it mentor availability follows voice state only
+    PRESENCE_INTENT: bool = os.getenv("PRESENCE_INTENT", "false").lower() in ("1", "true", "yes")
+    
+    # Badge role grants (member edits per second; the guild bucket bursts to 5x)
+    ROLE_GRANT_GUILD_RATE: float = float(os.getenv("ROLE_GRANT_GUILD_RATE", "1"))
+    ROLE_GRANT_GLOBAL_RATE: float = float(os.getenv("ROLE_GRANT_GLOBAL_RATE", "40"))
+    ROLE_GRANT_POLL_SECONDS: float = float(os.getenv("ROLE_GRANT_POLL_SECONDS", "5"))
+    ROLE_GRANT_BACKOFF_SECONDS: float = float(os.getenv("ROLE_GRANT_BACKOFF_SECONDS", "5"))
+    ROLE_GRANT_MAX_ATTEMPTS: int = int(os.getenv("ROLE_GRANT_MAX_ATTEMPTS", "8"))
+    
+    # Admission control (ADMISSION_GLOBAL_LIMIT=0 disables it)
+    ADMISSION_GLOBAL_LIMIT: int = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "128"))
+    ADMISSION_GUILD_LIMIT: int = int(os.getenv("ADMISSION_GUILD_LIMIT", "32"))
+    ADMISSION_USER_RATE: float = float(os.getenv("ADMISSION_USER_RATE", "1"))
+    ADMISSION_USER_BURST: float = float(os.getenv("ADMISSION_USER_BURST", "5"))
+    ADMISSION_QUEUE_BUDGET_SECONDS: float = float(os.getenv("ADMISSION_QUEUE_BUDGET_SECONDS", "1.0"))
+    
+    # Duplicate clicks of the same edge by the same user within the window share one outcome
+    IDEMPOTENCY_WINDOW_SECONDS: float = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "10"))
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "1.5"))
+    
+    # Member display names for rankings (gateway member requests take 100 ids each)
+    MEMBER_NAME_TTL_SECONDS: float = float(os.getenv("MEMBER_NAME_TTL_SECONDS", "86400"))
+    MEMBER_MISSING_TTL_SECONDS: float = float(os.getenv("MEMBER_MISSING_TTL_SECONDS", "600"))
+    MEMBER_QUERY_CONCURRENCY: int = int(os.getenv("MEMBER_QUERY_CONCURRENCY", "2"))
+    
+    # Cache warm-up after on_ready / on_guild_join
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+    WARMUP_BUDGET_SECONDS: float = float(os.getenv("WARMUP_BUDGET_SECONDS", "30"))
+    WARMUP_RECENT_USERS: int = int(os.getenv("WARMUP_RECENT_USERS", "2000"))
+    
+    # Shutdown drains in-flight work, then dumps in-process caches for the next start
+    SHUTDOWN_DRAIN_SECONDS: float = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "8"))
+    # "{cluster_id}" is filled in per worker; empty disables snapshots
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", "aca-cache-{cluster_id}.snapshot")
+    SNAPSHOT_MAX_AGE_SECONDS: float = float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "900"))
+    
+    # Startup
+    FORCE_COMMAND_SYNC: bool = os.getenv("FORCE_COMMAND_SYNC", "false").lower() in ("1", "true", "yes")
+    
+    # Metrics (Prometheus text endpoint; instrumentation is a no-op when disabled)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9108"))
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,553 @@
+# ========================================
+# ACA Bot Content Loader
+# YAML graph content -> validated, diffed bulk apply
+# ========================================
+"""
+Load a project's nodes, edges and badges from YAML and apply only what changed.
+
+    python -m bot.core.content_loader content/arcium.yaml [--dry-run]
+    python -m bot.core.content_loader content/arcium/ [--dry-run]
+
+A directory is treated as one document split over several files (lists are
+concatenated), which lets very large graphs be parsed in parallel. ``.json``
+files are accepted too and are much faster to parse than YAML.
+
+Document layout::
+
+    project: arcium
+    root_nodes: {explorer: 1, builder: 101, guardian: 201}    # optional, merged into projects.config
+    entry_edges: {explorer: 1, builder: 101, guardian: 201}   # optional, merged into projects.config
+    path_labels: {explorer: "🌐 EXPLORER"}                    # optional button labels for /start
+    default_path: explorer                                    # optional, path new members start on
+    nodes:
+      - {id: 1, title: "Welcome", root: true, checkpoint: false, parent: null,
+         description: ..., content_text: ..., media_url: ..., required_ec: 0,
+         required_badges: [], required_roles: []}
+    edges:
+      - {from: 1, to: 2, text: "Start", order: 0, ec_gain: 10, cooldown: 0,
+         condition: {op: has_badge, slug: first-mint}, id: 1}   # id optional
+    badges:
+      - {slug: first-mint, name: "First Mint", emoji: "🪙", role_id: null,
+         required_nodes: [2], required_ec: 0, description: ...}
+
+Changed rows are streamed with COPY into temporary tables and merged with one
+multi-row upsert per table, all inside a single transaction. The project's
+graph version is bumped afterwards so running bot processes reload.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import redis.asyncio as redis
+import yaml
+
+from .config import settings
+from .database import get_engine
+from .graph_index import GraphIndex
+from .registry import (
+    BadgeCatalogue, BadgeSnapshot, EdgeSnapshot, GraphSnapshot, NodeSnapshot, ProjectRegistry
+)
+from .storage import SqlStorage
+
+logger = logging.getLogger(__name__)
+
+try:
+    _YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    _YamlLoader = yaml.SafeLoader
+
+NODE_COLUMNS = (
+    "node_id", "project_id", "title", "description", "content_text", "media_url",
+    "parent_node_id", "required_ec", "required_badges", "required_roles", "is_checkpoint", "is_root"
+)
+EDGE_COLUMNS = (
+    "edge_id", "project_id", "from_node_id", "to_node_id", "choice_text", "choice_order",
+    "condition_json", "ec_gain", "cooldown_seconds"
+)
+BADGE_COLUMNS = (
+    "project_id", "slug", "name", "emoji", "description", "role_id", "required_nodes", "required_ec"
+)
+JSON_COLUMNS = {"required_badges", "required_roles", "condition_json", "required_nodes"}
+# Keys every row of a document section must set
+REQUIRED_KEYS = {"nodes": ("id", "title"), "edges": ("from", "to", "text"), "badges": ("slug", "name")}
+
+
+class ContentError(ValueError):
+    """Raised when a content document fails validation"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} validation error(s)")
+
+
+def _json(value: Any) -> Optional[str]:
+    """Canonical JSON text used both for comparison and for jsonb COPY"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def _parse_file(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        if path.endswith(".json"):
+            # JSON is valid YAML but parses orders of magnitude faster; use it for generated content
+            return json.load(f)
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+class ContentDocument:
+    """Parsed YAML content, normalised to the column order of each table"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.project_slug: str = data.get("project")
+        self.config_patch: Dict[str, Any] = {
+            key: data[key] for key in ("root_nodes", "entry_edges", "path_labels", "default_path") if key in data
+        }
+
+        # Rows keyed like their natural key in the database (project_id filled at apply time)
+        self.nodes: Dict[int, tuple] = {}
+        self.edges: Dict[Tuple[int, int], tuple] = {}
+        self.badges: Dict[str, tuple] = {}
+        # Malformed and duplicate rows, reported by validate()
+        self.errors: List[str] = []
+
+        for n in self._section(data, "nodes"):
+            node_id = int(n["id"])
+            if node_id in self.nodes:
+                self.errors.append(f"duplicate node id {node_id}")
+            self.nodes[node_id] = (
+                node_id, None, n["title"], n.get("description"), n.get("content_text"),
+                n.get("media_url"), n.get("parent"), int(n.get("required_ec", 0)),
+                _json(n.get("required_badges")), _json(n.get("required_roles")),
+                bool(n.get("checkpoint", False)), bool(n.get("root", False))
+            )
+
+        for e in self._section(data, "edges"):
+            key = (int(e["from"]), int(e["to"]))
+            if key in self.edges:
+                self.errors.append(f"duplicate edge {key[0]} -> {key[1]}")
+            self.edges[key] = (
+                e.get("id"), None, key[0], key[1], e["text"], int(e.get("order", 0)),
+                _json(e.get("condition")), int(e.get("ec_gain", 0)), int(e.get("cooldown", 0))
+            )
+
+        for b in self._section(data, "badges"):
+            if b["slug"] in self.badges:
+                self.errors.append(f"duplicate badge slug '{b['slug']}'")
+            self.badges[b["slug"]] = (
+                None, b["slug"], b["name"], b.get("emoji"), b.get("description"), b.get("role_id"),
+                _json(b.get("required_nodes") or []), int(b.get("required_ec", 0))
+            )
+
+    def _section(self, data: Dict[str, Any], section: str) -> Iterator[Dict[str, Any]]:
+        """Rows of a section that have every required key and well-formed numbers"""
+        for position, row in enumerate(data.get(section) or (), 1):
+            if not isinstance(row, dict):
+                self.errors.append(f"{section}[{position}]: expected a mapping, got {type(row).__name__}")
+                continue
+            missing = [key for key in REQUIRED_KEYS[section] if row.get(key) is None]
+            if missing:
+                self.errors.append(f"{section}[{position}]: missing {', '.join(missing)}")
+                continue
+            try:
+                # Coerced again by the caller; checked here so bad values are reported, not raised
+                for key in ("id", "from", "to", "order", "ec_gain", "cooldown", "required_ec"):
+                    if row.get(key) is not None:
+                        int(row[key])
+            except (TypeError, ValueError):
+                self.errors.append(f"{section}[{position}]: '{key}' must be an integer, got {row[key]!r}")
+                continue
+            yield row
+
+    @classmethod
+    def from_path(cls, path: str) -> "ContentDocument":
+        """Load one file, or every content file in a directory (parsed in parallel)"""
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith((".yaml", ".yml", ".json"))
+            )
+        else:
+            files = [path]
+
+        if len(files) > 1:
+            with ProcessPoolExecutor() as pool:
+                parts = list(pool.map(_parse_file, files))
+        else:
+            parts = [_parse_file(f) for f in files]
+
+        merged: Dict[str, Any] = {}
+        for part in parts:
+            for key, value in (part or {}).items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                elif isinstance(value, dict):
+                    merged.setdefault(key, {}).update(value)
+                else:
+                    merged[key] = value
+        return cls(merged)
+
+    def root_node_ids(self) -> List[int]:
+        roots = [nid for nid, row in self.nodes.items() if row[11]]
+        roots.extend(self.config_patch.get("root_nodes", {}).values())
+        return roots
+
+    # ---- validation ---------------------------------------------------
+
+    def validate(self, allow_cycles: bool = False, allow_unreachable: bool = False) -> List[str]:
+        """Raise ContentError on hard errors; return warnings"""
+        errors = list(self.errors)
+        warnings: List[str] = []
+
+        for node_id, row in self.nodes.items():
+            parent = row[6]
+            if parent is not None and parent not in self.nodes:
+                errors.append(f"node {node_id}: unknown parent {parent}")
+            for slug in json.loads(row[8] or "[]"):
+                if slug not in self.badges:
+                    errors.append(f"node {node_id}: unknown required badge '{slug}'")
+
+        for (src, dst), row in self.edges.items():
+            if src == dst:
+                errors.append(f"edge {src} -> {dst}: self-loop")
+            if src not in self.nodes:
+                errors.append(f"edge {src} -> {dst}: unknown from node {src}")
+            if dst not in self.nodes:
+                errors.append(f"edge {src} -> {dst}: dangling to_node_id {dst}")
+            condition = json.loads(row[6]) if row[6] else None
+            if condition and condition.get("op") == "has_badge" and condition.get("slug") not in self.badges:
+                errors.append(f"edge {src} -> {dst}: unknown badge slug '{condition.get('slug')}' in condition")
+
+        for slug, row in self.badges.items():
+            for node_id in json.loads(row[6]):
+                if node_id not in self.nodes:
+                    errors.append(f"badge '{slug}': unknown required node {node_id}")
+
+        for path, node_id in self.config_patch.get("root_nodes", {}).items():
+            if node_id not in self.nodes:
+                errors.append(f"root_nodes.{path}: unknown node {node_id}")
+        default_path = self.config_patch.get("default_path")
+        if default_path is not None and default_path not in self.config_patch.get("root_nodes", {}):
+            errors.append(f"default_path: '{default_path}' has no root node")
+
+        if not allow_cycles:
+            cycle_nodes = self._cycle_nodes()
+            if cycle_nodes:
+                sample = ", ".join(str(n) for n in cycle_nodes[:10])
+                errors.append(f"{len(cycle_nodes)} node(s) on cycles (e.g. {sample})")
+
+        if errors:
+            raise ContentError(errors)
+
+        index = GraphIndex(*self.snapshots(), self.root_node_ids())
+        if index.unreachable_nodes:
+            sample = ", ".join(str(n) for n in index.unreachable_nodes[:10])
+            message = f"{len(index.unreachable_nodes)} node(s) unreachable from any root (e.g. {sample})"
+            if not allow_unreachable:
+                raise ContentError([message])
+            warnings.append(message)
+        if index.unachievable_badges:
+            warnings.append(f"badges that cannot be earned: {', '.join(index.unachievable_badges)}")
+        if index.dead_end_nodes:
+            warnings.append(f"{len(index.dead_end_nodes)} non-checkpoint dead-end node(s)")
+        return warnings
+
+    def _cycle_nodes(self) -> List[int]:
+        """Nodes left over after Kahn's topological sort, i.e. on or behind a cycle"""
+        indegree = {node_id: 0 for node_id in self.nodes}
+        forward: Dict[int, List[int]] = {}
+        for src, dst in self.edges:
+            if src in indegree and dst in indegree:
+                forward.setdefault(src, []).append(dst)
+                indegree[dst] += 1
+        queue = deque(n for n, d in indegree.items() if d == 0)
+        while queue:
+            u = queue.popleft()
+            for v in forward.get(u, ()):
+                indegree[v] -= 1
+                if indegree[v] == 0:
+                    queue.append(v)
+        return sorted(n for n, d in indegree.items() if d > 0)
+
+    def snapshots(self) -> Tuple[GraphSnapshot, BadgeCatalogue]:
+        nodes = [
+            NodeSnapshot(r[0], r[2], r[3], r[6], r[7], r[10], r[11]) for r in self.nodes.values()
+        ]
+        # Validation-only edge ids: document order
+        edges = [
+            EdgeSnapshot(i, r[2], r[3], r[4], r[5], None, r[7], r[8])
+            for i, r in enumerate(self.edges.values(), 1)
+        ]
+        badges = [
+            BadgeSnapshot(i, r[1], r[2], r[3], r[4], r[5], tuple(json.loads(r[6])), r[7])
+            for i, r in enumerate(self.badges.values(), 1)
+        ]
+        return GraphSnapshot(nodes, edges, 0), BadgeCatalogue(badges)
+
+
+class ContentDiff:
+    """Rows to upsert and ids to delete per table"""
+
+    def __init__(self):
+        self.nodes_upsert: List[tuple] = []
+        self.nodes_delete: List[int] = []
+        self.edges_upsert: List[tuple] = []
+        self.edges_delete: List[int] = []
+        self.badges_upsert: List[tuple] = []
+        self.badges_delete: List[str] = []
+        self.config: Optional[Dict[str, Any]] = None
+
+    @property
+    def empty(self) -> bool:
+        return not any((
+            self.nodes_upsert, self.nodes_delete, self.edges_upsert,
+            self.edges_delete, self.badges_upsert, self.badges_delete, self.config
+        ))
+
+    def summary(self) -> str:
+        return (
+            f"nodes +/~{len(self.nodes_upsert)} -{len(self.nodes_delete)}, "
+            f"edges +/~{len(self.edges_upsert)} -{len(self.edges_delete)}, "
+            f"badges +/~{len(self.badges_upsert)} -{len(self.badges_delete)}"
+            f"{', config' if self.config else ''}"
+        )
+
+
+def _rows(records: Iterable, columns: Tuple[str, ...]) -> List[tuple]:
+    return [
+        tuple(_json(r[c]) if c in JSON_COLUMNS else r[c] for c in columns)
+        for r in records
+    ]
+
+
+async def compute_diff(conn, doc: ContentDocument, project_id, config: Dict[str, Any], prune: bool) -> ContentDiff:
+    """Compare the document with the project's current rows"""
+    diff = ContentDiff()
+
+    current_nodes = {
+        r[0]: r for r in _rows(
+            await conn.fetch(f"SELECT {', '.join(NODE_COLUMNS)} FROM nodes WHERE project_id = $1", project_id),
+            NODE_COLUMNS
+        )
+    }
+    current_edges = {
+        (r[2], r[3]): r for r in _rows(
+            await conn.fetch(f"SELECT {', '.join(EDGE_COLUMNS)} FROM edges WHERE project_id = $1", project_id),
+            EDGE_COLUMNS
+        )
+    }
+    current_badges = {
+        r[1]: r for r in _rows(
+            await conn.fetch(f"SELECT {', '.join(BADGE_COLUMNS)} FROM badges WHERE project_id = $1", project_id),
+            BADGE_COLUMNS
+        )
+    }
+
+    for node_id, row in doc.nodes.items():
+        row = (row[0], project_id) + row[2:]
+        if current_nodes.get(node_id) != row:
+            diff.nodes_upsert.append(row)
+
+    for key, row in doc.edges.items():
+        existing = current_edges.get(key)
+        # Keep the existing edge_id unless the document pins one
+        edge_id = row[0] if row[0] is not None else (existing[0] if existing else None)
+        row = (edge_id, project_id) + row[2:]
+        if existing != row:
+            diff.edges_upsert.append(row)
+
+    for slug, row in doc.badges.items():
+        row = (project_id,) + row[1:]
+        if current_badges.get(slug) != row:
+            diff.badges_upsert.append(row)
+
+    if prune:
+        diff.edges_delete = [r[0] for key, r in current_edges.items() if key not in doc.edges]
+        diff.nodes_delete = [node_id for node_id in current_nodes if node_id not in doc.nodes]
+        diff.badges_delete = [slug for slug in current_badges if slug not in doc.badges]
+
+    if doc.config_patch:
+        merged = {**config, **doc.config_patch}
+        if merged != config:
+            diff.config = merged
+
+    return diff
+
+
+async def _copy_upsert(conn, table: str, columns: Tuple[str, ...], rows: List[tuple], conflict: str, key_expr: Dict[str, str] = None):
+    """COPY rows into a temp table, then merge them with one INSERT ... ON CONFLICT"""
+    if not rows:
+        return
+    temp = f"_load_{table}"
+    await conn.execute(
+        f"CREATE TEMP TABLE {temp} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+    )
+    await conn.copy_records_to_table(temp, records=rows, columns=list(columns))
+
+    key_expr = key_expr or {}
+    select_cols = ", ".join(key_expr.get(c, c) for c in columns)
+    conflict_cols = {c.strip() for c in conflict.split(",")}
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c not in conflict_cols)
+    if table == "nodes":
+        updates += ", updated_at = NOW()"
+    await conn.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select_cols} FROM {temp} "
+        f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+    )
+
+
+async def apply_diff(conn, diff: ContentDiff, project_id) -> List[str]:
+    """Apply a diff inside the caller's transaction; returns warnings"""
+    warnings = []
+
+    if diff.nodes_upsert:
+        foreign = await conn.fetch(
+            "SELECT node_id FROM nodes WHERE node_id = ANY($1::int[]) AND project_id <> $2",
+            [r[0] for r in diff.nodes_upsert], project_id
+        )
+        if foreign:
+            raise ContentError([
+                f"node ids already used by another project: {', '.join(str(r[0]) for r in foreign[:10])}"
+            ])
+
+    # Edges reference nodes and node parents reference nodes; delete edges first, insert nodes first
+    if diff.edges_delete:
+        await conn.execute(
+            "DELETE FROM edges WHERE project_id = $1 AND edge_id = ANY($2::int[])",
+            project_id, diff.edges_delete
+        )
+
+    await _copy_upsert(conn, "nodes", NODE_COLUMNS, diff.nodes_upsert, "node_id")
+    await _copy_upsert(conn, "badges", BADGE_COLUMNS, diff.badges_upsert, "project_id, slug")
+    # New edges take nextval() in the same statement that inserts the pinned
+    # ids, so the sequence must already be past every one of them
+    pinned = [row[0] for row in diff.edges_upsert if row[0] is not None]
+    await conn.execute(
+        "SELECT setval(pg_get_serial_sequence('edges', 'edge_id'), "
+        "GREATEST((SELECT MAX(edge_id) FROM edges), $1::int, 1))",
+        max(pinned, default=1)
+    )
+    await _copy_upsert(
+        conn, "edges", EDGE_COLUMNS, diff.edges_upsert, "project_id, from_node_id, to_node_id",
+        key_expr={"edge_id": "COALESCE(edge_id, nextval(pg_get_serial_sequence('edges', 'edge_id')))"}
+    )
+
+    if diff.badges_delete:
+        awarded = await conn.fetch(
+            "SELECT DISTINCT b.slug FROM badges b JOIN user_badges ub ON ub.badge_id = b.badge_id "
+            "WHERE b.project_id = $1 AND b.slug = ANY($2::text[])",
+            project_id, diff.badges_delete
+        )
+        kept = {r["slug"] for r in awarded}
+        if kept:
+            warnings.append(f"kept removed badges that users already hold: {', '.join(sorted(kept))}")
+        await conn.execute(
+            "DELETE FROM badges WHERE project_id = $1 AND slug = ANY($2::text[])",
+            project_id, [s for s in diff.badges_delete if s not in kept]
+        )
+
+    if diff.nodes_delete:
+        await conn.execute(
+            "DELETE FROM nodes WHERE project_id = $1 AND node_id = ANY($2::int[])",
+            project_id, diff.nodes_delete
+        )
+
+    if diff.config is not None:
+        await conn.execute(
+            "UPDATE projects SET config = $2::jsonb WHERE project_id = $1",
+            project_id, json.dumps(diff.config)
+        )
+
+    # Explicit node ids bypass the sequence; move it past the highest id in use
+    await conn.execute(
+        "SELECT setval(pg_get_serial_sequence('nodes', 'node_id'), GREATEST((SELECT MAX(node_id) FROM nodes), 1))"
+    )
+    return warnings
+
+
+async def load_content(
+    path: str,
+    project_slug: Optional[str] = None,
+    dry_run: bool = False,
+    prune: bool = True,
+    allow_cycles: bool = False,
+    allow_unreachable: bool = False
+) -> ContentDiff:
+    started = time.perf_counter()
+    doc = ContentDocument.from_path(path)
+    slug = project_slug or doc.project_slug
+    if not slug:
+        raise ContentError(["no project slug given (use --project or a 'project:' key)"])
+    logger.info(
+        f"Parsed {len(doc.nodes)} nodes, {len(doc.edges)} edges, {len(doc.badges)} badges "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+    for warning in doc.validate(allow_cycles=allow_cycles, allow_unreachable=allow_unreachable):
+        logger.warning(warning)
+
+    async with get_engine().connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        project = await conn.fetchrow("SELECT project_id, config FROM projects WHERE project_slug = $1", slug)
+        if project is None:
+            raise ContentError([f"unknown project '{slug}'"])
+        project_id = project["project_id"]
+
+        async with conn.transaction():
+            diff = await compute_diff(conn, doc, project_id, json.loads(project["config"]), prune)
+            logger.info(f"Diff for '{slug}': {diff.summary()}")
+            if diff.empty or dry_run:
+                return diff
+            for warning in await apply_diff(conn, diff, project_id):
+                logger.warning(warning)
+
+    # Committed: tell running bot processes to reload their snapshots
+    client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    try:
+        version = await ProjectRegistry(SqlStorage(client)).publish_change(slug)
+    finally:
+        await client.close()
+
+    logger.info(f"Applied content for '{slug}' (graph version {version}) in {time.perf_counter() - started:.2f}s")
+    return diff
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load ACA graph content from YAML")
+    parser.add_argument("path", help="YAML/JSON content file or directory of files")
+    parser.add_argument("--project", help="project slug (defaults to the document's 'project' key)")
+    parser.add_argument("--dry-run", action="store_true", help="validate and diff without writing")
+    parser.add_argument("--no-prune", action="store_true", help="keep rows missing from the document")
+    parser.add_argument("--allow-cycles", action="store_true")
+    parser.add_argument("--allow-unreachable", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(load_content(
+            args.path,
+            project_slug=args.project,
+            dry_run=args.dry_run,
+            prune=not args.no_prune,
+            allow_cycles=args.allow_cycles,
+            allow_unreachable=args.allow_unreachable
+        ))
+    except ContentError as e:
+        for error in e.errors:
+            logger.error(error)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,47 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from .config import settings
 from .models import Base
+from .statements import statements
+
+# Built on first use so importing the bot doesn't construct a pool up front
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=True,  # Set to False in production
-    pool_size=20,
-    max_overflow=30
-)
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.DATABASE_URL,
+            echo=settings.DATABASE_ECHO,
+            pool_size=20,
+            max_overflow=30,
+            query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+            connect_args={"prepared_statement_cache_size": settings.DATABASE_PREPARED_STATEMENT_CACHE_SIZE}
+        )
+        statements.install(_engine.sync_engine)
+    return _engine
 
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+def get_session_factory() -> async_sessionmaker:
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _session_factory
 
+@asynccontextmanager
 async def get_db_session() -> AsyncSession:
-    async with AsyncSessionLocal() as session:
+    async with get_session_factory()() as session:
         try:
             yield session
         finally:
             await session.close()
 
 async def create_tables():
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
@@ -1,22 +1,42 @@
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.backends import default_backend
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class EncryptionManager:
     def __init__(self, master_key_id: str):
         self.master_key_id = master_key_id
-        # In production: fetch from Vault
-        # For now: derive from env (DO NOT COMMIT REAL KEY)
-        self._master_key = os.getenv("MASTER_ENCRYPTION_KEY", os.urandom(32))
+        # Resolved on first use so importing the bot never touches key material
+        self._aesgcm: Optional[AESGCM] = None
+    
+    def _cipher(self) -> AESGCM:
+        if self._aesgcm is None:
+            # In production: fetch from Vault
+            # For now: derive from env, hex-encoded (DO NOT COMMIT REAL KEY)
+            key_hex = os.getenv("MASTER_ENCRYPTION_KEY")
+            key = bytes.fromhex(key_hex) if key_hex else os.urandom(32)
+            self._aesgcm = AESGCM(key)
+        return self._aesgcm
+    
+    def derive_key(self, purpose: str) -> Optional[bytes]:
+        """Stable 32-byte key for ``purpose``; None when no master key is configured"""
+        key_hex = os.getenv("MASTER_ENCRYPTION_KEY")
+        if not key_hex:
+            # A per-process random key can't authenticate anything across restarts
+            return None
+        return HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=f"aca:{purpose}".encode()
+        ).derive(bytes.fromhex(key_hex))
     
     def encrypt_record(self, data: Dict[str, Any]) -> bytes:
         """Encrypt user payload with per-record nonce"""
         nonce = os.urandom(12)
-        aesgcm = AESGCM(self._master_key)
+        aesgcm = self._cipher()
         plaintext = json.dumps(data).encode()
         ciphertext = aesgcm.encrypt(nonce, plaintext, None)
         return nonce + ciphertext
@@ -25,7 +45,7 @@ class EncryptionManager:
         """Decrypt user payload"""
         nonce = encrypted[:12]
         ciphertext = encrypted[12:]
-        aesgcm = AESGCM(self._master_key)
+        aesgcm = self._cipher()
         plaintext = aesgcm.decrypt(nonce, ciphertext, None)
         return json.loads(plaintext.decode())
 
@@ -2,33 +2,202 @@
 # ACA Bot Graph Engine
 # ========================================
 import asyncio
+import base64
+import functools
 import json
 import logging
+import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from uuid import UUID
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from uuid import UUID, uuid4
 
 import discord
 from discord import Embed, Interaction, app_commands
 from discord.ext import commands
-from sqlalchemy import select, and_, func, insert
-from sqlalchemy.ext.asyncio import AsyncSession
 import redis.asyncio as redis
 
-from .database import get_db_session
-from .encryption import encryption
-from .models import User, Node, Edge, Badge, user_badges
 from .config import settings
+from .encryption import encryption
+from .models import User
+from .registry import ProjectRegistry
+from .graph_index import BadgeProgress, Recommendation, visited_nodes
+from .metrics import metrics
+from .redis_gateway import RedisGateway
+from .storage import SqlStorage, StorageBackend, UserTransaction
 
 logger = logging.getLogger(__name__)
 
+STATE_CACHE = metrics.counter("aca_state_cache_total", "User state cache lookups", ("result",))
+_CACHE_HIT = STATE_CACHE.labels("hit")
+_CACHE_MISS = STATE_CACHE.labels("miss")
+_STALE_STATE = STATE_CACHE.labels("stale")
+TRAVERSALS = metrics.counter("aca_traversals_total", "Edge traversal attempts by outcome", ("outcome",))
+_TRAVERSE_OK = TRAVERSALS.labels("ok")
+_TRAVERSE_INVALID = TRAVERSALS.labels("invalid_path")
+_TRAVERSE_COOLDOWN = TRAVERSALS.labels("cooldown")
+_TRAVERSE_CONDITION = TRAVERSALS.labels("condition_failed")
+DUPLICATES = metrics.counter(
+    "aca_duplicate_interactions_total", "Duplicate traversals answered without re-running them", ("kind",)
+)
+_DUPLICATE_REDELIVERY = DUPLICATES.labels("redelivery")
+_DUPLICATE_CLICK = DUPLICATES.labels("click")
+_DUPLICATE_PENDING = DUPLICATES.labels("pending")
+BADGES_AWARDED = metrics.counter("aca_badges_awarded_total", "Badges awarded by traversals")
+
+# Called with (stage, seconds) around each engine stage when set
+StageObserver = Callable[[str, float], None]
+
+# Called with (guild_id, project_slug, [(user_id, badge_ids)]) after awards commit
+BadgeListener = Callable[[int, str, Sequence[Tuple[int, Sequence[int]]]], Awaitable[None]]
+
+_NO_STAGE = nullcontext()
+
+class _StageTimer:
+    __slots__ = ("observer", "stage", "started")
+    
+    def __init__(self, observer: StageObserver, stage: str):
+        self.observer = observer
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+    
+    def __exit__(self, *exc):
+        self.observer(self.stage, time.perf_counter() - self.started)
+        return False
+
+def _timed(operation: str):
+    """Report a whole engine call to the stage observer under its own name"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            with self.redis.request(), self._tracked():
+                observer = self.observer
+                if observer is None:
+                    return await func(self, *args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(self, *args, **kwargs)
+                finally:
+                    observer(operation, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def _state_key(user_id: int, guild_id: int, project_slug: str) -> str:
+    return f"user:{user_id}:guild:{guild_id}:project:{project_slug}:state"
+
+def _click_key(user_id: int, guild_id: int, edge_id: int) -> str:
+    return f"idem:click:{user_id}:{guild_id}:{edge_id}"
+
+def _request_key(request_id: int) -> str:
+    return f"idem:interaction:{request_id}"
+
+def _decode_outcome(value: str) -> Tuple[bool, Optional[str], Optional[int]]:
+    success, error, to_node = json.loads(value)
+    return success, error, to_node
+
+def _leaderboard_key(guild_id: int, limit: int) -> str:
+    return f"leaderboard:{guild_id}:top{limit}"
+
+def _leaderboard_generation_key(guild_id: int) -> str:
+    return f"leaderboard:{guild_id}:generation"
+
+STATE_TTL = timedelta(hours=24)
+LEADERBOARD_TTL = timedelta(seconds=60)
+# Interaction tokens are valid for 15 minutes, so redeliveries can't come later
+REQUEST_RESULT_TTL = timedelta(minutes=15)
+_PENDING = "pending"
+_POLL_INTERVAL = 0.05
+
+class LeaderboardEntry(NamedTuple):
+    user_id: int
+    ec_total: int
+    current_node_id: Optional[int]
+
+def _serialize_user(user: User) -> dict:
+    """JSON-safe column dict for the state cache"""
+    return {
+        "user_id": user.user_id,
+        "guild_id": user.guild_id,
+        "project_id": str(user.project_id),
+        "current_node_id": user.current_node_id,
+        "ec_total": user.ec_total or 0,
+        "badge_cache": user.badge_cache,
+        "mentor_score": str(user.mentor_score) if user.mentor_score is not None else None,
+        "is_mentor": bool(user.is_mentor),
+        "encrypted_payload": base64.b64encode(user.encrypted_payload).decode()
+    }
+
+def _state_value(user: User) -> str:
+    return json.dumps({"user": _serialize_user(user), "node_id": user.current_node_id})
+
+def _deserialize_user(data: dict) -> User:
+    return User(
+        user_id=data["user_id"],
+        guild_id=data["guild_id"],
+        project_id=UUID(data["project_id"]),
+        current_node_id=data["current_node_id"],
+        ec_total=data["ec_total"],
+        badge_cache=data["badge_cache"],
+        mentor_score=Decimal(data["mentor_score"]) if data["mentor_score"] is not None else None,
+        is_mentor=data["is_mentor"],
+        encrypted_payload=base64.b64decode(data["encrypted_payload"])
+    )
+
 class ACAGraphEngine:
     """Core graph traversal engine for ACA Bot"""
     
-    def __init__(self, redis_client: redis.Redis):
-        self.redis = redis_client
-        self._cooldowns = {}
+    def __init__(
+        self,
+        redis_client: Union[redis.Redis, RedisGateway, None] = None,
+        registry: Optional[ProjectRegistry] = None,
+        storage: Optional[StorageBackend] = None
+    ):
+        # Postgres + Redis unless another backend is given (e.g. MemoryStorage);
+        # all mutable state lives there so every cluster worker sees the same view
+        self.storage = storage or SqlStorage(redis_client)
+        self.redis = self.storage.cache
+        self.registry = registry or ProjectRegistry(self.storage)
+        self.observer: Optional[StageObserver] = None
+        self.idempotency_window = timedelta(seconds=settings.IDEMPOTENCY_WINDOW_SECONDS)
+        self.idempotency_wait = settings.IDEMPOTENCY_WAIT_SECONDS
+        self.on_badges_awarded: Optional[BadgeListener] = None
+        # Plain counters (independent of METRICS_ENABLED) for warm-up hit-rate reporting
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Engine calls in progress, so shutdown can let traversals finish
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    @contextmanager
+    def _tracked(self):
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+    
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` for in-flight engine calls; False if some are still running"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    def _stage(self, name: str):
+        """Time a block for the observer; a shared no-op when none is attached"""
+        if self.observer is None:
+            return _NO_STAGE
+        return _StageTimer(self.observer, name)
     
+    @_timed("get_user_state")
     async def get_user_state(
         self, 
         user_id: int, 
@@ -36,124 +205,289 @@ class ACAGraphEngine:
         project_slug: str = "arcium"
     ) -> Tuple[User, int]:
         """Fetch user state with caching"""
-        cache_key = f"user:{user_id}:guild:{guild_id}:project:{project_slug}:state"
+        cache_key = _state_key(user_id, guild_id, project_slug)
         
-        cached = await self.redis.get(cache_key)
+        with self._stage("cache"):
+            cached = await self.redis.get(cache_key)
+        return await self._resolve_state(user_id, guild_id, project_slug, cache_key, cached)
+    
+    async def _resolve_state(
+        self,
+        user_id: int,
+        guild_id: int,
+        project_slug: str,
+        cache_key: str,
+        cached: Optional[str]
+    ) -> Tuple[User, int]:
+        """State from an already-fetched cache value, falling back to the database"""
         if cached:
+            _CACHE_HIT.inc()
+            self.cache_hits += 1
             data = json.loads(cached)
             # Reconstruct User from dict
-            user = User(**data["user"])
+            user = _deserialize_user(data["user"])
             return user, data["node_id"]
         
-        async with get_db_session() as session:
-            stmt = select(User).where(
-                User.user_id == user_id,
-                User.guild_id == guild_id,
-                User.project_id == settings.get_project_id(project_slug)
-            )
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            
-            if not user:
+        _CACHE_MISS.inc()
+        self.cache_misses += 1
+        project = await self.registry.get(project_slug)
+        
+        with self._stage("db"):
+            user = await self.storage.get_user(user_id, guild_id, project.project_id)
+        
+        if not user:
+            with self._stage("crypto"):
+                payload = encryption.encrypt_record({"path_history": [], "preferences": {}})
+            with self._stage("db"):
                 user = User(
                     user_id=user_id,
                     guild_id=guild_id,
-                    project_id=settings.get_project_id(project_slug),
-                    current_node_id=settings.get_root_node_id(project_slug, "explorer"),
-                    encrypted_payload=encryption.encrypt_record({"path_history": [], "preferences": {}})
+                    project_id=project.project_id,
+                    current_node_id=project.root_node_id(project.default_path),
+                    ec_total=0,
+                    is_mentor=False,
+                    encrypted_payload=payload
                 )
-                session.add(user)
-                await session.commit()
-            
-            node_id = user.current_node_id
-            
-            # Cache for 24h
-            await self.redis.setex(
-                cache_key,
-                timedelta(hours=24),
-                json.dumps({"user": user.__dict__, "node_id": node_id})
-            )
-            
-            return user, node_id
+                await self.storage.create_user(user)
+        
+        node_id = user.current_node_id
+        
+        # Cache for 24h
+        with self._stage("cache"):
+            await self.redis.setex(cache_key, STATE_TTL, _state_value(user))
+        
+        return user, node_id
     
+    @_timed("traverse_edge")
     async def traverse_edge(
         self,
         user_id: int,
         guild_id: int,
         edge_id: int,
-        project_slug: str = "arcium"
+        project_slug: str = "arcium",
+        request_id: Optional[int] = None
     ) -> Tuple[bool, Optional[str], Optional[int]]:
-        """Attempt edge traversal"""
-        async with get_db_session() as session:
-            stmt = select(Edge).where(Edge.edge_id == edge_id)
-            result = await session.execute(stmt)
-            edge = result.scalar_one()
-            
-            if not edge:
-                return False, "Invalid path", None
-            
-            user, current_node = await self.get_user_state(user_id, guild_id, project_slug)
-            
-            if current_node != edge.from_node_id:
-                return False, "Invalid path", None
-            
-            # Cooldown check
-            cooldown_key = f"cooldown:{user_id}:{edge_id}"
-            if await self.redis.exists(cooldown_key):
-                return False, "Cooldown active", None
-            
-            if edge.cooldown_seconds > 0:
-                await self.redis.setex(
-                    cooldown_key,
-                    timedelta(seconds=edge.cooldown_seconds),
-                    "1"
-                )
+        """Attempt edge traversal
+        
+        ``request_id`` (the interaction id) makes redeliveries idempotent; the
+        same user clicking the same edge within ``IDEMPOTENCY_WINDOW_SECONDS``
+        gets the original outcome back without touching the database.
+        """
+        with self._stage("graph"):
+            graph = await self.registry.get_graph(project_slug)
+            edge = graph.edges.get(edge_id)
+        if not edge:
+            _TRAVERSE_INVALID.inc()
+            return False, "Invalid path", None
+        
+        # One atomic round trip claims the click, fetches cached state and
+        # checks/claims the cooldown (SET NX so two workers can't both claim
+        # the edge; MULTI so a duplicate can't interleave with the original)
+        cache_key = _state_key(user_id, guild_id, project_slug)
+        cooldown_key = f"cooldown:{user_id}:{edge_id}"
+        click_key = _click_key(user_id, guild_id, edge_id)
+        request_key = _request_key(request_id) if request_id is not None else None
+        
+        batch = self.redis.batch(atomic=True)
+        if request_key:
+            batch.get(request_key)
+        batch.set(click_key, _PENDING, ex=self.idempotency_window, nx=True).get(click_key).get(cache_key)
+        if edge.cooldown_seconds > 0:
+            batch.set(cooldown_key, "1", ex=timedelta(seconds=edge.cooldown_seconds), nx=True)
+        else:
+            batch.exists(cooldown_key)
+        with self._stage("cache"):
+            results = await batch.execute()
+        previous = results.pop(0) if request_key else None
+        owns_click, click_value, cached, cooldown = results
+        claimed = bool(cooldown) if edge.cooldown_seconds > 0 else not cooldown
+        
+        holds_cooldown = claimed and edge.cooldown_seconds > 0
+        if previous is not None or not owns_click:
+            # Redelivered interaction or double click: answer from the original
+            await self._release_claims(click_key if owns_click else None, cooldown_key if holds_cooldown else None)
+            if previous is not None:
+                _DUPLICATE_REDELIVERY.inc()
+                return _decode_outcome(previous)
+            return await self._await_original(click_key, click_value)
+        
+        try:
+            outcome, badge_ids = await self._apply_traversal(
+                user_id, guild_id, edge, project_slug, cache_key, cached, claimed
+            )
+        except BaseException:
+            # Nothing was recorded: let retries run instead of waiting out the window
+            await self._release_claims(click_key, cooldown_key if holds_cooldown else None)
+            raise
+        
+        # Record the outcome for duplicates (and drop the cached state after a
+        # traversal; a write-through could race a later commit from another worker)
+        encoded = json.dumps(outcome)
+        record = self.redis.batch().set(click_key, encoded, ex=self.idempotency_window)
+        if request_key:
+            record.set(request_key, encoded, ex=REQUEST_RESULT_TTL)
+        if outcome[0]:
+            record.delete(cache_key)
+        elif holds_cooldown:
+            # The edge wasn't taken, so give back the cooldown claimed speculatively
+            record.delete(cooldown_key)
+        with self._stage("cache"):
+            await record.execute()
+        
+        if badge_ids and self.on_badges_awarded is not None:
+            await self.on_badges_awarded(guild_id, project_slug, [(user_id, badge_ids)])
+        return outcome
+    
+    async def _release_claims(self, click_key: Optional[str], cooldown_key: Optional[str]):
+        keys = [key for key in (click_key, cooldown_key) if key]
+        if keys:
+            with self._stage("cache"):
+                await self.redis.delete(*keys)
+    
+    async def _await_original(self, click_key: str, value: Optional[str]) -> Tuple[bool, Optional[str], Optional[int]]:
+        """Outcome of the click already in progress, polling briefly until it is recorded"""
+        deadline = time.monotonic() + self.idempotency_wait
+        while value == _PENDING and time.monotonic() < deadline:
+            await asyncio.sleep(_POLL_INTERVAL)
+            with self._stage("cache"):
+                value = await self.redis.get(click_key)
+        if value is None or value == _PENDING:
+            # Original still running (or its record expired): don't run it twice
+            _DUPLICATE_PENDING.inc()
+            return False, "Your previous choice is still being processed", None
+        _DUPLICATE_CLICK.inc()
+        return _decode_outcome(value)
+    
+    async def _apply_traversal(
+        self,
+        user_id: int,
+        guild_id: int,
+        edge,
+        project_slug: str,
+        cache_key: str,
+        cached: Optional[str],
+        claimed: bool
+    ) -> Tuple[Tuple[bool, Optional[str], Optional[int]], List[int]]:
+        """Run a claimed traversal; returns the outcome and the awarded badge ids
+
+        The caller releases the cooldown claim whenever the outcome is a failure.
+        """
+        # Cached state rejects stale buttons without touching the database
+        user, current_node = await self._resolve_state(user_id, guild_id, project_slug, cache_key, cached)
+        if current_node != edge.from_node_id and cached:
+            # The cache may be the stale one (e.g. a warm-up write racing a
+            # traversal): let the database decide, replacing the cached state
+            _STALE_STATE.inc()
+            user, current_node = await self._resolve_state(user_id, guild_id, project_slug, cache_key, None)
+        
+        if current_node != edge.from_node_id:
+            _TRAVERSE_INVALID.inc()
+            return (False, "Invalid path", None), []
+        
+        if not claimed:
+            _TRAVERSE_COOLDOWN.inc()
+            return (False, "Cooldown active", None), []
+        
+        async with self.storage.transaction() as tx:
+            # Re-read the row under lock so concurrent traversals serialise and changes persist
+            with self._stage("db"):
+                user = await tx.lock_user(user_id, guild_id, user.project_id)
+            if user is None or user.current_node_id != edge.from_node_id:
+                _TRAVERSE_INVALID.inc()
+                return (False, "Invalid path", None), []
             
             if edge.condition_json:
-                can_traverse, reason = await self._evaluate_condition(
-                    user, edge.condition_json, session
-                )
+                with self._stage("condition"):
+                    can_traverse, reason = await self._evaluate_condition(
+                        user, edge.condition_json, tx, project_slug
+                    )
                 if not can_traverse:
-                    return False, reason, None
+                    _TRAVERSE_CONDITION.inc()
+                    return (False, reason, None), []
             
             # Update user
             user.current_node_id = edge.to_node_id
-            user.ec_total += edge.ec_gain
+            user.ec_total = (user.ec_total or 0) + edge.ec_gain
             
-            payload = encryption.decrypt_record(user.encrypted_payload)
-            payload["path_history"].append({
-                "from": edge.from_node_id,
-                "to": edge.to_node_id,
-                "at": datetime.utcnow().isoformat(),
-                "ec_gain": edge.ec_gain
-            })
-            user.encrypted_payload = encryption.encrypt_record(payload)
+            with self._stage("crypto"):
+                payload = encryption.decrypt_record(user.encrypted_payload)
+                payload["path_history"].append({
+                    "from": edge.from_node_id,
+                    "to": edge.to_node_id,
+                    "at": datetime.utcnow().isoformat(),
+                    "ec_gain": edge.ec_gain
+                })
+                user.encrypted_payload = encryption.encrypt_record(payload)
             
             # Award badges
-            badge_ids = await self._check_badge_eligibility(user, session)
-            for badge_id in badge_ids:
-                await session.execute(
-                    insert(user_badges).values(
-                        user_id=user_id,
-                        guild_id=guild_id,
-                        project_id=user.project_id,
-                        badge_id=badge_id
-                    )
-                )
-            
-            await session.commit()
+            with self._stage("badge_check"):
+                badge_ids = await self._check_badge_eligibility(user, tx, project_slug, payload)
+                if badge_ids:
+                    await tx.add_badges(user, badge_ids)
+                BADGES_AWARDED.inc(len(badge_ids))
             
-            # Invalidate cache
-            cache_key = f"user:{user_id}:guild:{guild_id}:project:{project_slug}:state"
-            await self.redis.delete(cache_key)
-            
-            return True, None, edge.to_node_id
+            with self._stage("db"):
+                await tx.commit()
+        
+        _TRAVERSE_OK.inc()
+        return (True, None, edge.to_node_id), badge_ids
+    
+    async def leaderboard(self, guild_id: int, limit: int = 10) -> List[LeaderboardEntry]:
+        """Top members by EC, cached briefly so bursts of /leaderboard share one query
+        
+        Pages record the guild's leaderboard generation and count only while
+        it is current, so ``invalidate_leaderboard`` retires every page size
+        at once.
+        """
+        key = _leaderboard_key(guild_id, limit)
+        generation, cached = await self.redis.batch().get(_leaderboard_generation_key(guild_id)).get(key).execute()
+        generation = generation or ""
+        if cached:
+            page = json.loads(cached)
+            if isinstance(page, dict) and page["generation"] == generation:
+                return [LeaderboardEntry(*row) for row in page["rows"]]
+        
+        entries = [LeaderboardEntry(*row) for row in await self.storage.top_users(guild_id, limit)]
+        # Written with the generation read before the query: a concurrent
+        # invalidation leaves this page already stale
+        await self.redis.setex(key, LEADERBOARD_TTL, json.dumps({"generation": generation, "rows": entries}))
+        return entries
+    
+    async def invalidate_leaderboard(self, guild_id: int):
+        """Drop every cached leaderboard page of a guild (one write)"""
+        await self.redis.set(_leaderboard_generation_key(guild_id), uuid4().hex)
+    
+    async def next_recommended_edges(
+        self,
+        user_id: int,
+        guild_id: int,
+        project_slug: str = "arcium",
+        limit: int = 3
+    ) -> List[Recommendation]:
+        """Outgoing edges that lead fastest toward unfinished badges"""
+        user, node_id = await self.get_user_state(user_id, guild_id, project_slug)
+        index = await self.registry.get_index(project_slug)
+        payload = encryption.decrypt_record(user.encrypted_payload)
+        return index.recommend(node_id, visited_nodes(payload["path_history"]), limit)
+    
+    async def badge_progress(
+        self,
+        user_id: int,
+        guild_id: int,
+        project_slug: str = "arcium"
+    ) -> List[BadgeProgress]:
+        """Per-badge completion, remaining nodes and distance from the current node"""
+        user, node_id = await self.get_user_state(user_id, guild_id, project_slug)
+        index = await self.registry.get_index(project_slug)
+        payload = encryption.decrypt_record(user.encrypted_payload)
+        return index.badge_progress(node_id, visited_nodes(payload["path_history"]), user.ec_total or 0)
     
     async def _evaluate_condition(
         self,
         user: User,
         condition: dict,
-        session: AsyncSession
+        tx: UserTransaction,
+        project_slug: str = "arcium"
     ) -> Tuple[bool, str]:
         """Evaluate condition JSON"""
         op = condition.get("op")
@@ -163,21 +497,11 @@ class ACAGraphEngine:
                 return False, f"Requires {condition['val']} EC"
         
         elif op == "has_badge":
-            slug = condition.get("slug")
-            stmt = select(Badge).where(
-                Badge.project_id == user.project_id,
-                Badge.slug == slug
-            )
-            result = await session.execute(stmt)
-            badge = result.scalar_one_or_none()
+            catalogue = await self.registry.get_badges(project_slug)
+            badge = catalogue.by_slug.get(condition.get("slug"))
             
             if badge:
-                badge_check = select(user_badges).where(
-                    user_badges.c.user_id == user.user_id,
-                    user_badges.c.guild_id == user.guild_id,
-                    user_badges.c.badge_id == badge.badge_id
-                )
-                if not (await session.execute(badge_check)).first():
+                if not await tx.held_badges(user, (badge.badge_id,)):
                     return False, f"Requires '{badge.name}' badge"
         
         return True, ""
@@ -185,29 +509,31 @@ class ACAGraphEngine:
     async def _check_badge_eligibility(
         self,
         user: User,
-        session: AsyncSession
+        tx: UserTransaction,
+        project_slug: str = "arcium",
+        payload: Optional[dict] = None
     ) -> List[int]:
         """Check badge eligibility"""
-        stmt = select(Badge).where(
-            Badge.project_id == user.project_id,
-            Badge.required_ec <= user.ec_total
-        )
-        badges = (await session.execute(stmt)).scalars().all()
+        catalogue = await self.registry.get_badges(project_slug)
+        badges = catalogue.eligible_by_ec(user.ec_total)
+        if not badges:
+            return []
         
+        # One lookup for every candidate instead of one per badge
+        held = await tx.held_badges(user, [badge.badge_id for badge in badges])
         earned_ids = []
+        completed = None
         for badge in badges:
-            earned = select(user_badges).where(
-                user_badges.c.user_id == user.user_id,
-                user_badges.c.guild_id == user.guild_id,
-                user_badges.c.badge_id == badge.badge_id
-            )
-            if not (await session.execute(earned)).first():
-                if badge.required_nodes:
-                    payload = encryption.decrypt_record(user.encrypted_payload)
+            if badge.badge_id in held:
+                continue
+            if badge.required_nodes:
+                if completed is None:
+                    if payload is None:
+                        payload = encryption.decrypt_record(user.encrypted_payload)
                     completed = {h["to"] for h in payload["path_history"]}
-                    if set(badge.required_nodes).issubset(completed):
-                        earned_ids.append(badge.badge_id)
-                else:
+                if completed.issuperset(badge.required_nodes):
                     earned_ids.append(badge.badge_id)
+            else:
+                earned_ids.append(badge.badge_id)
         
         return earned_ids
\ No newline at end of file
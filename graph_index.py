@@ -0,0 +1,226 @@
+# ========================================
+# ACA Bot Graph Index
+# Precomputed reachability & badge guidance
+# ========================================
+"""
+Analytics computed once per graph snapshot so that recommendation and
+badge-progress queries are table lookups instead of request-time traversals.
+
+Nodes are renumbered to dense indices. Reachability sets are Python ints used
+as bitsets; per-target shortest-path data is stored in ``array('i')`` columns
+(``-1`` = unreachable). Edge conditions are ignored: a gated edge is still a
+path the learner can take once the condition is met.
+"""
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .registry import BadgeCatalogue, BadgeSnapshot, EdgeSnapshot, GraphSnapshot
+
+
+@dataclass(frozen=True, slots=True)
+class Recommendation:
+    edge: EdgeSnapshot
+    badge: BadgeSnapshot
+    target_node_id: int
+    steps: int
+
+
+@dataclass(frozen=True, slots=True)
+class BadgeProgress:
+    badge: BadgeSnapshot
+    nodes_done: int
+    nodes_total: int
+    ec_done: int
+    remaining_nodes: Tuple[int, ...]
+    steps_to_next: Optional[int]
+    achievable: bool
+
+    @property
+    def complete(self) -> bool:
+        return self.nodes_done == self.nodes_total and self.ec_done >= self.badge.required_ec
+
+    @property
+    def percent(self) -> int:
+        parts = [self.nodes_done / self.nodes_total] if self.nodes_total else []
+        if self.badge.required_ec:
+            parts.append(min(self.ec_done / self.badge.required_ec, 1.0))
+        return int(100 * sum(parts) / len(parts)) if parts else 100
+
+
+def _bitset(flags: bytearray) -> int:
+    """Pack a 0/1 bytearray into an int bitset (bit i = flags[i])"""
+    packed = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            packed[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(packed, "little")
+
+
+class GraphIndex:
+    """Reachability, dead-end and shortest-path tables for one graph version"""
+
+    def __init__(self, graph: GraphSnapshot, badges: BadgeCatalogue, root_node_ids: Iterable[int]):
+        self.version = graph.version
+        self._badges = badges
+
+        node_ids = sorted(graph.nodes)
+        self._ids = array("i", node_ids)
+        self._pos: Dict[int, int] = {node_id: i for i, node_id in enumerate(node_ids)}
+        n = len(node_ids)
+
+        # Reverse adjacency as (source index, edge_id); forward only needs out-degree
+        self._reverse: List[List[Tuple[int, int]]] = [[] for _ in range(n)]
+        forward: List[List[int]] = [[] for _ in range(n)]
+        self.dangling_edges: List[int] = []
+        for edge in graph.edges.values():
+            src = self._pos.get(edge.from_node_id)
+            dst = self._pos.get(edge.to_node_id)
+            if src is None or dst is None:
+                self.dangling_edges.append(edge.edge_id)
+                continue
+            forward[src].append(dst)
+            self._reverse[dst].append((src, edge.edge_id))
+
+        self.edges = graph.edges
+
+        # Everything reachable from any root
+        roots = {self._pos[r] for r in root_node_ids if r in self._pos}
+        roots |= {self._pos[nid] for nid, node in graph.nodes.items() if node.is_root}
+        seen = bytearray(n)
+        queue = deque(roots)
+        for r in roots:
+            seen[r] = 1
+        while queue:
+            u = queue.popleft()
+            for v in forward[u]:
+                if not seen[v]:
+                    seen[v] = 1
+                    queue.append(v)
+        self.reachable = _bitset(seen)
+        self.unreachable_nodes: Tuple[int, ...] = tuple(node_ids[i] for i in range(n) if not seen[i])
+        self.dead_end_nodes: Tuple[int, ...] = tuple(
+            node_ids[i] for i in range(n)
+            if seen[i] and not forward[i] and not graph.nodes[node_ids[i]].is_checkpoint
+        )
+
+        # Shortest path (distance + first edge) from every node to every badge target
+        self._dist: Dict[int, array] = {}
+        self._next_edge: Dict[int, array] = {}
+        self.can_reach: Dict[int, int] = {}
+        for target in {node for badge in badges.badges for node in badge.required_nodes}:
+            if target in self._pos:
+                self._build_target(target, n)
+
+        self.unachievable_badges: Tuple[str, ...] = tuple(
+            badge.slug for badge in badges.badges
+            if any(
+                node not in self.can_reach or not (self.can_reach[node] & self.reachable)
+                for node in badge.required_nodes
+            )
+        )
+
+    def _build_target(self, target: int, n: int):
+        dist = array("i", [-1]) * n
+        next_edge = array("i", [-1]) * n
+        t = self._pos[target]
+        dist[t] = 0
+        queue = deque([t])
+        while queue:
+            v = queue.popleft()
+            for u, edge_id in self._reverse[v]:
+                if dist[u] < 0:
+                    dist[u] = dist[v] + 1
+                    next_edge[u] = edge_id
+                    queue.append(u)
+        self._dist[target] = dist
+        self._next_edge[target] = next_edge
+        self.can_reach[target] = _bitset(bytearray(1 if d >= 0 else 0 for d in dist))
+
+    # ---- lookups ------------------------------------------------------
+
+    def is_reachable(self, node_id: int) -> bool:
+        pos = self._pos.get(node_id)
+        return pos is not None and bool(self.reachable >> pos & 1)
+
+    def distance(self, from_node_id: int, to_node_id: int) -> Optional[int]:
+        """Shortest hop count to a badge target node (None if unreachable/unindexed)"""
+        dist = self._dist.get(to_node_id)
+        pos = self._pos.get(from_node_id)
+        if dist is None or pos is None or dist[pos] < 0:
+            return None
+        return dist[pos]
+
+    def next_edge(self, from_node_id: int, to_node_id: int) -> Optional[EdgeSnapshot]:
+        table = self._next_edge.get(to_node_id)
+        pos = self._pos.get(from_node_id)
+        if table is None or pos is None or table[pos] < 0:
+            return None
+        return self.edges[table[pos]]
+
+    def badge_progress(
+        self,
+        current_node_id: int,
+        visited: FrozenSet[int],
+        ec_total: int
+    ) -> List[BadgeProgress]:
+        progress = []
+        for badge in self._badges.badges:
+            remaining = tuple(n for n in badge.required_nodes if n not in visited)
+            distances = [self.distance(current_node_id, n) for n in remaining]
+            steps = [d for d in distances if d is not None]
+            progress.append(BadgeProgress(
+                badge=badge,
+                nodes_done=len(badge.required_nodes) - len(remaining),
+                nodes_total=len(badge.required_nodes),
+                ec_done=ec_total,
+                remaining_nodes=remaining,
+                steps_to_next=min(steps) if steps else None,
+                achievable=len(steps) == len(remaining)
+            ))
+        return progress
+
+    def recommend(
+        self,
+        current_node_id: int,
+        visited: FrozenSet[int],
+        limit: int = 3
+    ) -> List[Recommendation]:
+        """Outgoing edges that move closest to an unfinished badge, best first"""
+        best: Dict[int, Recommendation] = {}
+        for badge in self._badges.badges:
+            for target in badge.required_nodes:
+                if target in visited or target == current_node_id:
+                    continue
+                steps = self.distance(current_node_id, target)
+                if steps is None:
+                    continue
+                edge = self.next_edge(current_node_id, target)
+                known = best.get(edge.edge_id)
+                if known is None or steps < known.steps:
+                    best[edge.edge_id] = Recommendation(edge, badge, target, steps)
+        return sorted(best.values(), key=lambda r: (r.steps, r.edge.choice_order))[:limit]
+
+    @property
+    def size(self) -> int:
+        """Approximate object weight for the registry's memory budget"""
+        return len(self._ids) * (1 + len(self._dist))
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "nodes": len(self._ids),
+            "unreachable_nodes": len(self.unreachable_nodes),
+            "dead_end_nodes": len(self.dead_end_nodes),
+            "dangling_edges": len(self.dangling_edges),
+            "badge_targets": len(self._dist),
+            "unachievable_badges": len(self.unachievable_badges)
+        }
+
+
+def visited_nodes(path_history: List[dict]) -> FrozenSet[int]:
+    """Node ids a learner has arrived at, from a decrypted path_history"""
+    return frozenset(h["to"] for h in path_history)
@@ -0,0 +1,314 @@
+# ========================================
+# ACA Bot Interaction Load Test
+# Fake Discord objects driving real command callbacks
+# ========================================
+"""
+Replay synthetic or recorded interaction traffic through the real slash
+command and button callbacks, without a Discord connection.
+
+    python -m bot.core.loadtest --rate 50 --duration 60 \\
+        --mix button=70,profile=20,leaderboard=10 --output load.json
+    python -m bot.core.loadtest --replay traffic.jsonl --speed 2.0
+
+Recorded traffic is JSON Lines: ``{"offset": 0.25, "kind": "profile", "user": 123}``
+(``offset`` in seconds from start). Point ``DEFAULT_PROJECT`` at a seeded
+project (e.g. ``python -m bot.core.benchmark --keep``) and run against local
+Postgres/Redis.
+
+Reported per kind: time-to-acknowledge (first ``interaction.response`` call,
+which Discord requires within 3 s) and end-to-end latency; overall:
+achieved rate, event-loop lag and Python heap growth (tracemalloc).
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import discord
+
+from .benchmark import BENCH_GUILD_ID, parse_mix, summarize
+from .metrics import LoopLagMonitor
+
+logger = logging.getLogger(__name__)
+
+ACK_DEADLINE = 3.0
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+
+
+class FakeResponse:
+    """Stands in for InteractionResponse and records when it was first used"""
+
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _ack(self):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self._interaction.acked_at = time.perf_counter()
+
+    async def send_message(self, content=None, **kwargs):
+        self._ack()
+        self._interaction.sent.append((content, kwargs))
+
+    async def defer(self, **kwargs):
+        self._ack()
+
+    async def edit_message(self, **kwargs):
+        self._ack()
+        self._interaction.sent.append((None, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.sent.append((content, kwargs))
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.name = f"load-{channel_id}"
+
+    async def typing(self):
+        pass
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeMember:
+    def __init__(self, user_id: int, guild: "FakeGuild"):
+        self.id = user_id
+        self.guild = guild
+        self.name = f"learner{user_id % 100000}"
+        self.display_name = self.name
+        self.display_avatar = SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png")
+        self.voice = None
+        self.bot = False
+        self.roles: List = []
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, member_ids: List[int]):
+        self.id = guild_id
+        self.voice_client = None
+        self._members = {uid: FakeMember(uid, self) for uid in member_ids}
+        self.me = FakeMember(0, self)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._members.get(user_id)
+
+
+class FakeInteraction:
+    """Minimal Interaction surface used by bot.py callbacks"""
+
+    def __init__(self, guild: FakeGuild, user: FakeMember, channel: FakeChannel, data: Optional[dict] = None):
+        self.id = next(_snowflakes)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.data = data or {}
+        self.type = discord.InteractionType.application_command
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.sent: List = []
+        self.created = time.perf_counter()
+        self.acked_at: Optional[float] = None
+
+
+class InteractionLoadTest:
+    """Schedules interactions at a target rate and measures their latency"""
+
+    def __init__(self, bot_module, guild: FakeGuild, max_in_flight: int = 10000):
+        self.bot_module = bot_module
+        self.guild = guild
+        self.channel = FakeChannel(next(_snowflakes))
+        self.user_ids = list(guild._members)
+        self.rng = random.Random(1)
+        self.ack: Dict[str, List[float]] = {}
+        self.e2e: Dict[str, List[float]] = {}
+        self.outcomes: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = max_in_flight
+        self.peak_in_flight = 0
+        self.entry_custom_ids: List[str] = []
+        self._tasks = set()
+    
+    async def prepare(self):
+        """Collect the custom_ids of the /start buttons for button traffic"""
+        view = await self.bot_module.path_selection_view()
+        self.entry_custom_ids = [item.custom_id for item in view.children]
+
+    def _handler(self, kind: str):
+        bot = self.bot_module.bot
+        if kind == "button":
+            return self.bot_module.handle_component, {}
+        if kind == "leaderboard":
+            return bot.tree.get_command("leaderboard").callback, {"range": "weekly"}
+        if kind == "profile":
+            return bot.tree.get_command("profile").callback, {"member": None}
+        command = bot.tree.get_command(kind)
+        if command is None:
+            raise ValueError(f"unknown traffic kind '{kind}'")
+        return command.callback, {}
+
+    async def _one(self, kind: str, user_id: Optional[int]):
+        member = self.guild.get_member(user_id) if user_id else None
+        member = member or self.guild.get_member(self.rng.choice(self.user_ids))
+        data = None
+        if kind == "button":
+            data = {"custom_id": self.rng.choice(self.entry_custom_ids), "component_type": 2}
+        interaction = FakeInteraction(self.guild, member, self.channel, data)
+        if data is not None:
+            interaction.type = discord.InteractionType.component
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            callback, kwargs = self._handler(kind)
+            await callback(interaction, **kwargs)
+            self.outcomes[f"{kind}:ok"] += 1
+        except Exception as e:
+            self.outcomes[f"{kind}:error:{type(e).__name__}"] += 1
+        finally:
+            self.in_flight -= 1
+            finished = time.perf_counter()
+            self.e2e.setdefault(kind, []).append(finished - interaction.created)
+            if interaction.acked_at is not None:
+                ack = interaction.acked_at - interaction.created
+                self.ack.setdefault(kind, []).append(ack)
+                if ack > ACK_DEADLINE:
+                    self.outcomes[f"{kind}:ack_late"] += 1
+            else:
+                self.outcomes[f"{kind}:never_acked"] += 1
+
+    def _launch(self, kind: str, user_id: Optional[int] = None):
+        if self.in_flight >= self.max_in_flight:
+            self.outcomes["dropped:max_in_flight"] += 1
+            return
+        task = asyncio.create_task(self._one(kind, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run_synthetic(self, rate: float, duration: float, mix: Dict[str, float]):
+        kinds = list(mix)
+        weights = [mix[k] for k in kinds]
+        started = time.perf_counter()
+        sent = 0
+        while time.perf_counter() - started < duration:
+            # Open loop: schedule by wall clock so slow handlers don't lower the offered rate
+            due = int((time.perf_counter() - started) * rate) + 1
+            for _ in range(due - sent):
+                self._launch(self.rng.choices(kinds, weights)[0])
+            sent = max(sent, due)
+            await asyncio.sleep(1 / rate if rate < 1000 else 0.001)
+        return sent
+
+    async def run_replay(self, events: List[dict], speed: float):
+        started = time.perf_counter()
+        for event in sorted(events, key=lambda e: e["offset"]):
+            delay = event["offset"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._launch(event["kind"], event.get("user"))
+        return len(events)
+
+    async def drain(self, timeout: float):
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+async def run_load_test(args) -> dict:
+    from . import bot as bot_module
+
+    guild = FakeGuild(BENCH_GUILD_ID, [10 ** 12 + i for i in range(args.users)])
+    test = InteractionLoadTest(bot_module, guild, max_in_flight=args.max_in_flight)
+    await test.prepare()
+    lag = LoopLagMonitor(interval=0.05)
+
+    gc.collect()
+    tracemalloc.start()
+    heap_before, _ = tracemalloc.get_traced_memory()
+    lag.start()
+    started = time.perf_counter()
+
+    if args.replay:
+        with open(args.replay) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        offered = await test.run_replay(events, args.speed)
+    else:
+        offered = await test.run_synthetic(args.rate, args.duration, parse_mix(args.mix))
+
+    send_window = time.perf_counter() - started
+    await test.drain(args.drain_timeout)
+    elapsed = time.perf_counter() - started
+    await lag.stop()
+
+    heap_after, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    live_views = sum(1 for o in gc.get_objects() if isinstance(o, discord.ui.View))
+
+    completed = sum(len(v) for v in test.e2e.values())
+    return {
+        "offered": offered,
+        "completed": completed,
+        "offered_rate_s": round(offered / send_window, 1) if send_window else 0.0,
+        "completed_rate_s": round(completed / elapsed, 1) if elapsed else 0.0,
+        "peak_in_flight": test.peak_in_flight,
+        "still_in_flight": test.in_flight,
+        "ack": {kind: summarize(v) for kind, v in sorted(test.ack.items())},
+        "end_to_end": {kind: summarize(v) for kind, v in sorted(test.e2e.items())},
+        "loop_lag": summarize(lag.samples),
+        "memory": {
+            "heap_growth_kb": round((heap_after - heap_before) / 1024, 1),
+            "heap_peak_kb": round(heap_peak / 1024, 1),
+            "live_views": live_views
+        },
+        "outcomes": dict(test.outcomes)
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test ACA bot interaction handlers")
+    parser.add_argument("--rate", type=float, default=20.0, help="interactions per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of offered load")
+    parser.add_argument("--mix", default="button=70,profile=20,leaderboard=10")
+    parser.add_argument("--users", type=int, default=1000, help="distinct fake members")
+    parser.add_argument("--replay", help="JSON Lines traffic recording to replay instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--max-in-flight", type=int, default=10000)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    results = asyncio.run(run_load_test(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
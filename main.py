@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import signal
 from bot.core.bot import bot
 from bot.core.config import settings
 
@@ -10,13 +11,17 @@ logging.basicConfig(
 
 async def main():
     """Start the bot with proper error handling"""
+    # Graceful shutdown (drain + cache snapshot) instead of being cut off mid-traversal
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(bot.close()))
     try:
         await bot.start(settings.DISCORD_TOKEN)
-    except KeyboardInterrupt:
-        await bot.close()
     except Exception as e:
         logging.error(f"Fatal error: {e}", exc_info=True)
-        await bot.close()
+    finally:
+        if not bot.is_closed():
+            await bot.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
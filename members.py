@@ -0,0 +1,178 @@
+# ========================================
+# ACA Bot Member Directory
+# Bulk display-name resolution for rankings
+# ========================================
+"""
+Resolve member display names in bulk, without per-row API calls.
+
+``MemberDirectory.resolve(guild, user_ids)`` answers from, in order:
+
+1. the gateway member cache (``guild.get_member``, no I/O);
+2. Redis, one pipelined ``GET`` for every remaining id:
+
+       aca:member:name:<guild>:<user>   display name, MEMBER_NAME_TTL_SECONDS
+
+3. chunked gateway member requests (``guild.query_members(user_ids=...)``,
+   up to 100 ids each, at most ``MEMBER_QUERY_CONCURRENCY`` in flight).
+
+Names found by step 3 are written back with one pipelined ``SET``. Ids a
+successful request didn't return (members who left) are cached as ``""``
+for ``MEMBER_MISSING_TTL_SECONDS`` and rendered as ``User <id>``, so a
+ranking full of former members doesn't re-query them on every render. Ids
+of a failed request are shown as ``User <id>`` but not cached.
+
+Gateway events keep entries fresh: ``on_member_update`` / ``on_user_update``
+rewrite a changed name and ``on_member_remove`` drops it. Any page size
+therefore costs one Redis round trip plus, on a cold cache,
+``ceil(misses / 100)`` gateway requests.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import discord
+
+from .config import settings
+from .metrics import metrics
+from .redis_gateway import RedisGateway
+
+logger = logging.getLogger(__name__)
+
+NAME_KEY = "aca:member:name:{guild_id}:{user_id}"
+# Gateway member requests accept at most 100 user ids
+QUERY_CHUNK = 100
+
+MEMBER_NAMES = metrics.counter("aca_member_names_total", "Display names resolved by source", ("source",))
+_FROM_GATEWAY = MEMBER_NAMES.labels("gateway")
+_FROM_CACHE = MEMBER_NAMES.labels("cache")
+_FROM_QUERY = MEMBER_NAMES.labels("query")
+_MISSING = MEMBER_NAMES.labels("missing")
+MEMBER_QUERIES = metrics.counter("aca_member_queries_total", "Chunked gateway member requests by outcome", ("result",))
+_QUERY_OK = MEMBER_QUERIES.labels("ok")
+_QUERY_FAILED = MEMBER_QUERIES.labels("failed")
+
+
+def _name_key(guild_id: int, user_id: int) -> str:
+    return NAME_KEY.format(guild_id=guild_id, user_id=user_id)
+
+
+def fallback_name(user_id: int) -> str:
+    return f"User {user_id}"
+
+
+class MemberDirectory:
+    """Display names of guild members, resolved in bulk and cached in Redis"""
+
+    def __init__(
+        self,
+        gateway: RedisGateway,
+        ttl: float = settings.MEMBER_NAME_TTL_SECONDS,
+        missing_ttl: float = settings.MEMBER_MISSING_TTL_SECONDS,
+        concurrency: int = settings.MEMBER_QUERY_CONCURRENCY
+    ):
+        self.redis = gateway
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._queries = asyncio.Semaphore(concurrency)
+
+    async def resolve(self, guild: discord.Guild, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Display name of every id, falling back to ``User <id>`` for unknown members"""
+        names: Dict[int, str] = {}
+        pending: List[int] = []
+        for user_id in dict.fromkeys(user_ids):
+            member = guild.get_member(user_id)
+            if member is not None:
+                names[user_id] = member.display_name
+            else:
+                pending.append(user_id)
+        _FROM_GATEWAY.inc(len(names))
+        if not pending:
+            return names
+
+        lookup = self.redis.batch()
+        for user_id in pending:
+            lookup.get(_name_key(guild.id, user_id))
+        try:
+            cached = await lookup.execute()
+        except Exception as e:
+            logger.warning(f"Member name cache unavailable: {e}")
+            cached = [None] * len(pending)
+
+        misses = []
+        for user_id, name in zip(pending, cached):
+            if name is None:
+                misses.append(user_id)
+            else:
+                # "" marks a member no request could find
+                names[user_id] = name or fallback_name(user_id)
+        _FROM_CACHE.inc(len(pending) - len(misses))
+
+        if misses:
+            found, missing = await self._query(guild, misses)
+            _FROM_QUERY.inc(len(found))
+            _MISSING.inc(len(misses) - len(found))
+            for user_id in misses:
+                names[user_id] = found.get(user_id) or fallback_name(user_id)
+            await self._store(guild.id, found, missing)
+        return names
+
+    async def _query(self, guild: discord.Guild, user_ids: Sequence[int]) -> Tuple[Dict[int, str], List[int]]:
+        """(names found, ids a successful request didn't return); ids of failed requests are in neither"""
+        async def chunk(ids: Sequence[int]) -> Optional[List[discord.Member]]:
+            async with self._queries:
+                try:
+                    # cache=True also fills the gateway member cache for later renders
+                    members = await guild.query_members(user_ids=list(ids), limit=len(ids), cache=True)
+                except (asyncio.TimeoutError, discord.ClientException) as e:
+                    _QUERY_FAILED.inc()
+                    logger.warning(f"Member request for {len(ids)} ids in guild {guild.id} failed: {e}")
+                    return None
+                _QUERY_OK.inc()
+                return members
+
+        chunks = [user_ids[i:i + QUERY_CHUNK] for i in range(0, len(user_ids), QUERY_CHUNK)]
+        results = await asyncio.gather(*(chunk(ids) for ids in chunks))
+        found: Dict[int, str] = {}
+        missing: List[int] = []
+        for ids, members in zip(chunks, results):
+            if members is None:
+                # Unknown, not gone: retried on the next render
+                continue
+            returned = {member.id: member.display_name for member in members}
+            found.update(returned)
+            missing.extend(user_id for user_id in ids if user_id not in returned)
+        return found, missing
+
+    async def _store(self, guild_id: int, names: Dict[int, str], missing: Sequence[int] = ()):
+        if not names and not missing:
+            return
+        batch = self.redis.batch()
+        for user_id, name in names.items():
+            batch.set(_name_key(guild_id, user_id), name, ex=self.ttl)
+        for user_id in missing:
+            batch.set(_name_key(guild_id, user_id), "", ex=self.missing_ttl)
+        try:
+            await batch.execute()
+        except Exception as e:
+            logger.warning(f"Could not cache member names: {e}")
+
+    # ---- gateway events ------------------------------------------------
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.display_name != after.display_name:
+            await self._store(after.guild.id, {after.id: after.display_name})
+
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        """Global name changes show in every guild that doesn't override them"""
+        if before.display_name == after.display_name:
+            return
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                await self._store(guild.id, {member.id: member.display_name})
+
+    async def on_member_remove(self, member: discord.Member):
+        try:
+            await self.redis.delete(_name_key(member.guild.id, member.id))
+        except Exception as e:
+            logger.warning(f"Could not drop cached member name: {e}")
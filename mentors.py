@@ -0,0 +1,305 @@
+# ========================================
+# ACA Bot Mentor Matching
+# In-memory mentor index & fair priority queues
+# ========================================
+"""
+Match learners to mentors without touching Postgres per request.
+
+Each guild's mentors (``users.is_mentor``) are loaded once with a single
+query on ``idx_users_mentor`` and kept in a ``MentorIndex``. A mentor's
+expertise is the set of badge slugs they hold. The index keeps one heap per
+expertise plus one over all mentors, ordered by
+
+    (active sessions, not in voice, -mentor_score)
+
+so the least-loaded, immediately reachable, best-rated mentor is popped in
+O(log n). A mentor at ``MENTOR_MAX_SESSIONS`` leaves the heaps until a
+session ends. Heap entries are invalidated lazily: every change bumps the
+mentor's stamp and pushes a fresh entry, and stale entries are discarded
+when they reach the top.
+
+Availability follows Discord events: voice joins/leaves set the voice flag,
+and when the presences intent is enabled, offline/DND mentors are withheld.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import discord
+from sqlalchemy import func, select
+
+from .config import settings
+from .database import get_db_session
+from .metrics import metrics
+from .models import Badge, User, user_badges
+
+logger = logging.getLogger(__name__)
+
+ANY_TOPIC = "*"
+
+MENTOR_MATCHES = metrics.counter("aca_mentor_matches_total", "Mentor match requests by outcome", ("result",))
+_MATCHED = MENTOR_MATCHES.labels("matched")
+_NO_MENTOR = MENTOR_MATCHES.labels("no_mentor")
+MENTOR_SESSIONS = metrics.gauge("aca_mentor_sessions", "Active mentor sessions in this process")
+
+_UNAVAILABLE_STATUSES = (discord.Status.offline, discord.Status.dnd)
+
+
+@dataclass(slots=True)
+class MentorProfile:
+    user_id: int
+    score: float
+    expertise: FrozenSet[str]
+    load: int = 0
+    online: bool = True
+    in_voice: bool = False
+    stamp: int = 0
+
+    def key(self) -> Tuple[int, bool, float]:
+        return (self.load, not self.in_voice, -self.score)
+
+
+@dataclass(slots=True)
+class MentorSession:
+    learner_id: int
+    mentor_id: int
+    topic: str
+    started: float = field(default_factory=time.monotonic)
+
+
+class MentorIndex:
+    """Available mentors of one guild, queued per expertise"""
+
+    def __init__(self, guild_id: int, max_sessions: int = settings.MENTOR_MAX_SESSIONS):
+        self.guild_id = guild_id
+        self.max_sessions = max_sessions
+        self.mentors: Dict[int, MentorProfile] = {}
+        # topic -> heap of (key..., stamp, user_id)
+        self._heaps: Dict[str, list] = {}
+        # learner_id -> session, oldest first
+        self.sessions: "OrderedDict[int, MentorSession]" = OrderedDict()
+        self._tiebreak = itertools.count()
+        self.loaded_at = time.monotonic()
+
+    # ---- maintenance ---------------------------------------------------
+
+    def _eligible(self, mentor: MentorProfile) -> bool:
+        return mentor.online and mentor.load < self.max_sessions
+
+    def _push(self, mentor: MentorProfile):
+        mentor.stamp = next(self._tiebreak)
+        if not self._eligible(mentor):
+            return
+        entry = (*mentor.key(), mentor.stamp, mentor.user_id)
+        for topic in itertools.chain((ANY_TOPIC,), mentor.expertise):
+            heap = self._heaps.setdefault(topic, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 2 * len(self.mentors) + 64:
+                self._compact(topic)
+
+    def _compact(self, topic: str):
+        heap = [e for e in self._heaps[topic] if self._live(e)]
+        heapq.heapify(heap)
+        self._heaps[topic] = heap
+
+    def _live(self, entry) -> bool:
+        mentor = self.mentors.get(entry[-1])
+        return mentor is not None and mentor.stamp == entry[-2] and self._eligible(mentor)
+
+    def upsert(self, user_id: int, score: float, expertise: Iterable[str]):
+        """Add or refresh a mentor, keeping load and availability"""
+        mentor = self.mentors.get(user_id)
+        if mentor is None:
+            mentor = self.mentors[user_id] = MentorProfile(user_id, score, frozenset(expertise))
+        else:
+            mentor.score = score
+            mentor.expertise = frozenset(expertise)
+        self._push(mentor)
+
+    def remove(self, user_id: int):
+        self.mentors.pop(user_id, None)
+
+    def set_presence(self, user_id: int, online: Optional[bool] = None, in_voice: Optional[bool] = None):
+        mentor = self.mentors.get(user_id)
+        if mentor is None:
+            return
+        changed = False
+        if online is not None and online != mentor.online:
+            mentor.online, changed = online, True
+        if in_voice is not None and in_voice != mentor.in_voice:
+            mentor.in_voice, changed = in_voice, True
+        if changed:
+            self._push(mentor)
+
+    # ---- matching ------------------------------------------------------
+
+    def _pop(self, topic: str, exclude: int) -> Optional[MentorProfile]:
+        heap = self._heaps.get(topic)
+        if not heap:
+            return None
+        skipped = None
+        mentor = None
+        while heap:
+            entry = heap[0]
+            if not self._live(entry):
+                heapq.heappop(heap)
+                continue
+            if entry[-1] == exclude:
+                # Learners who are mentors themselves can't be matched to themselves
+                skipped = heapq.heappop(heap)
+                continue
+            mentor = self.mentors[entry[-1]]
+            heapq.heappop(heap)
+            break
+        if skipped is not None:
+            heapq.heappush(heap, skipped)
+        return mentor
+
+    def match(self, learner_id: int, topic: Optional[str] = None) -> Optional[MentorSession]:
+        """Assign the best available mentor, preferring one with the topic's expertise"""
+        self.expire_sessions()
+        existing = self.sessions.get(learner_id)
+        if existing is not None:
+            return existing
+
+        mentor = None
+        if topic:
+            mentor = self._pop(topic, learner_id)
+        if mentor is None:
+            mentor = self._pop(ANY_TOPIC, learner_id)
+        if mentor is None:
+            _NO_MENTOR.inc()
+            return None
+
+        mentor.load += 1
+        self._push(mentor)
+        session = self.sessions[learner_id] = MentorSession(learner_id, mentor.user_id, topic or ANY_TOPIC)
+        _MATCHED.inc()
+        MENTOR_SESSIONS.inc()
+        return session
+
+    def end_session(self, learner_id: int) -> Optional[MentorSession]:
+        session = self.sessions.pop(learner_id, None)
+        if session is None:
+            return None
+        MENTOR_SESSIONS.dec()
+        mentor = self.mentors.get(session.mentor_id)
+        if mentor is not None:
+            mentor.load = max(mentor.load - 1, 0)
+            self._push(mentor)
+        return session
+
+    def expire_sessions(self, max_age: float = settings.MENTOR_SESSION_SECONDS):
+        cutoff = time.monotonic() - max_age
+        while self.sessions:
+            learner_id, session = next(iter(self.sessions.items()))
+            if session.started > cutoff:
+                break
+            self.end_session(learner_id)
+
+    def available(self, topic: Optional[str] = None, limit: int = 5) -> List[MentorProfile]:
+        """Best candidates without assigning them (for listings)"""
+        heap = self._heaps.get(topic or ANY_TOPIC, [])
+        best = heapq.nsmallest(limit * 2 + 8, (e for e in heap if self._live(e)))
+        seen, result = set(), []
+        for entry in best:
+            if entry[-1] not in seen:
+                seen.add(entry[-1])
+                result.append(self.mentors[entry[-1]])
+            if len(result) == limit:
+                break
+        return result
+
+
+class MentorService:
+    """Per-guild mentor indexes, loaded on first use and refreshed in the background"""
+
+    def __init__(self, refresh_seconds: float = settings.MENTOR_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._indexes: Dict[int, MentorIndex] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+        self.track_presence = False
+
+    def is_loaded(self, guild_id: int) -> bool:
+        """Whether ``index`` can answer without a database round trip"""
+        return guild_id in self._indexes
+
+    async def index(self, guild: discord.Guild) -> MentorIndex:
+        index = self._indexes.get(guild.id)
+        if index is None:
+            # Bursts of first requests share one load
+            task = self._loading.get(guild.id)
+            if task is None:
+                task = self._loading[guild.id] = asyncio.create_task(self._load(guild, None))
+            try:
+                index = await asyncio.shield(task)
+            finally:
+                self._loading.pop(guild.id, None)
+        elif time.monotonic() - index.loaded_at > self.refresh_seconds and guild.id not in self._loading:
+            self._loading[guild.id] = task = asyncio.create_task(self._load(guild, index))
+            task.add_done_callback(lambda _: self._loading.pop(guild.id, None))
+        return index
+
+    async def _load(self, guild: discord.Guild, index: Optional[MentorIndex]) -> MentorIndex:
+        started = time.perf_counter()
+        async with get_db_session() as session:
+            # Served by idx_users_mentor (guild_id, mentor_score DESC) WHERE is_mentor
+            mentor_rows = (await session.execute(
+                select(User.user_id, func.max(User.mentor_score))
+                .where(User.guild_id == guild.id, User.is_mentor.is_(True))
+                .group_by(User.user_id)
+            )).all()
+            expertise_rows = (await session.execute(
+                select(user_badges.c.user_id, Badge.slug)
+                .join(Badge, Badge.badge_id == user_badges.c.badge_id)
+                .join(User, (User.user_id == user_badges.c.user_id)
+                      & (User.guild_id == user_badges.c.guild_id)
+                      & (User.project_id == user_badges.c.project_id))
+                .where(user_badges.c.guild_id == guild.id, User.is_mentor.is_(True))
+            )).all() if mentor_rows else []
+
+        expertise: Dict[int, set] = {}
+        for user_id, slug in expertise_rows:
+            expertise.setdefault(user_id, set()).add(slug)
+
+        if index is None:
+            index = MentorIndex(guild.id)
+        current = {user_id for user_id, _ in mentor_rows}
+        for user_id in [uid for uid in index.mentors if uid not in current]:
+            index.remove(user_id)
+        for user_id, score in mentor_rows:
+            index.upsert(user_id, float(score if score is not None else 1.0), expertise.get(user_id, ()))
+            member = guild.get_member(user_id)
+            if member is not None:
+                index.set_presence(user_id, **self._presence(member))
+        index.loaded_at = time.monotonic()
+        self._indexes[guild.id] = index
+        logger.info(
+            f"Loaded {len(mentor_rows)} mentors for guild {guild.id} "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return index
+
+    def _presence(self, member: discord.Member) -> dict:
+        state = {"in_voice": member.voice is not None and member.voice.channel is not None}
+        if self.track_presence:
+            state["online"] = member.status not in _UNAVAILABLE_STATUSES
+        return state
+
+    # ---- Discord events ------------------------------------------------
+
+    def on_member_update(self, member: discord.Member):
+        index = self._indexes.get(member.guild.id)
+        if index is not None:
+            index.set_presence(member.id, **self._presence(member))
+
+    def invalidate(self, guild_id: int):
+        """Reload on next use, e.g. after mentor flags change"""
+        index = self._indexes.get(guild_id)
+        if index is not None:
+            index.loaded_at = 0.0
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, Boolean, DateTime, ForeignKey, Text, JSON, Binary, Numeric
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, DateTime, ForeignKey, ForeignKeyConstraint, Text, JSON, LargeBinary, Numeric, Table
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
@@ -18,7 +18,7 @@ class User(Base):
     badge_cache = Column(JSON)
     mentor_score = Column(Numeric(3, 2), default=1.0)
     is_mentor = Column(Boolean, default=False)
-    encrypted_payload = Column(Binary, nullable=False)
+    encrypted_payload = Column(LargeBinary, nullable=False)
     
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,447 @@
+# ========================================
+# ACA Bot Redis Gateway
+# Pipelining, timeouts, circuit breaker & local fallback
+# ========================================
+"""
+The engine's only path to Redis.
+
+Every call goes through a ``Batch`` so operations a request needs together
+are sent as one pipeline (one round trip). Each round trip is bounded by
+``REDIS_TIMEOUT_SECONDS``; ``REDIS_BREAKER_FAILURES`` consecutive failures
+open the circuit breaker and, for ``REDIS_BREAKER_RESET_SECONDS``, calls are
+served by a bounded in-process store instead of failing the traversal.
+
+While degraded, the local store records which keys it changed. The next
+call that reaches Redis (the probe after the reset interval, or simply the
+next call when a lone failure left the breaker closed) first reconciles
+those keys:
+
+- claims made with ``set(..., nx=True)`` (cooldowns) are replayed with NX and
+  their remaining TTL so other workers honour them;
+- every other touched key is deleted in Redis, since the copy there may
+  predate a change made during the outage (state caches are rebuilt from
+  the database on the next miss).
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import redis.asyncio as redis
+
+from .config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = metrics.gauge(
+    "aca_redis_breaker_state", "Redis circuit breaker state (0 closed, 1 half-open, 2 open)"
+)
+REDIS_CALLS = metrics.counter("aca_redis_calls_total", "Redis round trips by outcome", ("result",))
+_CALL_OK = REDIS_CALLS.labels("ok")
+_CALL_ERROR = REDIS_CALLS.labels("error")
+_CALL_TIMEOUT = REDIS_CALLS.labels("timeout")
+_CALL_FALLBACK = REDIS_CALLS.labels("fallback")
+ROUND_TRIPS = metrics.histogram(
+    "aca_redis_round_trips_per_request",
+    "Redis round trips made by one engine request",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12)
+)
+FALLBACK_KEYS = metrics.gauge("aca_redis_fallback_keys", "Keys held by the in-process fallback store")
+RECONCILED = metrics.counter("aca_redis_reconciled_keys_total", "Keys pushed to Redis after an outage", ("action",))
+
+Expiry = Union[int, float, timedelta, None]
+
+# Round trips made by the current request; None outside a request scope
+_request_round_trips: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "aca_redis_round_trips", default=None
+)
+
+
+def _seconds(ex: Expiry) -> Optional[float]:
+    if ex is None:
+        return None
+    if isinstance(ex, timedelta):
+        return ex.total_seconds()
+    return float(ex)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        BREAKER_STATE.set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Redis circuit breaker {self.state} -> {state}")
+            self.state = state
+            BREAKER_STATE.set(_STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        """Whether a call may go to Redis; moves open -> half-open for one probe"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state(HALF_OPEN)
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+
+class LocalStore:
+    """Bounded LRU key/value store with expiry, used while Redis is unavailable"""
+
+    def __init__(self, max_keys: int, track_changes: bool = True):
+        self.max_keys = max_keys
+        self.track_changes = track_changes
+        # key -> (value, expires_at or None)
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        # keys changed while degraded -> True if the change was an NX claim
+        self.touched: Dict[str, bool] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _live(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _touch(self, key: str, claim: bool = False):
+        if not self.track_changes:
+            return
+        self.touched[key] = claim or self.touched.get(key, False)
+        if len(self.touched) > self.max_keys:
+            # Oldest record goes; its key is left to expire in Redis on its own
+            self.touched.pop(next(iter(self.touched)))
+
+    def _store(self, key: str, value: Any, ex: Expiry):
+        ttl = _seconds(ex)
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def get(self, key: str):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: Any, ex: Expiry = None, nx: bool = False):
+        if nx and self._live(key) is not None:
+            return None
+        self._store(key, value, ex)
+        self._touch(key, claim=nx)
+        return True
+
+    def setex(self, key: str, ex: Expiry, value: Any):
+        return self.set(key, value, ex=ex)
+
+    def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                removed += 1
+            self._touch(key)
+        return removed
+
+    def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._live(key) is not None)
+
+    def remaining(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """(value, seconds left) for a live key"""
+        entry = self._live(key)
+        if entry is None:
+            return None
+        return entry[0], (entry[1] - time.monotonic() if entry[1] is not None else None)
+
+    def clear(self):
+        self._data.clear()
+        self.touched.clear()
+
+    def take_changes(self) -> Dict[str, bool]:
+        """Detach the change records; changes made from now on are recorded afresh"""
+        taken, self.touched = self.touched, {}
+        return taken
+
+    def restore_changes(self, taken: Dict[str, bool]):
+        """Put back records from ``take_changes`` that could not be pushed"""
+        merged = dict(taken)
+        for key, claim in self.touched.items():
+            # The newer change goes last, as if it had been recorded now
+            merged[key] = claim or merged.pop(key, False)
+        self.touched = merged
+
+    def forget(self, keys: Iterable[str]):
+        """Drop the local values of pushed keys that haven't changed again since"""
+        for key in keys:
+            if key not in self.touched:
+                self._data.pop(key, None)
+        if not self.touched:
+            self._data.clear()
+
+    def export_changes(self) -> Tuple[List[Tuple[str, Any, Optional[float]]], Dict[str, bool]]:
+        """Live changed entries as (key, value, seconds left) plus the change records"""
+        entries = []
+        for key in self.touched:
+            live = self.remaining(key)
+            if live is not None:
+                entries.append((key, live[0], live[1]))
+        return entries, dict(self.touched)
+
+    def import_changes(self, entries: List[Tuple[str, Any, Optional[float]]], touched: Dict[str, bool], elapsed: float):
+        """Re-apply ``export_changes`` output from ``elapsed`` seconds ago"""
+        for key, value, ttl in entries:
+            if ttl is not None:
+                ttl -= elapsed
+                if ttl <= 0:
+                    continue
+            self._store(key, value, ttl)
+        for key, claim in touched.items():
+            self._touch(key, claim)
+
+
+class Batch:
+    """Operations sent to Redis as one pipeline; results come back in order"""
+
+    __slots__ = ("gateway", "ops", "atomic")
+
+    def __init__(self, gateway: "RedisGateway", atomic: bool = False):
+        self.gateway = gateway
+        self.ops: List[Tuple[str, tuple, dict]] = []
+        # MULTI/EXEC, so no other client's commands interleave with these
+        self.atomic = atomic
+
+    def get(self, key: str) -> "Batch":
+        self.ops.append(("get", (key,), {}))
+        return self
+
+    def set(self, key: str, value: Any, ex: Expiry = None, nx: bool = False) -> "Batch":
+        self.ops.append(("set", (key, value), {"ex": ex, "nx": nx}))
+        return self
+
+    def setex(self, key: str, ex: Expiry, value: Any) -> "Batch":
+        self.ops.append(("setex", (key, ex, value), {}))
+        return self
+
+    def delete(self, *keys: str) -> "Batch":
+        self.ops.append(("delete", keys, {}))
+        return self
+
+    def exists(self, *keys: str) -> "Batch":
+        self.ops.append(("exists", keys, {}))
+        return self
+
+    async def execute(self) -> List[Any]:
+        if not self.ops:
+            return []
+        return await self.gateway._execute(self.ops, self.atomic)
+
+
+class _RequestScope:
+    """Counts round trips for the outermost engine call in this task"""
+
+    __slots__ = ("token",)
+
+    def __enter__(self):
+        self.token = None
+        if _request_round_trips.get() is None:
+            self.token = _request_round_trips.set([0])
+
+    def __exit__(self, *exc):
+        if self.token is not None:
+            ROUND_TRIPS.observe(_request_round_trips.get()[0])
+            _request_round_trips.reset(self.token)
+        return False
+
+
+class RedisGateway:
+    """Resilient front for the Redis client used by the engine"""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        timeout: float = settings.REDIS_TIMEOUT_SECONDS,
+        failure_threshold: int = settings.REDIS_BREAKER_FAILURES,
+        reset_seconds: float = settings.REDIS_BREAKER_RESET_SECONDS,
+        fallback_max_keys: int = settings.REDIS_FALLBACK_MAX_KEYS
+    ):
+        # Raw client for pub/sub and callers that manage their own failures
+        self.client = client
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.local = LocalStore(fallback_max_keys)
+        # One reconciliation at a time; calls arriving meanwhile wait for it
+        self._reconcile_lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.state == CLOSED
+
+    def request(self) -> _RequestScope:
+        """Scope an engine request for the round-trips-per-request histogram"""
+        return _RequestScope()
+
+    def batch(self, atomic: bool = False) -> Batch:
+        return Batch(self, atomic)
+
+    # ---- single-operation shortcuts ------------------------------------
+
+    async def get(self, key: str):
+        return (await self.batch().get(key).execute())[0]
+
+    async def set(self, key: str, value: Any, ex: Expiry = None, nx: bool = False):
+        return (await self.batch().set(key, value, ex=ex, nx=nx).execute())[0]
+
+    async def setex(self, key: str, ex: Expiry, value: Any):
+        return (await self.batch().setex(key, ex, value).execute())[0]
+
+    async def delete(self, *keys: str) -> int:
+        return (await self.batch().delete(*keys).execute())[0]
+
+    async def exists(self, *keys: str) -> int:
+        return (await self.batch().exists(*keys).execute())[0]
+
+    async def ping(self) -> bool:
+        """Direct liveness check; raises instead of falling back"""
+        return await asyncio.wait_for(self.client.ping(), self.timeout)
+
+    async def flush(self) -> bool:
+        """Push outage changes to Redis now instead of on the next probe; False if Redis is still down"""
+        if not self.local.touched:
+            return True
+        try:
+            await self._reconcile()
+        except (asyncio.TimeoutError, redis.RedisError, OSError):
+            return False
+        return True
+
+    # ---- execution -----------------------------------------------------
+
+    async def _execute(self, ops: List[Tuple[str, tuple, dict]], atomic: bool = False) -> List[Any]:
+        if self.breaker.allow():
+            counter = _request_round_trips.get()
+            if counter is not None:
+                counter[0] += 1
+            try:
+                if self.local.touched:
+                    # Fallback writes (after an outage, or a single failed call that
+                    # left the breaker closed) must land before anything reads Redis again
+                    await self._reconcile()
+                results = await asyncio.wait_for(self._pipeline(ops, atomic), self.timeout)
+            except asyncio.TimeoutError:
+                _CALL_TIMEOUT.inc()
+                self.breaker.record_failure()
+            except (redis.RedisError, OSError) as e:
+                _CALL_ERROR.inc()
+                logger.debug(f"Redis call failed: {e}")
+                self.breaker.record_failure()
+            else:
+                _CALL_OK.inc()
+                self.breaker.record_success()
+                return results
+
+        _CALL_FALLBACK.inc()
+        results = [getattr(self.local, name)(*args, **kwargs) for name, args, kwargs in ops]
+        FALLBACK_KEYS.set(len(self.local))
+        return results
+
+    async def _pipeline(self, ops: List[Tuple[str, tuple, dict]], atomic: bool = False) -> List[Any]:
+        if len(ops) == 1:
+            name, args, kwargs = ops[0]
+            return [await getattr(self.client, name)(*args, **kwargs)]
+        pipe = self.client.pipeline(transaction=atomic)
+        for name, args, kwargs in ops:
+            getattr(pipe, name)(*args, **kwargs)
+        return await pipe.execute()
+
+    async def _reconcile(self):
+        """Push changes made during an outage back to Redis, then drop their local state
+
+        The pushed records are detached first: a fallback write recorded while
+        the pipeline is in flight stays recorded for the next reconciliation
+        instead of being cleared with the rest.
+        """
+        async with self._reconcile_lock:
+            # Whoever held the lock may already have pushed everything
+            if self.local.touched:
+                await self._push_changes(self.local.take_changes())
+
+    async def _push_changes(self, touched: Dict[str, bool]):
+        pipe = self.client.pipeline(transaction=False)
+        claims = deletes = 0
+        for key, claim in touched.items():
+            live = self.local.remaining(key) if claim else None
+            if live is not None:
+                value, ttl = live
+                pipe.set(key, value, px=max(int(ttl * 1000), 1) if ttl is not None else None, nx=True)
+                claims += 1
+            else:
+                pipe.delete(key)
+                deletes += 1
+        try:
+            await asyncio.wait_for(pipe.execute(), self.timeout * 4)
+        except BaseException as e:
+            # Local state is kept; the breaker re-opens and the next probe retries
+            self.local.restore_changes(touched)
+            if isinstance(e, (asyncio.TimeoutError, redis.RedisError, OSError)):
+                logger.warning(f"Redis reconciliation failed: {e!r}")
+            raise
+        RECONCILED.labels("claim").inc(claims)
+        RECONCILED.labels("delete").inc(deletes)
+        logger.info(f"Reconciled {claims} claims and {deletes} invalidations after Redis outage")
+        self.local.forget(touched)
+        FALLBACK_KEYS.set(len(self.local))
+
+
+class LocalGateway(RedisGateway):
+    """The gateway interface served entirely in-process (no Redis at all)
+
+    Used by the in-memory storage backend for simulations and benchmarks;
+    round trips are still counted so per-request costs stay comparable.
+    """
+
+    def __init__(self, max_keys: int = 10_000_000):
+        self.client = None
+        self.timeout = 0.0
+        self.breaker = CircuitBreaker(1, 0.0)
+        self.local = LocalStore(max_keys, track_changes=False)
+        self._reconcile_lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def ping(self) -> bool:
+        return True
+
+    async def _execute(self, ops: List[Tuple[str, tuple, dict]], atomic: bool = False) -> List[Any]:
+        # Nothing awaits between operations, so every batch is atomic here
+        counter = _request_round_trips.get()
+        if counter is not None:
+            counter[0] += 1
+        return [getattr(self.local, name)(*args, **kwargs) for name, args, kwargs in ops]
@@ -0,0 +1,402 @@
+# ========================================
+# ACA Bot Project Registry
+# Database-driven multi-tenant project cache
+# ========================================
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from .config import settings
+from .graph_index import GraphIndex
+from .storage import CHANGE_CHANNEL, VERSION_KEY, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectNotFound(LookupError):
+    """Raised when a project slug has no row in the projects table"""
+
+
+@dataclass(frozen=True, slots=True)
+class NodeSnapshot:
+    node_id: int
+    title: str
+    description: Optional[str]
+    parent_node_id: Optional[int]
+    required_ec: int
+    is_checkpoint: bool
+    is_root: bool
+
+
+@dataclass(frozen=True, slots=True)
+class EdgeSnapshot:
+    edge_id: int
+    from_node_id: int
+    to_node_id: int
+    choice_text: str
+    choice_order: int
+    condition_json: Optional[dict]
+    ec_gain: int
+    cooldown_seconds: int
+
+
+@dataclass(frozen=True, slots=True)
+class BadgeSnapshot:
+    badge_id: int
+    slug: str
+    name: str
+    emoji: Optional[str]
+    description: Optional[str]
+    role_id: Optional[int]
+    required_nodes: Tuple[int, ...]
+    required_ec: int
+
+
+class GraphSnapshot:
+    """Immutable in-memory copy of a project's nodes and edges"""
+
+    def __init__(self, nodes: List[NodeSnapshot], edges: List[EdgeSnapshot], version: int):
+        self.version = version
+        self.nodes: Dict[int, NodeSnapshot] = {n.node_id: n for n in nodes}
+        self.edges: Dict[int, EdgeSnapshot] = {e.edge_id: e for e in edges}
+
+        outgoing: Dict[int, List[EdgeSnapshot]] = {}
+        for edge in edges:
+            outgoing.setdefault(edge.from_node_id, []).append(edge)
+        self._outgoing: Dict[int, Tuple[EdgeSnapshot, ...]] = {
+            node_id: tuple(sorted(out, key=lambda e: (e.choice_order, e.edge_id)))
+            for node_id, out in outgoing.items()
+        }
+
+    def outgoing_edges(self, node_id: int) -> Tuple[EdgeSnapshot, ...]:
+        return self._outgoing.get(node_id, ())
+
+    @property
+    def size(self) -> int:
+        return len(self.nodes) + len(self.edges)
+
+
+class BadgeCatalogue:
+    """All badges of a project, indexed by id and slug"""
+
+    def __init__(self, badges: List[BadgeSnapshot]):
+        self.badges: Tuple[BadgeSnapshot, ...] = tuple(sorted(badges, key=lambda b: b.required_ec))
+        self.by_id: Dict[int, BadgeSnapshot] = {b.badge_id: b for b in badges}
+        self.by_slug: Dict[str, BadgeSnapshot] = {b.slug: b for b in badges}
+
+    def eligible_by_ec(self, ec_total: int) -> List[BadgeSnapshot]:
+        return [b for b in self.badges if b.required_ec <= ec_total]
+
+    def __len__(self) -> int:
+        return len(self.badges)
+
+
+@dataclass
+class ProjectContext:
+    """Per-project config plus lazily loaded graph and badge catalogue"""
+    project_id: UUID
+    slug: str
+    name: str
+    config: Dict[str, Any]
+    graph_version: int = 0
+    graph: Optional[GraphSnapshot] = None
+    badges: Optional[BadgeCatalogue] = None
+    index: Optional[GraphIndex] = None
+    last_used: float = field(default_factory=time.monotonic)
+    checked_at: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def root_node_id(self, path: str) -> int:
+        return self.config["root_nodes"][path]
+
+    def entry_edge_id(self, path: str) -> int:
+        return self.config["entry_edges"][path]
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self.config.get("root_nodes", {}))
+
+    @property
+    def default_path(self) -> str:
+        """Path new members start on: ``default_path`` if configured, else the first path"""
+        default = self.config.get("default_path")
+        if default in self.config.get("root_nodes", {}):
+            return default
+        return self.paths[0]
+
+    def entry_paths(self) -> List[Tuple[str, int]]:
+        """(path, entry edge id) of every path that has an entry edge, in config order"""
+        entry_edges = self.config.get("entry_edges", {})
+        return [(path, entry_edges[path]) for path in self.paths if path in entry_edges]
+
+    def path_label(self, path: str, default: Optional[str] = None) -> str:
+        return self.config.get("path_labels", {}).get(path) or default or path.upper()
+
+    @property
+    def cost(self) -> int:
+        """Approximate memory weight used for eviction (loaded objects)"""
+        return (
+            (self.graph.size if self.graph else 0)
+            + (len(self.badges) if self.badges else 0)
+            + (self.index.size if self.index else 0)
+        )
+
+    def drop_content(self):
+        self.graph = None
+        self.badges = None
+        self.index = None
+
+
+class ProjectRegistry:
+    """Loads projects from storage on first use and keeps a bounded cache"""
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        max_objects: int = settings.PROJECT_CACHE_MAX_OBJECTS,
+        idle_seconds: float = settings.PROJECT_IDLE_SECONDS,
+        version_check_seconds: float = settings.PROJECT_VERSION_CHECK_SECONDS
+    ):
+        self.storage = storage
+        # Raw client for change notifications; None for in-memory storage
+        self.redis = storage.cache.client
+        self.max_objects = max_objects
+        self.idle_seconds = idle_seconds
+        self.version_check_seconds = version_check_seconds
+        self._projects: "OrderedDict[str, ProjectContext]" = OrderedDict()
+        self._load_lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    # ---- lookup -------------------------------------------------------
+
+    async def get(self, slug: str) -> ProjectContext:
+        """Project metadata/config (no graph load)"""
+        ctx = self._projects.get(slug)
+        if ctx is not None:
+            await self._check_version(ctx)
+            # A version change invalidates the project; reload it below
+            ctx = self._projects.get(slug)
+        if ctx is None:
+            async with self._load_lock:
+                ctx = self._projects.get(slug)
+                if ctx is None:
+                    ctx = await self._load_project(slug)
+                    self._projects[slug] = ctx
+            self._enforce_budget(keep=slug)
+
+        ctx.last_used = time.monotonic()
+        self._projects.move_to_end(slug)
+        return ctx
+
+    async def get_graph(self, slug: str) -> GraphSnapshot:
+        ctx = await self.get(slug)
+        if ctx.graph is None:
+            async with ctx.lock:
+                if ctx.graph is None:
+                    ctx.graph = await self._load_graph(ctx)
+            self._enforce_budget(keep=slug)
+        return ctx.graph
+
+    async def get_badges(self, slug: str) -> BadgeCatalogue:
+        ctx = await self.get(slug)
+        if ctx.badges is None:
+            async with ctx.lock:
+                if ctx.badges is None:
+                    ctx.badges = await self._load_badges(ctx)
+            self._enforce_budget(keep=slug)
+        return ctx.badges
+
+    async def get_index(self, slug: str) -> GraphIndex:
+        """Precomputed reachability/badge index, built off-loop on first use"""
+        ctx = await self.get(slug)
+        if ctx.index is None:
+            graph = await self.get_graph(slug)
+            badges = await self.get_badges(slug)
+            async with ctx.lock:
+                if ctx.index is None:
+                    started = time.perf_counter()
+                    ctx.index = await asyncio.to_thread(
+                        GraphIndex, graph, badges, ctx.config.get("root_nodes", {}).values()
+                    )
+                    summary = ctx.index.summary()
+                    logger.info(
+                        f"Indexed graph for '{slug}' in {(time.perf_counter() - started) * 1000:.0f}ms: {summary}"
+                    )
+                    if summary["unreachable_nodes"] or summary["unachievable_badges"]:
+                        logger.warning(
+                            f"Project '{slug}' has {summary['unreachable_nodes']} unreachable nodes "
+                            f"and unachievable badges {list(ctx.index.unachievable_badges)}"
+                        )
+            self._enforce_budget(keep=slug)
+        return ctx.index
+
+    def loaded(self) -> List[ProjectContext]:
+        return list(self._projects.values())
+
+    def restore(self, ctx: ProjectContext) -> bool:
+        """Adopt a project loaded elsewhere (a startup snapshot); False if it is already loaded"""
+        if ctx.slug in self._projects:
+            return False
+        self._projects[ctx.slug] = ctx
+        self._enforce_budget(keep=ctx.slug)
+        return True
+
+    # ---- loading ------------------------------------------------------
+
+    async def _current_version(self, slug: str) -> int:
+        return await self.storage.graph_version(slug)
+
+    async def _load_project(self, slug: str) -> ProjectContext:
+        row = await self.storage.load_project(slug)
+        if row is None:
+            raise ProjectNotFound(slug)
+
+        try:
+            version = await self._current_version(slug)
+        except Exception as e:
+            # Serve from the database while Redis is down; the version check reloads once it's back
+            logger.warning(f"Graph version unavailable for '{slug}': {e}")
+            version = 0
+
+        return ProjectContext(
+            project_id=row.project_id,
+            slug=row.project_slug,
+            name=row.project_name,
+            config=dict(row.config),
+            graph_version=version
+        )
+
+    async def _load_graph(self, ctx: ProjectContext) -> GraphSnapshot:
+        started = time.perf_counter()
+        node_rows, edge_rows = await self.storage.load_graph(ctx.project_id)
+
+        graph = GraphSnapshot(
+            nodes=[
+                NodeSnapshot(
+                    node_id=r.node_id,
+                    title=r.title,
+                    description=r.description,
+                    parent_node_id=r.parent_node_id,
+                    required_ec=r.required_ec or 0,
+                    is_checkpoint=bool(r.is_checkpoint),
+                    is_root=bool(r.is_root)
+                )
+                for r in node_rows
+            ],
+            edges=[
+                EdgeSnapshot(
+                    edge_id=r.edge_id,
+                    from_node_id=r.from_node_id,
+                    to_node_id=r.to_node_id,
+                    choice_text=r.choice_text,
+                    choice_order=r.choice_order or 0,
+                    condition_json=r.condition_json,
+                    ec_gain=r.ec_gain or 0,
+                    cooldown_seconds=r.cooldown_seconds or 0
+                )
+                for r in edge_rows
+            ],
+            version=ctx.graph_version
+        )
+        logger.info(
+            f"Loaded graph for '{ctx.slug}' v{ctx.graph_version}: {len(graph.nodes)} nodes, "
+            f"{len(graph.edges)} edges in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return graph
+
+    async def _load_badges(self, ctx: ProjectContext) -> BadgeCatalogue:
+        rows = await self.storage.load_badges(ctx.project_id)
+        return BadgeCatalogue([
+            BadgeSnapshot(
+                badge_id=r.badge_id,
+                slug=r.slug,
+                name=r.name,
+                emoji=r.emoji,
+                description=r.description,
+                role_id=r.role_id,
+                required_nodes=tuple(r.required_nodes or ()),
+                required_ec=r.required_ec or 0
+            )
+            for r in rows
+        ])
+
+    # ---- freshness & eviction ------------------------------------------
+
+    async def _check_version(self, ctx: ProjectContext):
+        now = time.monotonic()
+        if now - ctx.checked_at < self.version_check_seconds:
+            return
+        ctx.checked_at = now
+        try:
+            version = await self._current_version(ctx.slug)
+        except Exception as e:
+            logger.warning(f"Graph version check failed for '{ctx.slug}': {e}")
+            return
+        if version != ctx.graph_version:
+            self.invalidate(ctx.slug)
+
+    def invalidate(self, slug: str):
+        """Forget a project so its config and content reload on next use"""
+        if self._projects.pop(slug, None) is not None:
+            logger.info(f"Project '{slug}' invalidated")
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        now = time.monotonic()
+        # Idle projects are forgotten entirely; their metadata reloads with one query
+        idle = [
+            slug for slug, ctx in self._projects.items()
+            if slug != keep and now - ctx.last_used > self.idle_seconds
+        ]
+        for slug in idle:
+            del self._projects[slug]
+
+        total = sum(ctx.cost for ctx in self._projects.values())
+        # OrderedDict is kept in LRU order by get()
+        for ctx in list(self._projects.values()):
+            if total <= self.max_objects:
+                break
+            if ctx.slug == keep or not ctx.cost:
+                continue
+            total -= ctx.cost
+            ctx.drop_content()
+            logger.info(f"Evicted content for idle project '{ctx.slug}'")
+
+    # ---- change notification -----------------------------------------
+
+    async def publish_change(self, slug: str) -> int:
+        """Bump a project's graph version and notify every bot process"""
+        version = await self.storage.bump_graph_version(slug)
+        self.invalidate(slug)
+        return version
+
+    def start(self):
+        """Subscribe to change notifications for immediate refresh"""
+        if self._listener is None and self.redis is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(CHANGE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Polling in _check_version still catches changes while we reconnect
+                logger.warning(f"Project change listener error: {e}")
+            finally:
+                # Each attempt subscribes on a fresh connection; give the old one back
+                await pubsub.aclose()
+            await asyncio.sleep(5)
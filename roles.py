@@ -0,0 +1,251 @@
+# ========================================
+# ACA Bot Badge Role Grants
+# Persistent, rate-limited Discord role assignment
+# ========================================
+"""
+Badges with a ``role_id`` grant that Discord role, off the traversal path.
+
+Awards are recorded in Redis by ``RoleGrantQueue.enqueue`` in one pipelined
+call:
+
+    aca:roles:pending:<guild>:<user>   hash  r:<role_id> -> 1, attempts -> n
+    aca:roles:due:<guild>              zset  user_id scored by next attempt time
+    aca:roles:guilds                   set   guilds with pending grants
+
+Every role a member earns before the worker reaches them lands in the same
+hash, so several badges become a single member edit. ``RoleGrantWorker``
+drains the guilds this process is connected to, one task per guild. Each
+task is paced by a per-guild bucket (the member-edit route is bucketed per
+guild) and a process-wide bucket kept under Discord's global limit. A
+failed edit is rescheduled with exponential backoff; the pending hash is
+deleted only after the edit succeeds, so a restart resumes where it left off.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import discord
+import redis.asyncio as redis
+
+from .config import settings
+from .metrics import metrics
+from .ratelimit import TokenBucket
+from .registry import ProjectRegistry
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "aca:roles:pending:{guild_id}:{user_id}"
+DUE_KEY = "aca:roles:due:{guild_id}"
+GUILDS_KEY = "aca:roles:guilds"
+ROLE_FIELD = "r:"
+
+# Drop the applied fields, then keep the member scheduled only if roles were
+# queued meanwhile. One script, so an enqueue can't land between the HLEN and
+# the ZREM and be unscheduled with its roles still pending.
+# KEYS: pending hash, due zset; ARGV: user id, now, applied fields...
+_FINISH_SCRIPT = """
+if #ARGV > 2 then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, 3))
+end
+if redis.call('HLEN', KEYS[1]) > 0 then
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+    return 1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 0
+"""
+
+ROLE_GRANTS = metrics.counter("aca_role_grants_total", "Badge role member edits by outcome", ("result",))
+_GRANTED = ROLE_GRANTS.labels("granted")
+_RETRIED = ROLE_GRANTS.labels("retried")
+_DROPPED = ROLE_GRANTS.labels("dropped")
+ROLES_COALESCED = metrics.counter("aca_role_grants_coalesced_total", "Roles applied by the same member edit beyond the first")
+
+
+class RoleGrantQueue:
+    """Producer side: persist pending role grants"""
+
+    def __init__(self, redis_client: redis.Redis, registry: ProjectRegistry):
+        self.redis = redis_client
+        self.registry = registry
+        self.wakeup = asyncio.Event()
+
+    async def badges_awarded(self, guild_id: int, project_slug: str, awards: Sequence[Tuple[int, Sequence[int]]]):
+        """Engine badge listener: queue the roles of newly awarded badges"""
+        catalogue = await self.registry.get_badges(project_slug)
+        grants = []
+        for user_id, badge_ids in awards:
+            role_ids = [
+                catalogue.by_id[badge_id].role_id for badge_id in badge_ids
+                if badge_id in catalogue.by_id and catalogue.by_id[badge_id].role_id
+            ]
+            if role_ids:
+                grants.append((user_id, role_ids))
+        if grants:
+            await self.enqueue(guild_id, grants)
+
+    async def enqueue(self, guild_id: int, grants: Iterable[Tuple[int, Sequence[int]]]):
+        """Record ``(user_id, role_ids)`` pairs for one guild in a single round trip"""
+        pipe = self.redis.pipeline(transaction=False)
+        now = time.time()
+        queued = 0
+        for user_id, role_ids in grants:
+            if not role_ids:
+                continue
+            pipe.hset(
+                PENDING_KEY.format(guild_id=guild_id, user_id=user_id),
+                mapping={f"{ROLE_FIELD}{role_id}": 1 for role_id in role_ids}
+            )
+            # NX keeps an existing (possibly backed-off) schedule
+            pipe.zadd(DUE_KEY.format(guild_id=guild_id), {user_id: now}, nx=True)
+            queued += 1
+        if not queued:
+            return
+        pipe.sadd(GUILDS_KEY, guild_id)
+        try:
+            await pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            # The badge itself is committed; only the cosmetic role is lost
+            logger.error(f"Could not queue badge roles for guild {guild_id}: {e}")
+            return
+        self.wakeup.set()
+
+
+class RoleGrantWorker:
+    """Consumer side: apply pending grants for the guilds this process serves"""
+
+    def __init__(
+        self,
+        bot: discord.Client,
+        queue: RoleGrantQueue,
+        poll_seconds: float = settings.ROLE_GRANT_POLL_SECONDS,
+        batch_size: int = 50
+    ):
+        self.bot = bot
+        self.queue = queue
+        self.redis = queue.redis
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.global_bucket = TokenBucket(settings.ROLE_GRANT_GLOBAL_RATE, settings.ROLE_GRANT_GLOBAL_RATE)
+        self._guild_buckets: Dict[int, TokenBucket] = {}
+        self._draining: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._finish_script = self.redis.register_script(_FINISH_SCRIPT)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._draining.values()):
+            task.cancel()
+        self._draining.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._dispatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Role grant dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self.queue.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.queue.wakeup.clear()
+
+    async def _dispatch(self):
+        guild_ids = await self.redis.smembers(GUILDS_KEY)
+        for raw in guild_ids:
+            guild = self.bot.get_guild(int(raw))
+            # Guilds on other shards belong to another process
+            if guild is None or guild.id in self._draining:
+                continue
+            task = self._draining[guild.id] = asyncio.create_task(self._drain(guild))
+            task.add_done_callback(lambda _, gid=guild.id: self._draining.pop(gid, None))
+
+    def _bucket(self, guild_id: int) -> TokenBucket:
+        bucket = self._guild_buckets.get(guild_id)
+        if bucket is None:
+            rate = settings.ROLE_GRANT_GUILD_RATE
+            bucket = self._guild_buckets[guild_id] = TokenBucket(rate, max(rate * 5, 1))
+        return bucket
+
+    async def _drain(self, guild: discord.Guild):
+        due_key = DUE_KEY.format(guild_id=guild.id)
+        while True:
+            user_ids = await self.redis.zrangebyscore(due_key, "-inf", time.time(), start=0, num=self.batch_size)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                await self._bucket(guild.id).acquire()
+                await self.global_bucket.acquire()
+                await self._grant(guild, int(user_id))
+
+        # Forget the guild once nothing is pending; re-check so a concurrent enqueue isn't stranded
+        if not await self.redis.zcard(due_key):
+            await self.redis.srem(GUILDS_KEY, guild.id)
+            if await self.redis.zcard(due_key):
+                await self.redis.sadd(GUILDS_KEY, guild.id)
+
+    async def _grant(self, guild: discord.Guild, user_id: int):
+        pending_key = PENDING_KEY.format(guild_id=guild.id, user_id=user_id)
+        due_key = DUE_KEY.format(guild_id=guild.id)
+        fields = await self.redis.hgetall(pending_key)
+        role_ids = {int(k[len(ROLE_FIELD):]) for k in fields if k.startswith(ROLE_FIELD)}
+        attempts = int(fields.get("attempts", 0))
+
+        member = guild.get_member(user_id)
+        roles = [r for r in (guild.get_role(rid) for rid in role_ids) if r is not None]
+        missing = [r for r in roles if member is not None and r not in member.roles]
+        if member is None or not missing:
+            # Left the guild, roles deleted, or already granted
+            await self._finish(pending_key, due_key, user_id, fields)
+            return
+
+        try:
+            # One PATCH for every role earned so far (add_roles(atomic=True) would be one call per role)
+            await member.edit(roles=member.roles[1:] + missing, reason="ACA badge earned")
+        except discord.Forbidden as e:
+            logger.warning(f"Cannot grant roles {[r.id for r in missing]} in guild {guild.id}: {e}")
+            _DROPPED.inc()
+            await self._finish(pending_key, due_key, user_id, fields)
+            return
+        except discord.NotFound:
+            await self._finish(pending_key, due_key, user_id, fields)
+            return
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self._bucket(guild.id).pause(settings.ROLE_GRANT_BACKOFF_SECONDS)
+            await self._retry(pending_key, due_key, user_id, attempts, e)
+            return
+
+        _GRANTED.inc()
+        ROLES_COALESCED.inc(len(missing) - 1)
+        await self._finish(pending_key, due_key, user_id, fields)
+
+    async def _finish(self, pending_key: str, due_key: str, user_id: int, seen: dict):
+        # Only drop the fields we saw; roles queued meanwhile keep the member scheduled
+        await self._finish_script(keys=[pending_key, due_key], args=[user_id, time.time(), *seen])
+
+    async def _retry(self, pending_key: str, due_key: str, user_id: int, attempts: int, error: Exception):
+        attempts += 1
+        if attempts > settings.ROLE_GRANT_MAX_ATTEMPTS:
+            logger.error(f"Giving up on roles for {user_id} after {attempts - 1} attempts: {error}")
+            _DROPPED.inc()
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(pending_key)
+            pipe.zrem(due_key, user_id)
+            await pipe.execute()
+            return
+        delay = min(settings.ROLE_GRANT_BACKOFF_SECONDS * 2 ** (attempts - 1), 600)
+        _RETRIED.inc()
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(pending_key, "attempts", attempts)
+        pipe.zadd(due_key, {user_id: time.time() + delay})
+        await pipe.execute()
@@ -29,7 +29,7 @@ CREATE TABLE projects (
 
 -- Seed Arcium core project
 INSERT INTO projects (project_slug, project_name, encryption_key_id, config) VALUES 
-('arcium', 'ACA Arcium Academy', 'aca-master-key-v1', '{"colors": {"primary": "#e94560"}, "ec_thresholds": {"graduate": 1000}}');
+('arcium', 'ACA Arcium Academy', 'aca-master-key-v1', '{"colors": {"primary": "#e94560"}, "ec_thresholds": {"graduate": 1000}, "root_nodes": {"explorer": 1, "builder": 101, "guardian": 201}, "entry_edges": {"explorer": 1, "builder": 101, "guardian": 201}}');
 
 -- Users table
 CREATE TABLE users (
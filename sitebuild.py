@@ -0,0 +1,498 @@
+# ========================================
+# ACA Site Build
+# Minify, fingerprint & precompress the static pages
+# ========================================
+"""
+Build the marketing/learning pages into a deployable directory.
+
+    python -m bot.core.sitebuild [--out dist] [--force]
+
+For ``index.html``, ``learning.html``, ``community.html`` and
+``ecosystem.html`` (plus ``main.js``, the ``*.svg`` diagrams and the images
+the pages reference as ``resources/<file>``):
+
+- HTML, inline ``<style>``/``<script>``, JS and SVG are minified. JS is
+  only stripped of comments and redundant whitespace (line breaks are kept,
+  so automatic semicolon insertion is unaffected).
+- The CSS rules every page starts with are moved to one shared, cacheable
+  ``site.<hash>.css``. Only the common leading rules are moved, so the
+  cascade order of each page is unchanged.
+- Static assets are fingerprinted into ``assets/<name>.<hash><ext>`` and
+  references in HTML, CSS and JS string literals are rewritten. Images are
+  also kept under ``resources/`` for URLs built at runtime in ``main.js``.
+- Text outputs get a ``.gz`` sibling (for ``gzip_static``/pre-compressed
+  hosting). ``_headers`` and ``nginx-cache.conf`` mark fingerprinted assets
+  immutable and HTML as revalidate-always. ``asset-manifest.json`` maps
+  source names to fingerprinted URLs.
+
+Rebuilds are incremental: sources whose mtime and size are unchanged aren't
+re-read, unchanged outputs aren't rewritten, and outputs no longer produced
+are removed. A per-page transfer-size report (HTML + local JS/CSS, raw vs
+gzip) is printed at the end.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGES = ("index.html", "learning.html", "community.html", "ecosystem.html")
+SCRIPTS = ("main.js",)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+COMPRESSIBLE = (".html", ".js", ".css", ".svg", ".json")
+STATE_FILE = ".build-state.json"
+# Bump when the transforms change so every output is regenerated
+BUILD_VERSION = 1
+
+HEADERS = """/assets/*
+  Cache-Control: public, max-age=31536000, immutable
+/resources/*
+  Cache-Control: public, max-age=86400
+/*.html
+  Cache-Control: no-cache
+/
+  Cache-Control: no-cache
+"""
+
+NGINX_CONF = """# include inside the server block serving the build directory
+gzip_static on;
+location /assets/ {
+    add_header Cache-Control "public, max-age=31536000, immutable";
+}
+location /resources/ {
+    add_header Cache-Control "public, max-age=86400";
+}
+location ~ \\.html$ {
+    add_header Cache-Control "no-cache";
+}
+"""
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+# ---- minifiers ---------------------------------------------------------
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_AROUND = re.compile(r"\s*([{};,>])\s*")
+_CSS_SPACE_AFTER_COLON = re.compile(r":\s+")
+
+
+def minify_css(css: str) -> str:
+    css = _CSS_COMMENT.sub("", css)
+    css = re.sub(r"\s+", " ", css)
+    # Spaces before ':' are kept: "a :hover" and "a:hover" differ
+    css = _CSS_SPACE_AROUND.sub(r"\1", css)
+    css = _CSS_SPACE_AFTER_COLON.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+def css_rules(css: str) -> List[str]:
+    """Top-level rules (including whole @media blocks) of minified CSS"""
+    rules, depth, start = [], 0, 0
+    for i, ch in enumerate(css):
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                rules.append(css[start:i + 1])
+                start = i + 1
+    tail = css[start:].strip()
+    if tail:
+        rules.append(tail)
+    return rules
+
+
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+                   "void", "throw", "instanceof", "yield", "await"}
+_WORD = re.compile(r"[A-Za-z0-9_$]")
+
+
+def _skip_string(src: str, i: int) -> int:
+    """Index just past the string/template literal starting at ``i``"""
+    quote = src[i]
+    i += 1
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == quote:
+            return i + 1
+        if quote == "`" and src.startswith("${", i):
+            depth = 1
+            i += 2
+            while i < len(src) and depth:
+                ch = src[i]
+                if ch in "'\"`":
+                    i = _skip_string(src, i)
+                    continue
+                depth += ch == "{"
+                depth -= ch == "}"
+                i += 1
+            continue
+        if ch == "\n" and quote != "`":
+            return i
+        i += 1
+    return i
+
+
+def _skip_regex(src: str, i: int) -> int:
+    i += 1
+    in_class = False
+    while i < len(src):
+        ch = src[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "\n":
+            return i
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            i += 1
+            while i < len(src) and _WORD.match(src[i]):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def _skip_gap(src: str, i: int) -> Tuple[int, bool]:
+    """Skip whitespace and comments from ``i``; returns the end and whether a line break was crossed"""
+    newline = False
+    n = len(src)
+    while i < n:
+        if src[i].isspace():
+            newline = newline or src[i] == "\n"
+            i += 1
+        elif src.startswith("//", i):
+            while i < n and src[i] != "\n":
+                i += 1
+        elif src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            newline = newline or "\n" in src[i:end]
+            i = end
+        else:
+            break
+    return i, newline
+
+
+def minify_js(src: str) -> str:
+    """Drop comments and redundant whitespace, keeping line breaks"""
+    out: List[str] = []
+    last = ""        # last significant character emitted
+    last_word = ""   # identifier/keyword ending at ``last``
+    i, n = 0, len(src)
+    while i < n:
+        ch = src[i]
+        if ch.isspace() or src.startswith("//", i) or src.startswith("/*", i):
+            i, newline = _skip_gap(src, i)
+            prev = out[-1][-1] if out else ""
+            nxt = src[i] if i < n else ""
+            if not prev or not nxt:
+                continue
+            if newline:
+                out.append("\n")
+            elif (_WORD.match(prev) and _WORD.match(nxt)) or (prev == nxt and prev in "+-"):
+                out.append(" ")
+        elif ch in "'\"`":
+            end = _skip_string(src, i)
+            out.append(src[i:end])
+            last, last_word, i = src[end - 1], "", end
+        elif ch == "/" and (not last or last in _REGEX_PRECEDERS or last_word in _REGEX_KEYWORDS):
+            end = _skip_regex(src, i)
+            out.append(src[i:end])
+            last, last_word, i = "/", "", end
+        else:
+            if _WORD.match(ch):
+                prev = out[-1][-1] if out else ""
+                last_word = last_word + ch if prev and _WORD.match(prev) else ch
+            else:
+                last_word = ""
+            out.append(ch)
+            last = ch
+            i += 1
+    return "".join(out)
+
+
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_HTML_RAW = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+_BLOCK_TAGS = (
+    "html|head|body|meta|link|title|script|style|div|section|nav|header|footer|main|article|aside|"
+    "ul|ol|li|h[1-6]|p|table|thead|tbody|tr|td|th|form|canvas|svg|br|hr|!DOCTYPE"
+)
+_AROUND_BLOCK = re.compile(r"\s*(</?(?:%s)\b[^>]*>)\s*" % _BLOCK_TAGS, re.I)
+_JS_TYPE = re.compile(r"""type\s*=\s*["']?(?!(?:text|application)/(?:javascript|ecmascript)|module)""", re.I)
+
+
+def minify_html(html: str) -> str:
+    parts: List[str] = []
+    pos = 0
+    for match in _HTML_RAW.finditer(html):
+        parts.append(_minify_markup(html[pos:match.start()]))
+        open_tag, tag, body, close_tag = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        if tag == "style":
+            body = minify_css(body)
+        elif tag == "script" and body.strip() and not _JS_TYPE.search(open_tag):
+            body = minify_js(body)
+        parts.append(re.sub(r"\s+", " ", open_tag) + body + close_tag)
+        pos = match.end()
+    parts.append(_minify_markup(html[pos:]))
+    return "".join(parts).strip()
+
+
+def _minify_markup(markup: str) -> str:
+    markup = _HTML_COMMENT.sub("", markup)
+    markup = re.sub(r"\s+", " ", markup)
+    return _AROUND_BLOCK.sub(r"\1", markup)
+
+
+def minify_svg(svg: str) -> str:
+    svg = _HTML_COMMENT.sub("", svg)
+    svg = re.sub(r"<style([^>]*)>(.*?)</style>", lambda m: f"<style{m.group(1)}>{minify_css(m.group(2))}</style>", svg, flags=re.S)
+    svg = re.sub(r">\s+<", "><", svg)
+    svg = re.sub(r"\s+", " ", svg)
+    return svg.replace(" />", "/>").strip()
+
+
+# ---- build -------------------------------------------------------------
+
+class SiteBuilder:
+    """Incremental build from ``src`` into ``out``"""
+
+    def __init__(self, src: str, out: str, force: bool = False):
+        self.src = src
+        self.out = out
+        self.state = {} if force else self._load_state()
+        if self.state.get("version") != BUILD_VERSION:
+            self.state = {}
+        self.sources: Dict[str, list] = self.state.get("sources", {})
+        self.previous_outputs: Dict[str, str] = self.state.get("outputs", {})
+        self.outputs: Dict[str, str] = {}
+        self.written = 0
+        self.skipped = 0
+        # reference (as written in pages) -> URL in the build
+        self.urls: Dict[str, str] = {}
+
+    def _load_state(self) -> dict:
+        try:
+            with open(os.path.join(self.out, STATE_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_text(self, name: str) -> str:
+        with open(os.path.join(self.src, name), encoding="utf-8") as f:
+            return f.read()
+
+    def _source_digest(self, name: str) -> str:
+        """Content fingerprint of a source, re-hashed only when mtime/size changed"""
+        stat = os.stat(os.path.join(self.src, name))
+        known = self.sources.get(name)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        with open(os.path.join(self.src, name), "rb") as f:
+            digest = fingerprint(f.read())
+        self.sources[name] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def _emit(self, rel: str, data: bytes) -> int:
+        """Write an output (and its .gz) unless an identical one is already there; returns gzip size"""
+        digest = fingerprint(data)
+        path = os.path.join(self.out, rel)
+        compress = rel.endswith(COMPRESSIBLE)
+        self.outputs[rel] = digest
+        if compress:
+            self.outputs[rel + ".gz"] = digest
+        if self.previous_outputs.get(rel) == digest and os.path.exists(path) \
+                and (not compress or os.path.exists(path + ".gz")):
+            self.skipped += 1
+            return os.path.getsize(path + ".gz") if compress else len(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.written += 1
+        if not compress:
+            return len(data)
+        packed = gzip.compress(data, 9, mtime=0)
+        with open(path + ".gz", "wb") as f:
+            f.write(packed)
+        return len(packed)
+
+    def _copy(self, name: str, rel: str, digest: str):
+        """Copy a binary source (hard link when possible) unless already current"""
+        path = os.path.join(self.out, rel)
+        self.outputs[rel] = digest
+        if self.previous_outputs.get(rel) == digest and os.path.exists(path):
+            self.skipped += 1
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        try:
+            os.link(os.path.join(self.src, name), path)
+        except OSError:
+            shutil.copyfile(os.path.join(self.src, name), path)
+        self.written += 1
+
+    def _rewrite(self, text: str) -> str:
+        """Point quoted/url() references at fingerprinted URLs"""
+        if not self.urls:
+            return text
+        pattern = re.compile(
+            r"""(["'(])(%s)(?=["')])""" % "|".join(re.escape(k) for k in sorted(self.urls, key=len, reverse=True))
+        )
+        return pattern.sub(lambda m: m.group(1) + self.urls[m.group(2)], text)
+
+    def build(self) -> List[Tuple[str, int, int]]:
+        os.makedirs(self.out, exist_ok=True)
+        names = sorted(os.listdir(self.src))
+
+        # Images: fingerprinted copy, plus a stable path for runtime-built URLs
+        for name in names:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                digest = self._source_digest(name)
+                url = f"assets/{hashed_name(name, digest)}"
+                self._copy(name, url, digest)
+                self._copy(name, f"resources/{name}", digest)
+                self.urls[f"resources/{name}"] = url
+                self.urls[name] = url
+
+        for name in names:
+            if name.endswith(".svg"):
+                data = minify_svg(self._read_text(name)).encode()
+                url = f"assets/{hashed_name(name, fingerprint(data))}"
+                self._emit(url, data)
+                self.urls[f"resources/{name}"] = url
+                self.urls[name] = url
+
+        # Raw and built sizes of local text assets, for the page report
+        asset_sizes: Dict[str, Tuple[int, int]] = {}
+        for name in SCRIPTS:
+            source = self._read_text(name)
+            data = self._rewrite(minify_js(source)).encode()
+            url = f"assets/{hashed_name(name, fingerprint(data))}"
+            asset_sizes[url] = (len(source.encode()), self._emit(url, data))
+            self.urls[name] = url
+
+        sources = {name: self._read_text(name) for name in PAGES if os.path.exists(os.path.join(self.src, name))}
+        pages, shared_url = self._extract_shared_css(sources, asset_sizes)
+
+        report = []
+        for name, html in pages.items():
+            text = self._rewrite(minify_html(html))
+            raw = len(sources[name].encode())
+            built = self._emit(name, text.encode())
+            # Local JS/CSS the built page loads
+            for url, (asset_raw, asset_built) in asset_sizes.items():
+                if url in text:
+                    raw += asset_raw
+                    built += asset_built
+            report.append((name, raw, built))
+
+        manifest = {k: v for k, v in sorted(self.urls.items()) if not k.startswith("resources/")}
+        self._emit("asset-manifest.json", json.dumps(manifest, indent=2).encode())
+        self._emit("_headers", HEADERS.encode())
+        self._emit("nginx-cache.conf", NGINX_CONF.encode())
+        self._prune()
+        self._save_state()
+        return report
+
+    def _extract_shared_css(
+        self, sources: Dict[str, str], asset_sizes: Dict[str, Tuple[int, int]]
+    ) -> Tuple[Dict[str, str], Optional[str]]:
+        """Move the leading CSS rules common to every page into one stylesheet"""
+        style = re.compile(r"<style>(.*?)</style>", re.S)
+        rules = {}
+        for name, html in sources.items():
+            match = style.search(html)
+            if match is None:
+                return dict(sources), None
+            rules[name] = css_rules(minify_css(match.group(1)))
+
+        shared: List[str] = []
+        for column in zip(*rules.values()):
+            if len(set(column)) != 1:
+                break
+            shared.append(column[0])
+        if len(sources) < 2 or not shared:
+            return dict(sources), None
+
+        # The stylesheet lives in assets/, so its relative URLs move up a level
+        css = self._rewrite("".join(shared))
+        css = re.sub(r"""url\((['"]?)(?!assets/|[a-z]+:|/|#)""", r"url(\1../", css)
+        css = re.sub(r"""url\((['"]?)assets/""", r"url(\1", css)
+        data = css.encode()
+        url = f"assets/{hashed_name('site.css', fingerprint(data))}"
+        # Was inline before, so it adds nothing to the page's raw size
+        asset_sizes[url] = (0, self._emit(url, data))
+        logger.info(f"Shared {len(shared)} leading CSS rules ({len(data)} bytes) across {len(sources)} pages")
+
+        pages = {}
+        for name, html in sources.items():
+            own = "".join(rules[name][len(shared):])
+            replacement = f'<link rel="stylesheet" href="{url}">' + (f"<style>{own}</style>" if own else "")
+            pages[name] = style.sub(lambda _: replacement, html, count=1)
+        return pages, url
+
+    def _prune(self):
+        for rel in set(self.previous_outputs) - set(self.outputs):
+            try:
+                os.remove(os.path.join(self.out, rel))
+            except FileNotFoundError:
+                pass
+
+    def _save_state(self):
+        with open(os.path.join(self.out, STATE_FILE), "w") as f:
+            json.dump({"version": BUILD_VERSION, "sources": self.sources, "outputs": self.outputs}, f)
+
+
+def print_report(report: List[Tuple[str, int, int]]):
+    print(f"{'page':<20}{'before':>12}{'after (gz)':>12}{'saved':>9}")
+    for name, before, after in report:
+        saved = 1 - after / before if before else 0.0
+        print(f"{name:<20}{before / 1024:>10.1f}KB{after / 1024:>10.1f}KB{saved:>9.0%}")
+    print("(HTML plus local JS/CSS per page; images are unchanged and not counted)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the static site")
+    parser.add_argument("--src", default=os.path.dirname(os.path.abspath(__file__)), help="directory with the pages")
+    parser.add_argument("--out", default="dist", help="build directory")
+    parser.add_argument("--force", action="store_true", help="ignore the previous build state")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    started = time.perf_counter()
+    builder = SiteBuilder(args.src, args.out, args.force)
+    report = builder.build()
+    logger.info(
+        f"Built {args.out} in {time.perf_counter() - started:.2f}s: "
+        f"{builder.written} written, {builder.skipped} unchanged"
+    )
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# ========================================
+# ACA Bot Cache Snapshot
+# In-process caches carried across restarts
+# ========================================
+"""
+Dump the caches a process built up on shutdown and load them on the next
+start, so a restart doesn't begin cold.
+
+A snapshot holds:
+
+- every loaded project: config, graph snapshot, badge catalogue and graph
+  index, tagged with the graph version it was built from;
+- the Redis gateway's outage changes (state caches, leaderboard pages and
+  claims written to the local store while Redis was down and not yet
+  reconciled). While Redis is healthy those entries live in Redis and
+  survive the restart on their own.
+
+File layout (little endian), designed to be ``mmap``-ed:
+
+    magic "ACASNAP\\0" | u16 format | u16 reserved | u32 manifest length
+    manifest (JSON: created_at, sections with kind/slug/version/code/offset/length)
+    section payloads (pickle protocol 5), back to back
+    HMAC-SHA256 of everything above (32 bytes)
+
+Loading maps the file, verifies the tag over the mapping, then unpickles
+each section straight from a slice of it. A project section is skipped
+unless its graph version still equals the one in storage and its code
+fingerprint (a hash of the modules defining the pickled classes) matches
+the running code, so a deploy never unpickles old layouts into new classes.
+The HMAC key is derived from the master encryption key, so only a process holding it can
+produce a snapshot the bot will unpickle; without a key, snapshots are
+disabled. A loaded snapshot is deleted so it is never applied twice.
+"""
+import asyncio
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .encryption import encryption
+from .metrics import metrics
+from .redis_gateway import RedisGateway
+from .registry import ProjectContext, ProjectRegistry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ACASNAP\0"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHHI")
+_TAG_SIZE = hashlib.sha256().digest_size
+
+PROJECT, CACHE = "project", "cache"
+
+# Modules defining (or shaping) the objects pickled into project sections
+_PICKLED_MODULES = ("graph_index.py", "registry.py", "storage.py")
+
+SNAPSHOT_SECONDS = metrics.gauge("aca_snapshot_seconds", "Duration of the last snapshot dump/load", ("action",))
+SNAPSHOT_BYTES = metrics.gauge("aca_snapshot_bytes", "Size of the last snapshot written or read")
+
+
+class SnapshotError(Exception):
+    """The snapshot file is unusable (corrupt, foreign, too old or another format)"""
+
+
+@dataclass
+class SnapshotReport:
+    size: int
+    seconds: float
+    projects: int = 0
+    stale_projects: int = 0
+    cache_entries: int = 0
+
+
+def _key() -> Optional[bytes]:
+    return encryption.derive_key("cache-snapshot")
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint() -> str:
+    """Hash of the source of the pickled classes; a deploy that changes them changes it"""
+    digest = hashlib.sha256()
+    for name in _PICKLED_MODULES:
+        with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _encode(sections: List[Tuple[dict, bytes]], key: bytes) -> bytes:
+    manifest = {"created_at": time.time(), "sections": []}
+    offset = 0
+    for meta, payload in sections:
+        manifest["sections"].append(dict(meta, offset=offset, length=len(payload)))
+        offset += len(payload)
+    encoded = json.dumps(manifest).encode()
+    body = b"".join([_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(encoded)), encoded] + [p for _, p in sections])
+    return body + hmac.new(key, body, hashlib.sha256).digest()
+
+
+def _write(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers only ever see a complete file
+    os.replace(tmp, path)
+
+
+async def dump(path: str, registry: ProjectRegistry, gateway: RedisGateway) -> Optional[SnapshotReport]:
+    """Write the registry's loaded projects and the gateway's outage changes to ``path``"""
+    key = _key()
+    if key is None:
+        logger.info("No master key configured, skipping cache snapshot")
+        return None
+    started = time.perf_counter()
+    report = SnapshotReport(size=0, seconds=0.0)
+    contexts = [ctx for ctx in registry.loaded() if ctx.graph is not None]
+    entries, touched = gateway.local.export_changes()
+
+    def build() -> bytes:
+        sections = []
+        for ctx in contexts:
+            # Pickled together so the index keeps sharing the graph's edge objects
+            payload = pickle.dumps(
+                (ctx.project_id, ctx.name, ctx.config, ctx.graph, ctx.badges, ctx.index),
+                protocol=5
+            )
+            sections.append(({
+                "kind": PROJECT, "slug": ctx.slug, "graph_version": ctx.graph_version, "code": code_fingerprint()
+            }, payload))
+        if touched:
+            sections.append(({"kind": CACHE}, pickle.dumps((entries, touched), protocol=5)))
+        data = _encode(sections, key)
+        _write(path, data)
+        return data
+
+    data = await asyncio.to_thread(build)
+    report.size = len(data)
+    report.projects = len(contexts)
+    report.cache_entries = len(entries)
+    report.seconds = time.perf_counter() - started
+    SNAPSHOT_SECONDS.labels("dump").set(report.seconds)
+    SNAPSHOT_BYTES.set(report.size)
+    return report
+
+
+def _verified_manifest(view: memoryview, key: bytes) -> Tuple[dict, int]:
+    """(manifest, offset of the first section) after checking header and tag"""
+    if len(view) < _HEADER.size + _TAG_SIZE:
+        raise SnapshotError("truncated")
+    magic, version, _, manifest_length = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("not a cache snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"format {version}, expected {FORMAT_VERSION}")
+    # Slices are released explicitly: the mapping can't close while one is alive
+    with view[:-_TAG_SIZE] as body:
+        digest = hmac.new(key, body, hashlib.sha256).digest()
+    if not hmac.compare_digest(digest, bytes(view[-_TAG_SIZE:])):
+        raise SnapshotError("authentication failed")
+    start = _HEADER.size + manifest_length
+    return json.loads(bytes(view[_HEADER.size:start])), start
+
+
+async def load(
+    path: str,
+    registry: ProjectRegistry,
+    gateway: RedisGateway,
+    max_age: float
+) -> Optional[SnapshotReport]:
+    """Apply the snapshot at ``path``, if any; projects whose graph changed since are skipped"""
+    key = _key()
+    if key is None or not os.path.exists(path):
+        return None
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                report = await _apply(view, key, registry, gateway, max_age)
+    finally:
+        # Applied or unusable, it must not be applied again
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    report.seconds = time.perf_counter() - started
+    SNAPSHOT_SECONDS.labels("load").set(report.seconds)
+    SNAPSHOT_BYTES.set(report.size)
+    return report
+
+
+async def _apply(
+    view: memoryview,
+    key: bytes,
+    registry: ProjectRegistry,
+    gateway: RedisGateway,
+    max_age: float
+) -> SnapshotReport:
+    manifest, start = _verified_manifest(view, key)
+    age = time.time() - manifest["created_at"]
+    if not 0 <= age <= max_age:
+        raise SnapshotError(f"{age:.0f}s old, limit {max_age:.0f}s")
+    report = SnapshotReport(size=len(view), seconds=0.0)
+
+    def section(meta: dict):
+        offset = start + meta["offset"]
+        with view[offset:offset + meta["length"]] as payload:
+            return pickle.loads(payload)
+
+    projects = [meta for meta in manifest["sections"] if meta["kind"] == PROJECT]
+    # Objects pickled by another version of their classes may only fail at first use
+    foreign = [meta for meta in projects if meta.get("code") != code_fingerprint()]
+    if foreign:
+        logger.info(f"Skipping {len(foreign)} snapshot projects written by different code")
+        report.stale_projects += len(foreign)
+        projects = [meta for meta in projects if meta.get("code") == code_fingerprint()]
+    try:
+        versions = await asyncio.gather(*(registry.storage.graph_version(meta["slug"]) for meta in projects))
+    except Exception as e:
+        # Without current versions nothing can be validated; load everything fresh
+        logger.warning(f"Graph versions unavailable, ignoring snapshot projects: {e}")
+        versions = [None] * len(projects)
+
+    for meta, version in zip(projects, versions):
+        if version != meta["graph_version"]:
+            report.stale_projects += 1
+            continue
+        project_id, name, config, graph, badges, index = section(meta)
+        restored = registry.restore(ProjectContext(
+            project_id=project_id,
+            slug=meta["slug"],
+            name=name,
+            config=config,
+            graph_version=version,
+            graph=graph,
+            badges=badges,
+            index=index
+        ))
+        report.projects += restored
+
+    for meta in manifest["sections"]:
+        if meta["kind"] == CACHE:
+            entries, touched = section(meta)
+            gateway.local.import_changes(entries, touched, elapsed=age)
+            report.cache_entries += len(entries)
+    return report
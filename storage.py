@@ -0,0 +1,526 @@
+# ========================================
+# ACA Bot Storage Backends
+# Repository interface for the engine & registry
+# ========================================
+"""
+Everything the graph engine and project registry persist goes through a
+``StorageBackend``:
+
+- projects, graph content (nodes/edges) and badge catalogues, plus the
+  graph version used to invalidate snapshots;
+- users, read directly or inside a ``UserTransaction`` that locks the row,
+  checks/adds badges and commits;
+- a ``cache`` with the ``RedisGateway`` interface. Cooldowns, idempotency
+  claims and state caches are TTL keys there, so the engine can batch them
+  into one round trip.
+
+``SqlStorage`` is the production implementation (Postgres through
+SQLAlchemy, Redis through the gateway); its per-interaction queries are the
+prebuilt statements of ``statements``. ``MemoryStorage`` keeps everything
+in-process in columnar arrays, so million-user simulations, the benchmark
+(``--backend memory``) and fast checks run without either service.
+
+Every backend call is counted in ``storage.calls`` (and in
+``aca_storage_calls_total``), which makes the storage cost of each engine
+operation visible.
+"""
+import asyncio
+import heapq
+import logging
+import math
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+from uuid import UUID, uuid4
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from .database import get_db_session
+from .metrics import metrics
+from .models import Badge, Edge, Node, Project, User
+from .redis_gateway import LocalGateway, RedisGateway
+from .statements import ADD_BADGE, GET_USER, HELD_BADGES, LOCK_USER, TOP_USERS
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "aca:project:{slug}:graph_version"
+CHANGE_CHANNEL = "aca:project:changed"
+
+STORAGE_CALLS = metrics.counter("aca_storage_calls_total", "Storage backend calls", ("backend", "op"))
+
+
+class ProjectRecord(NamedTuple):
+    project_id: UUID
+    project_slug: str
+    project_name: str
+    config: Dict[str, Any]
+
+
+class UserTransaction(ABC):
+    """Unit of work around one locked user row; changes persist only on ``commit``"""
+
+    def __init__(self, storage: "StorageBackend"):
+        self.storage = storage
+
+    @abstractmethod
+    async def lock_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        """The user row, locked against concurrent traversals until the transaction ends"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def held_badges(self, user: User, badge_ids: Sequence[int]) -> Set[int]:
+        """Which of ``badge_ids`` the user already holds"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_badges(self, user: User, badge_ids: Sequence[int]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def commit(self):
+        raise NotImplementedError
+
+
+class StorageBackend(ABC):
+    """Repository interface the engine and registry depend on"""
+
+    name = "abstract"
+
+    def __init__(self, cache: RedisGateway):
+        self.cache = cache
+        self.calls: Counter = Counter()
+
+    def _count(self, op: str):
+        self.calls[op] += 1
+        STORAGE_CALLS.labels(self.name, op).inc()
+
+    # ---- projects & content --------------------------------------------
+
+    @abstractmethod
+    async def load_project(self, slug: str) -> Optional[ProjectRecord]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def load_graph(self, project_id: UUID) -> Tuple[Sequence[Any], Sequence[Any]]:
+        """(node rows, edge rows) with the attributes of ``NodeSnapshot``/``EdgeSnapshot``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def load_badges(self, project_id: UUID) -> Sequence[Any]:
+        """Badge rows with the attributes of ``BadgeSnapshot``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def graph_version(self, slug: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def bump_graph_version(self, slug: str) -> int:
+        """Increment a project's graph version and notify other processes"""
+        raise NotImplementedError
+
+    # ---- users ---------------------------------------------------------
+
+    @abstractmethod
+    async def get_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_user(self, user: User):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def top_users(self, guild_id: int, limit: int) -> List[Tuple[int, int, Optional[int]]]:
+        """(user_id, ec_total, current_node_id) by EC, highest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def transaction(self) -> "AsyncIterator[UserTransaction]":
+        raise NotImplementedError
+
+
+# ---- Postgres + Redis -------------------------------------------------
+
+
+class SqlTransaction(UserTransaction):
+    def __init__(self, storage: "SqlStorage", session):
+        super().__init__(storage)
+        self.session = session
+
+    async def lock_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        self.storage._count("lock_user")
+        return (await self.session.execute(
+            LOCK_USER, {"user_id": user_id, "guild_id": guild_id, "project_id": project_id}
+        )).scalar_one_or_none()
+
+    async def held_badges(self, user: User, badge_ids: Sequence[int]) -> Set[int]:
+        self.storage._count("held_badges")
+        rows = await self.session.execute(
+            HELD_BADGES, {"user_id": user.user_id, "guild_id": user.guild_id, "badge_ids": list(badge_ids)}
+        )
+        return set(rows.scalars())
+
+    async def add_badges(self, user: User, badge_ids: Sequence[int]):
+        self.storage._count("add_badge")
+        await self.session.execute(ADD_BADGE, [
+            {"user_id": user.user_id, "guild_id": user.guild_id, "project_id": user.project_id, "badge_id": badge_id}
+            for badge_id in badge_ids
+        ])
+
+    async def commit(self):
+        self.storage._count("commit")
+        await self.session.commit()
+
+
+class SqlStorage(StorageBackend):
+    """Postgres through SQLAlchemy, cache and versions in Redis"""
+
+    name = "postgres"
+
+    def __init__(self, redis_client: Union[redis.Redis, RedisGateway]):
+        if not isinstance(redis_client, RedisGateway):
+            redis_client = RedisGateway(redis_client)
+        super().__init__(redis_client)
+
+    async def load_project(self, slug: str) -> Optional[ProjectRecord]:
+        self._count("load_project")
+        async with get_db_session() as session:
+            row = (await session.execute(
+                select(Project.project_id, Project.project_slug, Project.project_name, Project.config)
+                .where(Project.project_slug == slug)
+            )).first()
+        if row is None:
+            return None
+        return ProjectRecord(row.project_id, row.project_slug, row.project_name, dict(row.config or {}))
+
+    async def load_graph(self, project_id: UUID):
+        self._count("load_graph")
+        async with get_db_session() as session:
+            node_rows = (await session.execute(
+                select(
+                    Node.node_id, Node.title, Node.description, Node.parent_node_id,
+                    Node.required_ec, Node.is_checkpoint, Node.is_root
+                ).where(Node.project_id == project_id)
+            )).all()
+            edge_rows = (await session.execute(
+                select(
+                    Edge.edge_id, Edge.from_node_id, Edge.to_node_id, Edge.choice_text,
+                    Edge.choice_order, Edge.condition_json, Edge.ec_gain, Edge.cooldown_seconds
+                ).where(Edge.project_id == project_id)
+            )).all()
+        return node_rows, edge_rows
+
+    async def load_badges(self, project_id: UUID):
+        self._count("load_badges")
+        async with get_db_session() as session:
+            return (await session.execute(
+                select(
+                    Badge.badge_id, Badge.slug, Badge.name, Badge.emoji, Badge.description,
+                    Badge.role_id, Badge.required_nodes, Badge.required_ec
+                ).where(Badge.project_id == project_id)
+            )).all()
+
+    async def graph_version(self, slug: str) -> int:
+        # Raw client: a fallback value of 0 would look like a version change
+        value = await self.cache.client.get(VERSION_KEY.format(slug=slug))
+        return int(value) if value else 0
+
+    async def bump_graph_version(self, slug: str) -> int:
+        version = await self.cache.client.incr(VERSION_KEY.format(slug=slug))
+        await self.cache.client.publish(CHANGE_CHANNEL, slug)
+        return version
+
+    async def get_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        self._count("get_user")
+        async with get_db_session() as session:
+            return (await session.execute(
+                GET_USER, {"user_id": user_id, "guild_id": guild_id, "project_id": project_id}
+            )).scalar_one_or_none()
+
+    async def create_user(self, user: User):
+        self._count("create_user")
+        async with get_db_session() as session:
+            session.add(user)
+            await session.commit()
+
+    async def top_users(self, guild_id: int, limit: int):
+        self._count("top_users")
+        async with get_db_session() as session:
+            rows = (await session.execute(TOP_USERS, {"guild_id": guild_id, "limit": limit})).all()
+        return [(row.user_id, row.ec_total or 0, row.current_node_id) for row in rows]
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with get_db_session() as session:
+            yield SqlTransaction(self, session)
+
+
+# ---- in-memory --------------------------------------------------------
+
+_NO_NODE = -1
+_NO_BADGES: Tuple[int, ...] = ()
+
+
+def _pack(user_id: int, guild_id: int) -> int:
+    # Snowflakes fit in 64 bits; one int key is far smaller than a tuple
+    return (user_id << 64) | guild_id
+
+
+class _UserTable:
+    """Columnar user rows of one project: one slot per (user, guild)"""
+
+    __slots__ = ("slots", "user_ids", "guild_ids", "node", "ec", "mentor", "score",
+                 "payload", "badges", "badge_cache", "by_guild")
+
+    def __init__(self):
+        self.slots: Dict[int, int] = {}
+        self.user_ids = array("Q")
+        self.guild_ids = array("Q")
+        self.node = array("q")
+        self.ec = array("q")
+        self.mentor = bytearray()
+        self.score = array("d")
+        self.payload: List[bytes] = []
+        # Sorted badge id tuples; members without badges share one empty tuple
+        self.badges: List[Tuple[int, ...]] = []
+        # Sparse: hardly any rows carry a badge cache
+        self.badge_cache: Dict[int, Any] = {}
+        self.by_guild: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def find(self, user_id: int, guild_id: int) -> Optional[int]:
+        return self.slots.get(_pack(user_id, guild_id))
+
+    def add(
+        self,
+        user_id: int,
+        guild_id: int,
+        node_id: Optional[int],
+        ec_total: int,
+        payload: bytes,
+        is_mentor: bool = False,
+        mentor_score: Optional[float] = None
+    ) -> int:
+        slot = len(self.user_ids)
+        self.slots[_pack(user_id, guild_id)] = slot
+        self.user_ids.append(user_id)
+        self.guild_ids.append(guild_id)
+        self.node.append(_NO_NODE if node_id is None else node_id)
+        self.ec.append(ec_total)
+        self.mentor.append(1 if is_mentor else 0)
+        self.score.append(math.nan if mentor_score is None else float(mentor_score))
+        self.payload.append(payload)
+        self.badges.append(_NO_BADGES)
+        self.by_guild.setdefault(guild_id, array("L")).append(slot)
+        return slot
+
+    def to_user(self, slot: int, project_id: UUID) -> User:
+        node = self.node[slot]
+        score = self.score[slot]
+        return User(
+            user_id=self.user_ids[slot],
+            guild_id=self.guild_ids[slot],
+            project_id=project_id,
+            current_node_id=None if node == _NO_NODE else node,
+            ec_total=self.ec[slot],
+            badge_cache=self.badge_cache.get(slot),
+            mentor_score=None if math.isnan(score) else score,
+            is_mentor=bool(self.mentor[slot]),
+            encrypted_payload=self.payload[slot]
+        )
+
+    def store(self, slot: int, user: User):
+        self.node[slot] = _NO_NODE if user.current_node_id is None else user.current_node_id
+        self.ec[slot] = user.ec_total or 0
+        self.payload[slot] = user.encrypted_payload
+
+
+class MemoryTransaction(UserTransaction):
+    def __init__(self, storage: "MemoryStorage"):
+        super().__init__(storage)
+        self._locked: List[Tuple[UUID, int]] = []
+        self._users: List[Tuple[_UserTable, int, User]] = []
+        self._badges: List[Tuple[_UserTable, int, Sequence[int]]] = []
+
+    async def lock_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        self.storage._count("lock_user")
+        table = self.storage._users.get(project_id)
+        slot = table.find(user_id, guild_id) if table is not None else None
+        if slot is None:
+            return None
+        key = (project_id, slot)
+        await self.storage._acquire(key)
+        self._locked.append(key)
+        # A detached copy: discarding it is the rollback
+        user = table.to_user(slot, project_id)
+        self._users.append((table, slot, user))
+        return user
+
+    async def held_badges(self, user: User, badge_ids: Sequence[int]) -> Set[int]:
+        self.storage._count("held_badges")
+        table = self.storage._users.get(user.project_id)
+        slot = table.find(user.user_id, user.guild_id) if table is not None else None
+        if slot is None:
+            return set()
+        return set(table.badges[slot]).intersection(badge_ids)
+
+    async def add_badges(self, user: User, badge_ids: Sequence[int]):
+        self.storage._count("add_badge")
+        table = self.storage._users[user.project_id]
+        self._badges.append((table, table.find(user.user_id, user.guild_id), badge_ids))
+
+    async def commit(self):
+        self.storage._count("commit")
+        for table, slot, user in self._users:
+            table.store(slot, user)
+        for table, slot, badge_ids in self._badges:
+            table.badges[slot] = tuple(sorted(set(table.badges[slot]).union(badge_ids)))
+        self._users.clear()
+        self._badges.clear()
+
+    def release(self):
+        for key in self._locked:
+            self.storage._release(key)
+        self._locked.clear()
+
+
+class MemoryStorage(StorageBackend):
+    """Everything in-process: for simulations, benchmarks and tests"""
+
+    name = "memory"
+
+    def __init__(self, cache: Optional[RedisGateway] = None):
+        super().__init__(cache or LocalGateway())
+        self._projects: Dict[str, ProjectRecord] = {}
+        self._content: Dict[UUID, Tuple[Sequence[Any], Sequence[Any], Sequence[Any]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._users: Dict[UUID, _UserTable] = {}
+        # (project_id, slot) -> [lock, holders + waiters]
+        self._locks: Dict[Tuple[UUID, int], list] = {}
+
+    # ---- seeding -------------------------------------------------------
+
+    def add_project(
+        self,
+        slug: str,
+        name: str,
+        config: Dict[str, Any],
+        nodes: Sequence[Any],
+        edges: Sequence[Any],
+        badges: Sequence[Any] = (),
+        project_id: Optional[UUID] = None
+    ) -> UUID:
+        """Register a project from snapshot-shaped nodes, edges and badges"""
+        project_id = project_id or uuid4()
+        self._projects[slug] = ProjectRecord(project_id, slug, name, dict(config))
+        self._content[project_id] = (tuple(nodes), tuple(edges), tuple(badges))
+        self._users.setdefault(project_id, _UserTable())
+        return project_id
+
+    def add_users(
+        self,
+        guild_id: int,
+        project_id: UUID,
+        user_ids: Sequence[int],
+        node_id: Optional[int],
+        payload: bytes,
+        ec_total: int = 0
+    ) -> int:
+        """Bulk-create members at ``node_id``; the payload bytes are shared until first write"""
+        table = self._users.setdefault(project_id, _UserTable())
+        added = 0
+        for user_id in user_ids:
+            if table.find(user_id, guild_id) is None:
+                table.add(user_id, guild_id, node_id, ec_total, payload)
+                added += 1
+        return added
+
+    def user_count(self) -> int:
+        return sum(len(table) for table in self._users.values())
+
+    # ---- locking -------------------------------------------------------
+
+    async def _acquire(self, key: Tuple[UUID, int]):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._forget(key, entry)
+            raise
+
+    def _release(self, key: Tuple[UUID, int]):
+        entry = self._locks[key]
+        entry[0].release()
+        self._forget(key, entry)
+
+    def _forget(self, key: Tuple[UUID, int], entry: list):
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[key]
+
+    # ---- StorageBackend ------------------------------------------------
+
+    async def load_project(self, slug: str) -> Optional[ProjectRecord]:
+        self._count("load_project")
+        return self._projects.get(slug)
+
+    async def load_graph(self, project_id: UUID):
+        self._count("load_graph")
+        nodes, edges, _ = self._content[project_id]
+        return nodes, edges
+
+    async def load_badges(self, project_id: UUID):
+        self._count("load_badges")
+        return self._content[project_id][2]
+
+    async def graph_version(self, slug: str) -> int:
+        return self._versions.get(slug, 0)
+
+    async def bump_graph_version(self, slug: str) -> int:
+        self._versions[slug] = self._versions.get(slug, 0) + 1
+        return self._versions[slug]
+
+    async def get_user(self, user_id: int, guild_id: int, project_id: UUID) -> Optional[User]:
+        self._count("get_user")
+        table = self._users.get(project_id)
+        slot = table.find(user_id, guild_id) if table is not None else None
+        return table.to_user(slot, project_id) if slot is not None else None
+
+    async def create_user(self, user: User):
+        self._count("create_user")
+        table = self._users.setdefault(user.project_id, _UserTable())
+        if table.find(user.user_id, user.guild_id) is None:
+            table.add(
+                user.user_id, user.guild_id, user.current_node_id, user.ec_total or 0,
+                user.encrypted_payload, bool(user.is_mentor), user.mentor_score
+            )
+
+    async def top_users(self, guild_id: int, limit: int):
+        self._count("top_users")
+        candidates = []
+        for table in self._users.values():
+            slots = table.by_guild.get(guild_id)
+            if not slots:
+                continue
+            ec = table.ec
+            for slot in heapq.nlargest(limit, slots, key=ec.__getitem__):
+                node = table.node[slot]
+                candidates.append((table.user_ids[slot], ec[slot], None if node == _NO_NODE else node))
+        candidates.sort(key=lambda row: row[1], reverse=True)
+        return candidates[:limit]
+
+    @asynccontextmanager
+    async def transaction(self):
+        tx = MemoryTransaction(self)
+        try:
+            yield tx
+        finally:
+            tx.release()
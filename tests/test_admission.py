@@ -0,0 +1,79 @@
+"""Priority slots and admission control"""
+import asyncio
+
+import pytest
+
+from ..admission import CHEAP, HEAVY, NORMAL, AdmissionController, PrioritySlots, Shed
+
+
+def test_release_hands_slot_to_highest_priority_waiter():
+    async def scenario():
+        slots = PrioritySlots(1)
+        assert await slots.acquire(NORMAL, 1.0)
+        order = []
+
+        async def waiter(priority):
+            await slots.acquire(priority, 1.0)
+            order.append(priority)
+            slots.release()
+
+        tasks = [asyncio.create_task(waiter(p)) for p in (HEAVY, NORMAL, CHEAP)]
+        await asyncio.sleep(0)
+        slots.release()
+        await asyncio.gather(*tasks)
+        return order, slots.idle
+
+    order, idle = asyncio.run(scenario())
+    assert order == [CHEAP, NORMAL, HEAVY]
+    assert idle
+
+
+def test_acquire_times_out_without_taking_a_slot():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire(NORMAL, 1.0)
+        admitted = await slots.acquire(NORMAL, 0.01)
+        slots.release()
+        return admitted, slots.idle
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire(NORMAL, 1.0)
+        task = asyncio.create_task(slots.acquire(NORMAL, 1.0))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        slots.release()
+        return slots.idle
+
+    assert asyncio.run(scenario())
+
+
+def test_cancelled_global_wait_releases_guild_slot():
+    async def scenario():
+        admission = AdmissionController(1, 1, 100, 100, 1.0)
+        await admission.acquire(1, 1, NORMAL)
+        task = asyncio.create_task(admission.acquire(2, 2, NORMAL))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return 2 in admission._guild_slots
+
+    assert not asyncio.run(scenario())
+
+
+def test_zero_budget_sheds_instead_of_queueing():
+    async def scenario():
+        admission = AdmissionController(1, 1, 100, 100, 1.0)
+        await admission.acquire(1, 1, NORMAL)
+        with pytest.raises(Shed) as shed:
+            await admission.acquire(2, 2, NORMAL, budget=0.0)
+        return shed.value.reason
+
+    assert asyncio.run(scenario()) == "busy"
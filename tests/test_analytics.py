@@ -0,0 +1,40 @@
+"""Vectorised funnel statistics on a tiny event table"""
+import numpy as np
+
+from ..analytics import EventTable, funnel
+
+
+def _events() -> EventTable:
+    # Member 0: 1 -> 2 at t=0, 2 -> 3 at t=100, now at 3
+    # Member 1: 1 -> 2 at t=10, now at 2
+    # Member 2: no history, still at 1
+    return EventTable(
+        lengths=np.array([2, 1, 0], dtype=np.int32),
+        frm=np.array([1, 2, 1], dtype=np.int32),
+        to=np.array([2, 3, 2], dtype=np.int32),
+        at=np.array([0, 100, 10], dtype=np.int64),
+        ec_gain=np.array([5, 7, 5], dtype=np.int32),
+        current=np.array([3, 2, 1], dtype=np.int32),
+    )
+
+
+def test_arrivals_exits_and_drop_off():
+    stats = funnel(_events())
+    assert stats["node_ids"].tolist() == [1, 2, 3]
+    assert stats["arrivals"].tolist() == [3, 2, 1]
+    assert stats["exits"].tolist() == [2, 1, 0]
+    assert stats["stalled"].tolist() == [1, 1, 1]
+    assert np.allclose(stats["drop_off"], [1 / 3, 1 / 2, 1.0])
+    assert stats["ec_gained"].tolist() == [0, 10, 7]
+
+
+def test_dwell_and_transitions():
+    stats = funnel(_events(), node_ids=np.array([4], dtype=np.int32))
+    dwell = stats["median_dwell_s"]
+    assert stats["node_ids"].tolist() == [1, 2, 3, 4]
+    assert np.isnan(dwell[0]) and dwell[1] == 100 and np.isnan(dwell[2])
+    transitions = list(zip(
+        stats["transition_from"].tolist(), stats["transition_to"].tolist(),
+        stats["transition_count"].tolist(), stats["transition_share"].tolist()
+    ))
+    assert transitions == [(1, 2, 2, 1.0), (2, 3, 1, 1.0)]
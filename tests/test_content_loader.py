@@ -0,0 +1,71 @@
+"""Content document parsing and validation"""
+import pytest
+
+from ..content_loader import ContentDocument, ContentError
+
+
+def _document(**overrides) -> dict:
+    document = {
+        "project": "test",
+        "root_nodes": {"explorer": 1},
+        "nodes": [
+            {"id": 1, "title": "Root", "root": True},
+            {"id": 2, "title": "Middle"},
+            {"id": 3, "title": "End", "checkpoint": True},
+        ],
+        "edges": [
+            {"from": 1, "to": 2, "text": "On"},
+            {"from": 2, "to": 3, "text": "On", "condition": {"op": "has_badge", "slug": "first"}},
+        ],
+        "badges": [{"slug": "first", "name": "First", "required_nodes": [2]}],
+    }
+    document.update(overrides)
+    return document
+
+
+def _errors(document: dict, **options) -> list:
+    with pytest.raises(ContentError) as error:
+        ContentDocument(document).validate(**options)
+    return error.value.errors
+
+
+def test_valid_document_passes():
+    assert ContentDocument(_document()).validate() == []
+
+
+def test_missing_keys_are_reported_not_raised():
+    document = _document(
+        nodes=[{"id": 1, "title": "Root", "root": True}, {"id": 2}, {"id": "x", "title": "Bad"}],
+        edges=[{"from": 1, "to": 2}],
+        badges=[{"slug": "first"}],
+    )
+    assert _errors(document) == [
+        "nodes[2]: missing title",
+        "nodes[3]: 'id' must be an integer, got 'x'",
+        "edges[1]: missing text",
+        "badges[1]: missing name",
+    ]
+
+
+def test_duplicates_and_dangling_references():
+    document = _document()
+    document["nodes"].append({"id": 2, "title": "Again"})
+    document["edges"].append({"from": 3, "to": 9, "text": "Nowhere"})
+    errors = _errors(document)
+    assert "duplicate node id 2" in errors
+    assert "edge 3 -> 9: dangling to_node_id 9" in errors
+
+
+def test_cycles_are_rejected_unless_allowed():
+    document = _document()
+    document["edges"].append({"from": 3, "to": 2, "text": "Back"})
+    assert any("on cycles" in error for error in _errors(document))
+    ContentDocument(document).validate(allow_cycles=True)
+
+
+def test_unreachable_nodes_are_an_error_unless_allowed():
+    document = _document()
+    document["nodes"].append({"id": 4, "title": "Island", "checkpoint": True})
+    assert any("unreachable" in error for error in _errors(document))
+    warnings = ContentDocument(document).validate(allow_unreachable=True)
+    assert any("unreachable" in warning for warning in warnings)
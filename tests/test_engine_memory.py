@@ -0,0 +1,63 @@
+"""Engine traversals against in-memory storage (no Postgres or Redis needed)"""
+import asyncio
+
+from ..engine import ACAGraphEngine, _state_key, _state_value
+from ..registry import EdgeSnapshot, NodeSnapshot, ProjectRegistry
+from ..storage import MemoryStorage
+
+SLUG = "test"
+GUILD_ID = 1
+USER_ID = 42
+
+
+def _engine() -> ACAGraphEngine:
+    storage = MemoryStorage()
+    nodes = [
+        NodeSnapshot(1, "Root", None, None, 0, False, True),
+        NodeSnapshot(2, "Next", None, 1, 0, False, False),
+    ]
+    edges = [EdgeSnapshot(1, 1, 2, "Go", 0, None, 10, 60)]
+    config = {"root_nodes": {"explorer": 1}, "entry_edges": {"explorer": 1}}
+    storage.add_project(SLUG, "Test", config, nodes, edges)
+    return ACAGraphEngine(storage=storage, registry=ProjectRegistry(storage, version_check_seconds=0))
+
+
+def test_traverse_edge_moves_user():
+    async def scenario():
+        engine = _engine()
+        outcome = await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+        user, node_id = await engine.get_user_state(USER_ID, GUILD_ID, SLUG)
+        return outcome, node_id, user.ec_total
+
+    assert asyncio.run(scenario()) == ((True, None, 2), 2, 10)
+
+
+def test_registry_reloads_project_after_version_bump():
+    async def scenario():
+        engine = _engine()
+        before = await engine.registry.get(SLUG)
+        await engine.storage.bump_graph_version(SLUG)
+        after = await engine.registry.get(SLUG)
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert after is not before
+    assert (before.graph_version, after.graph_version) == (0, 1)
+
+
+
+def test_stale_cached_node_falls_back_to_database():
+    async def scenario():
+        engine = _engine()
+        storage = engine.storage
+        nodes = [NodeSnapshot(n, str(n), None, None, 0, False, n == 1) for n in (1, 2, 3)]
+        edges = [EdgeSnapshot(1, 1, 2, "a", 0, None, 0, 0), EdgeSnapshot(2, 2, 3, "b", 0, None, 0, 0)]
+        storage.add_project("chain", "Chain", {"root_nodes": {"explorer": 1}}, nodes, edges)
+        user, _ = await engine.get_user_state(USER_ID, GUILD_ID, "chain")
+        before = _state_value(user)
+        await engine.traverse_edge(USER_ID, GUILD_ID, 1, "chain")
+        # A late warm-up write puts the pre-traversal state back
+        await engine.redis.set(_state_key(USER_ID, GUILD_ID, "chain"), before)
+        return await engine.traverse_edge(USER_ID, GUILD_ID, 2, "chain")
+
+    assert asyncio.run(scenario()) == (True, None, 3)
@@ -0,0 +1,45 @@
+"""Reachability and badge guidance tables of GraphIndex"""
+from ..graph_index import GraphIndex
+from ..registry import BadgeCatalogue, BadgeSnapshot, EdgeSnapshot, GraphSnapshot, NodeSnapshot
+
+
+def _index() -> GraphIndex:
+    # 1 -> 2 -> 4 and 1 -> 3 -> 4 -> 5; 6 is an island; edge 9 points nowhere
+    nodes = [NodeSnapshot(n, str(n), None, None, 0, n == 5, n == 1) for n in (1, 2, 3, 4, 5, 6)]
+    edges = [
+        EdgeSnapshot(1, 1, 2, "a", 0, None, 0, 0),
+        EdgeSnapshot(2, 1, 3, "b", 1, None, 0, 0),
+        EdgeSnapshot(3, 2, 4, "c", 0, None, 0, 0),
+        EdgeSnapshot(4, 3, 4, "d", 0, None, 0, 0),
+        EdgeSnapshot(5, 4, 5, "e", 0, None, 0, 0),
+        EdgeSnapshot(9, 5, 99, "x", 0, None, 0, 0),
+    ]
+    badges = [
+        BadgeSnapshot(1, "finish", "Finish", None, None, None, (5,), 0),
+        BadgeSnapshot(2, "island", "Island", None, None, None, (6,), 0),
+    ]
+    return GraphIndex(GraphSnapshot(nodes, edges, 1), BadgeCatalogue(badges), [1])
+
+
+def test_reachability_from_roots():
+    index = _index()
+    assert [index.is_reachable(n) for n in (1, 2, 3, 4, 5, 6)] == [True] * 5 + [False]
+    assert index.unreachable_nodes == (6,)
+    assert index.dangling_edges == [9]
+    assert not index.is_reachable(99)
+
+
+def test_shortest_paths_to_badge_targets():
+    index = _index()
+    assert index.distance(1, 5) == 3
+    assert index.distance(4, 5) == 1
+    assert index.distance(5, 5) == 0
+    assert index.distance(1, 6) is None
+    assert index.next_edge(1, 5).edge_id in (1, 2)
+
+
+def test_unachievable_badges_and_recommendations():
+    index = _index()
+    assert index.unachievable_badges == ("island",)
+    [recommendation] = index.recommend(2, frozenset({2}))
+    assert (recommendation.edge.edge_id, recommendation.badge.slug, recommendation.steps) == (3, "finish", 2)
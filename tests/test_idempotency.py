@@ -0,0 +1,67 @@
+"""Click and cooldown claims taken by ``traverse_edge``"""
+import asyncio
+
+import pytest
+
+from ..engine import ACAGraphEngine
+from ..registry import EdgeSnapshot, NodeSnapshot
+from ..storage import MemoryStorage
+
+SLUG = "test"
+GUILD_ID = 1
+USER_ID = 42
+
+
+def _engine() -> ACAGraphEngine:
+    storage = MemoryStorage()
+    nodes = [NodeSnapshot(node_id, str(node_id), None, None, 0, False, node_id == 1) for node_id in (1, 2, 3)]
+    edges = [
+        EdgeSnapshot(1, 1, 2, "Go", 0, None, 10, 60),
+        # Out of reach for a fresh member
+        EdgeSnapshot(2, 2, 3, "Locked", 0, {"op": "min_ec", "val": 1000}, 10, 60),
+    ]
+    storage.add_project(SLUG, "Test", {"root_nodes": {"explorer": 1}, "entry_edges": {"explorer": 1}}, nodes, edges)
+    return ACAGraphEngine(storage=storage)
+
+
+def test_duplicate_click_gets_original_outcome():
+    async def scenario():
+        engine = _engine()
+        first = await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+        second = await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+        user, node_id = await engine.get_user_state(USER_ID, GUILD_ID, SLUG)
+        return first, second, user.ec_total
+
+    first, second, ec_total = asyncio.run(scenario())
+    assert first == second == (True, None, 2)
+    assert ec_total == 10
+
+
+def test_failed_traversal_releases_claims():
+    async def scenario():
+        engine = _engine()
+        transaction = engine.storage.transaction
+
+        def failing():
+            engine.storage.transaction = transaction
+            raise RuntimeError("database down")
+
+        engine.storage.transaction = failing
+        with pytest.raises(RuntimeError):
+            await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+        # Neither the click nor the cooldown claim may outlive the failure
+        return await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+
+    assert asyncio.run(scenario()) == (True, None, 2)
+
+
+def test_failed_outcome_gives_back_cooldown():
+    async def scenario():
+        engine = _engine()
+        await engine.traverse_edge(USER_ID, GUILD_ID, 1, SLUG)
+        outcome = await engine.traverse_edge(USER_ID, GUILD_ID, 2, SLUG)
+        return outcome, await engine.redis.exists(f"cooldown:{USER_ID}:2")
+
+    outcome, cooldowns = asyncio.run(scenario())
+    assert outcome[0] is False
+    assert cooldowns == 0
@@ -0,0 +1,46 @@
+"""Mentor matching and load caps of MentorIndex"""
+from ..mentors import MentorIndex
+
+
+def _index(max_sessions: int = 2) -> MentorIndex:
+    index = MentorIndex(guild_id=1, max_sessions=max_sessions)
+    index.upsert(10, 4.5, ["mpc"])
+    index.upsert(20, 4.9, ["solana"])
+    return index
+
+
+def test_prefers_topic_expert_then_falls_back():
+    index = _index()
+    assert index.match(1, "mpc").mentor_id == 10
+    # Nobody lists "zk": the best available mentor overall
+    assert index.match(2, "zk").mentor_id == 20
+
+
+def test_spreads_load_and_respects_cap():
+    index = _index(max_sessions=1)
+    assert {index.match(1).mentor_id, index.match(2).mentor_id} == {10, 20}
+    assert index.match(3) is None
+    assert index.available() == []
+
+
+def test_ending_a_session_frees_capacity():
+    index = _index(max_sessions=1)
+    first = index.match(1, "mpc")
+    index.match(2)
+    assert index.match(3) is None
+    index.end_session(first.learner_id)
+    assert index.match(3).mentor_id == 10
+
+
+def test_offline_mentor_and_self_are_never_matched():
+    index = _index()
+    index.set_presence(20, online=False)
+    assert index.match(20).mentor_id == 10
+    assert index.match(21, "solana").mentor_id == 10
+
+
+def test_existing_session_is_returned_again():
+    index = _index()
+    session = index.match(1)
+    assert index.match(1) is session
+    assert index.mentors[session.mentor_id].load == 1
@@ -0,0 +1,141 @@
+"""Local fallback store and reconciliation after Redis failures"""
+import asyncio
+import time
+
+import redis.asyncio as redis
+
+from ..redis_gateway import CLOSED, LocalStore, RedisGateway
+
+
+class FakePipeline:
+    def __init__(self, client: "FakeRedis"):
+        self.client = client
+        self.ops = []
+
+    def set(self, key, value, px=None, nx=False):
+        self.ops.append(("set", key, value, nx))
+
+    def delete(self, *keys):
+        self.ops.extend(("delete", key) for key in keys)
+
+    async def execute(self):
+        self.client.pipelines += 1
+        await asyncio.sleep(self.client.latency)
+        if self.client.down:
+            raise redis.ConnectionError("down")
+        for op in self.ops:
+            if op[0] == "delete":
+                self.client.data.pop(op[1], None)
+            elif not (op[3] and op[1] in self.client.data):
+                self.client.data[op[1]] = op[2]
+        return [True] * len(self.ops)
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the gateway"""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+        self.latency = 0.0
+        self.pipelines = 0
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError("down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, *keys):
+        self._check()
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+def _gateway(client: FakeRedis) -> RedisGateway:
+    return RedisGateway(client, timeout=1.0, failure_threshold=1, reset_seconds=0.0, fallback_max_keys=100)
+
+
+def test_local_store_nx_expiry_and_change_records():
+    store = LocalStore(max_keys=2)
+    assert store.set("a", "1", nx=True)
+    assert store.set("a", "2", nx=True) is None
+    store.set("b", "1", ex=0.01)
+    store.delete("c")
+    time.sleep(0.02)
+    assert store.get("a") == "1"
+    assert store.get("b") is None
+    # Bounded: the oldest change record goes first
+    assert list(store.touched) == ["b", "c"]
+
+
+def test_restore_changes_keeps_newer_records():
+    store = LocalStore(max_keys=10)
+    store.set("a", "1", nx=True)
+    store.delete("b")
+    taken = store.take_changes()
+    store.delete("a")
+    store.restore_changes(taken)
+    assert store.touched == {"a": True, "b": False}
+    assert list(store.touched) == ["b", "a"]
+
+
+def test_outage_writes_are_reconciled_on_recovery():
+    async def scenario():
+        client = FakeRedis()
+        client.data["stale"] = "old"
+        gateway = _gateway(client)
+        client.down = True
+        await gateway.set("claim", "1", ex=60, nx=True)
+        await gateway.delete("stale")
+        client.down = False
+        value = await gateway.get("claim")
+        return client.data, value, gateway.local.touched, gateway.breaker.state
+
+    data, value, touched, state = asyncio.run(scenario())
+    assert data == {"claim": "1"}
+    assert value == "1"
+    assert touched == {}
+    assert state == CLOSED
+
+
+def test_change_recorded_during_reconcile_is_not_lost():
+    async def scenario():
+        client = FakeRedis()
+        client.data["late"] = "stale"
+        gateway = _gateway(client)
+        gateway.local.delete("early")
+        client.latency = 0.05
+        reconcile = asyncio.create_task(gateway._reconcile())
+        await asyncio.sleep(0.01)
+        gateway.local.delete("late")
+        # Calls made meanwhile wait for the running reconcile instead of repeating it
+        await asyncio.gather(reconcile, gateway.get("x"), gateway.get("y"))
+        return client.data, client.pipelines, gateway.local.touched
+
+    data, pipelines, touched = asyncio.run(scenario())
+    assert "late" not in data
+    assert pipelines == 2
+    assert touched == {}
+
+
+def test_failed_reconcile_keeps_changes():
+    async def scenario():
+        client = FakeRedis()
+        gateway = _gateway(client)
+        gateway.local.delete("a")
+        client.down = True
+        return await gateway.flush(), gateway.local.touched
+
+    assert asyncio.run(scenario()) == (False, {"a": False})
@@ -0,0 +1,26 @@
+"""CSS and JavaScript minifiers of the static site build"""
+from ..sitebuild import css_rules, minify_css, minify_js
+
+
+def test_minify_css_keeps_descendant_pseudo_selectors():
+    css = "/* nav */\na :hover {\n  color : red;\n  margin: 0 auto;\n}\n"
+    assert minify_css(css) == "a :hover{color :red;margin:0 auto}"
+
+
+def test_css_rules_splits_top_level_blocks():
+    css = minify_css("a { color: red }\n@media (max-width: 600px) { a { color: blue } b { x: y } }\nc { d: e }")
+    assert css_rules(css) == [
+        "a{color:red}",
+        "@media (max-width:600px){a{color:blue}b{x:y}}",
+        "c{d:e}",
+    ]
+
+
+def test_minify_js_drops_comments_and_whitespace():
+    src = "// header\nconst  a = 1;   /* note */\nfunction f ( x ) {\n    return x  +  a;\n}\n"
+    assert minify_js(src) == "const a=1;\nfunction f(x){\nreturn x+a;\n}"
+
+
+def test_minify_js_keeps_strings_regexes_and_operators():
+    src = "const s = 'a // not a comment';\nconst r = /\\/* x/g;\nlet y = a + +b;\nconst t = `${ s }  /* kept */`;"
+    assert minify_js(src) == "const s='a // not a comment';\nconst r=/\\/* x/g;\nlet y=a+ +b;\nconst t=`${ s }  /* kept */`;"
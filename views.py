@@ -0,0 +1,79 @@
+# ========================================
+# ACA Bot Choice Components
+# Stateless buttons addressed by custom_id
+# ========================================
+"""
+Graph choices are rendered as buttons whose ``custom_id`` names the project,
+the node the button was shown at and the edge it traverses::
+
+    aca:edge:<project slug>:<node id>:<edge id>
+
+Clicks are routed by the bot's ``on_interaction`` listener, which parses the
+id and calls the engine, so no View object or timeout is kept per message.
+Buttons keep working across restarts, and memory stays flat however many
+members are mid-onboarding.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+
+import discord
+
+from .registry import EdgeSnapshot
+
+CHOICE_PREFIX = "aca:edge:"
+MAX_BUTTONS = 25
+MAX_LABEL = 80
+
+_STYLES = (
+    discord.ButtonStyle.primary,
+    discord.ButtonStyle.success,
+    discord.ButtonStyle.danger,
+    discord.ButtonStyle.secondary
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ChoiceId:
+    project_slug: str
+    node_id: int
+    edge_id: int
+
+    def encode(self) -> str:
+        return f"{CHOICE_PREFIX}{self.project_slug}:{self.node_id}:{self.edge_id}"
+
+    @classmethod
+    def parse(cls, custom_id: str) -> Optional["ChoiceId"]:
+        """None for ids that aren't graph choices or are malformed"""
+        if not custom_id.startswith(CHOICE_PREFIX):
+            return None
+        try:
+            slug, node_id, edge_id = custom_id[len(CHOICE_PREFIX):].rsplit(":", 2)
+            return cls(slug, int(node_id), int(edge_id))
+        except ValueError:
+            return None
+
+
+class ChoiceView(discord.ui.View):
+    """Render-only row of edge buttons; never registered with the view store"""
+
+    def __init__(
+        self,
+        project_slug: str,
+        choices: Iterable[Tuple[EdgeSnapshot, str]]
+    ):
+        super().__init__(timeout=None)
+        for i, (edge, label) in enumerate(choices):
+            if i == MAX_BUTTONS:
+                break
+            self.add_item(discord.ui.Button(
+                label=label[:MAX_LABEL],
+                style=_STYLES[i % len(_STYLES)],
+                custom_id=ChoiceId(project_slug, edge.from_node_id, edge.edge_id).encode()
+            ))
+        # A finished view is serialised into the message but not stored for
+        # dispatch, so sending it leaves nothing behind in memory
+        self.stop()
+
+    @classmethod
+    def for_edges(cls, project_slug: str, edges: Sequence[EdgeSnapshot]) -> "ChoiceView":
+        return cls(project_slug, ((edge, edge.choice_text) for edge in edges))
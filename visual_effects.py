@@ -106,7 +106,7 @@ class VisualEffectsManager:
     
     async def send_typing_effect(self, channel, duration: float = 2.0):
         """Send typing indicator with cypherpunk aesthetic"""
-        await channel.trigger_typing()
+        await channel.typing()
         await asyncio.sleep(duration)
 
 # Global visual effects manager
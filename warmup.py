@@ -0,0 +1,178 @@
+# ========================================
+# ACA Bot Cache Warming
+# Preload hot state after startup and guild joins
+# ========================================
+"""
+Fill the caches the first wave of interactions will hit, in the background.
+
+On the first ``on_ready`` of a process (and for a single guild on
+``on_guild_join``) the warmer loads, in this order:
+
+1. graph snapshots, badge catalogues and graph indexes of the default
+   project and of every project with members in those guilds;
+2. the top-N leaderboard of each guild;
+3. the cached state of the most recently active members (by
+   ``users.updated_at``, up to ``WARMUP_RECENT_USERS`` per batch of 50
+   guilds), re-read in one query per batch right before being written to
+   Redis with one pipelined ``SET NX``. The rows read at the start only
+   pick the projects to load: written seconds later, they could put back
+   the state of a member who traversed meanwhile (a traversal deletes the
+   key, so ``NX`` alone doesn't protect it). The remaining window is one
+   round trip, and the engine re-reads the database when a cached node
+   disagrees with a clicked edge.
+
+Work runs under ``WARMUP_CONCURRENCY`` and stops at ``WARMUP_BUDGET_SECONDS``;
+it never delays readiness. Sixty seconds after warming, the state-cache hit
+rate of that first minute is logged and exported with the warmed counts.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select
+
+from .config import settings
+from .database import get_db_session
+from .engine import ACAGraphEngine, STATE_TTL, _state_key, _state_value
+from .metrics import metrics
+from .models import Project, User
+from .registry import ProjectNotFound
+
+logger = logging.getLogger(__name__)
+
+WARMED = metrics.gauge("aca_warmup_entries", "Entries loaded by the last cache warm-up", ("kind",))
+WARMUP_SECONDS = metrics.gauge("aca_warmup_seconds", "Duration of the last cache warm-up")
+FIRST_MINUTE_HIT_RATIO = metrics.gauge(
+    "aca_warmup_first_minute_hit_ratio", "State cache hit ratio in the minute after warm-up"
+)
+
+GUILD_BATCH = 50
+HIT_RATE_WINDOW = 60.0
+
+
+class CacheWarmer:
+    """Bounded, time-boxed cache preloading for the engine"""
+
+    def __init__(
+        self,
+        engine: ACAGraphEngine,
+        concurrency: int = settings.WARMUP_CONCURRENCY,
+        budget: float = settings.WARMUP_BUDGET_SECONDS,
+        recent_users: int = settings.WARMUP_RECENT_USERS,
+        leaderboard_size: int = 10
+    ):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.budget = budget
+        self.recent_users = recent_users
+        self.leaderboard_size = leaderboard_size
+        self._startup_done = False
+        self._tasks = set()
+
+    # ---- triggers ------------------------------------------------------
+
+    def on_ready(self, guild_ids: Sequence[int]):
+        """Warm every guild once per process (on_ready also fires on reconnects)"""
+        if self._startup_done:
+            return
+        self._startup_done = True
+        self._spawn(self._warm_and_report(list(guild_ids), "startup"))
+
+    def on_guild_join(self, guild_id: int):
+        self._spawn(self._warm_and_report([guild_id], f"guild {guild_id}", report_hit_rate=False))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ---- warming -------------------------------------------------------
+
+    async def _warm_and_report(self, guild_ids: List[int], reason: str, report_hit_rate: bool = True):
+        counts: Dict[str, int] = {"projects": 0, "leaderboards": 0, "user_states": 0}
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.warm(guild_ids, counts), self.budget)
+            outcome = "complete"
+        except asyncio.TimeoutError:
+            outcome = f"stopped at {self.budget:.0f}s budget"
+        except Exception as e:
+            outcome = f"failed: {e}"
+        elapsed = time.perf_counter() - started
+
+        for kind, count in counts.items():
+            WARMED.labels(kind).set(count)
+        WARMUP_SECONDS.set(elapsed)
+        logger.info(
+            f"Cache warm-up ({reason}) {outcome} in {elapsed:.2f}s: "
+            + ", ".join(f"{count} {kind}" for kind, count in counts.items())
+        )
+
+        if report_hit_rate:
+            await self._report_hit_rate()
+
+    async def warm(self, guild_ids: Sequence[int], counts: Dict[str, int]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(coro):
+            async with semaphore:
+                return await coro
+
+        slugs = {settings.DEFAULT_PROJECT}
+        batches = [guild_ids[i:i + GUILD_BATCH] for i in range(0, len(guild_ids), GUILD_BATCH)]
+        # Recent users first: their rows also tell us which projects are in use
+        recent = await asyncio.gather(*(bounded(self._recent_users(batch)) for batch in batches))
+        for rows in recent:
+            slugs.update(slug for _, slug in rows)
+
+        await asyncio.gather(*(bounded(self._warm_project(slug, counts)) for slug in slugs))
+        await asyncio.gather(
+            *(bounded(self._warm_leaderboard(guild_id, counts)) for guild_id in guild_ids),
+            *(bounded(self._warm_states(batch, counts)) for batch in batches)
+        )
+
+    async def _warm_project(self, slug: str, counts: Dict[str, int]):
+        registry = self.engine.registry
+        try:
+            await registry.get_graph(slug)
+            await registry.get_badges(slug)
+            await registry.get_index(slug)
+        except ProjectNotFound:
+            return
+        counts["projects"] += 1
+
+    async def _warm_leaderboard(self, guild_id: int, counts: Dict[str, int]):
+        await self.engine.leaderboard(guild_id, limit=self.leaderboard_size)
+        counts["leaderboards"] += 1
+
+    async def _recent_users(self, guild_ids: Iterable[int]) -> list:
+        """Most recently active members across a batch of guilds, with their project slug"""
+        async with get_db_session() as session:
+            return (await session.execute(
+                select(User, Project.project_slug)
+                .join(Project, Project.project_id == User.project_id)
+                .where(User.guild_id.in_(list(guild_ids)))
+                .order_by(User.updated_at.desc())
+                .limit(self.recent_users)
+            )).all()
+
+    async def _warm_states(self, guild_ids: Sequence[int], counts: Dict[str, int]):
+        # Fresh rows: the ones read before loading projects may be seconds old
+        rows = await self._recent_users(guild_ids)
+        if not rows:
+            return
+        batch = self.engine.redis.batch()
+        for user, slug in rows:
+            batch.set(_state_key(user.user_id, user.guild_id, slug), _state_value(user), ex=STATE_TTL, nx=True)
+        results = await batch.execute()
+        counts["user_states"] += sum(1 for written in results if written)
+
+    async def _report_hit_rate(self):
+        hits, misses = self.engine.cache_hits, self.engine.cache_misses
+        await asyncio.sleep(HIT_RATE_WINDOW)
+        hits, misses = self.engine.cache_hits - hits, self.engine.cache_misses - misses
+        total = hits + misses
+        ratio = hits / total if total else 0.0
+        FIRST_MINUTE_HIT_RATIO.set(ratio)
+        logger.info(f"State cache hit rate in the first minute after warm-up: {ratio:.1%} ({hits}/{total})")